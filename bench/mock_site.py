@@ -0,0 +1,482 @@
+"""
+Локальная имитация сайта продажи билетов и сервиса 2captcha.
+
+Отдает страницу с календарем, список сеансов с постраничной навигацией
+#prfrmncPages и модальное окно добавления в корзину с той же разметкой,
+что и настоящий сайт. Задержка ответов настраивается, слоты можно
+открывать по расписанию сценария или вызовом release.
+
+Запуск: python bench/mock_site.py --port 8765 --latency 0.1
+"""
+import json
+import time
+import random
+import argparse
+import threading
+import datetime as dt
+from pathlib import Path
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+from urllib.parse import (
+    parse_qs,
+    urlparse,
+)
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+DEFAULT_SCENARIO = FIXTURES_DIR / 'scenario.json'
+
+# Цвета фона доступной и недоступной даты календаря.
+ALLOWED_COLOR = 'rgb(206, 234, 208)'
+DISABLED_COLOR = 'rgb(238, 238, 238)'
+
+
+class MockSite:
+    """
+    Состояние имитации сайта.
+
+    Хранит количество билетов на каждый сеанс, события корзины и капчи.
+    Даты сценария задаются смещением от текущего дня, поэтому сценарий не
+    устаревает.
+    """
+
+    def __init__(self, scenario: Dict[str, Any], *,
+                 latency: Optional[float] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param scenario: Сценарий из fixtures/scenario.json.
+        :param latency: Задержка ответа в секундах вместо задержки сценария.
+        """
+
+        self.scenario = scenario
+        self.latency = scenario.get('latency', 0.0) \
+            if latency is None else latency
+        self.latency_jitter = scenario.get('latency_jitter', 0.0)
+        self.per_page = scenario.get('per_page', 5)
+        self.captcha_solve_time = scenario.get('captcha_solve_time', 5.0)
+
+        self.__lock = threading.Lock()
+        self.__tickets: Dict[dt.date, Dict[dt.time, int]] = {}
+        self.__released: Dict[str, float] = {}
+        self.__events: List[Dict[str, Any]] = []
+        self.__captcha_tasks: Dict[str, float] = {}
+        self.__timers: List[threading.Timer] = []
+        self.reset()
+
+    @staticmethod
+    def load(path: Path = DEFAULT_SCENARIO, **kwargs: Any) -> 'MockSite':
+        """Создание имитации по файлу сценария"""
+
+        with open(path, encoding='utf-8') as file:
+            return MockSite(json.load(file), **kwargs)
+
+    def day(self, offset: int) -> dt.date:
+        """Дата сценария по смещению от текущего дня"""
+
+        return dt.date.today() + dt.timedelta(days=offset)
+
+    def reset(self) -> None:
+        """Возврат к исходному состоянию сценария"""
+
+        start = dt.datetime.strptime(self.scenario['first_session'], '%H:%M')
+        end = dt.datetime.strptime(self.scenario['last_session'], '%H:%M')
+        step = dt.timedelta(minutes=self.scenario['session_step'])
+        sessions = []
+        while start <= end:
+            sessions.append(start.time())
+            start += step
+
+        available = set(self.scenario.get('available_days', []))
+        background = self.scenario.get('background_tickets', 20)
+        with self.__lock:
+            self.__tickets = {
+                self.day(offset): {
+                    session: background if offset in available else 0
+                    for session in sessions
+                }
+                for offset in range(self.scenario.get('horizon_days', 120))
+            }
+            # Распроданные сеансы доступных дней, например, наблюдаемый слот
+            # до открытия продажи.
+            for sold_out in self.scenario.get('sold_out', []):
+                session = dt.datetime.strptime(sold_out['time'],
+                                               '%H:%M').time()
+                self.__tickets[self.day(sold_out['day_offset'])][session] = 0
+            self.__released.clear()
+            self.__events.clear()
+            self.__captcha_tasks.clear()
+
+    def schedule_releases(self) -> None:
+        """Запуск открытия слотов по расписанию сценария"""
+
+        for release in self.scenario.get('releases', []):
+            timer = threading.Timer(
+                release['release_after'], self.release,
+                args=(self.day(release['day_offset']),
+                      dt.datetime.strptime(release['time'], '%H:%M').time(),
+                      release['tickets']),
+            )
+            timer.daemon = True
+            timer.start()
+            self.__timers.append(timer)
+
+    def cancel_releases(self) -> None:
+        """Отмена запланированных открытий слотов"""
+
+        for timer in self.__timers:
+            timer.cancel()
+        self.__timers.clear()
+
+    def release(self, day: dt.date, session: dt.time, tickets: int) -> float:
+        """
+        Открытие продажи билетов на сеанс.
+
+        :param day: Дата сеанса.
+        :param session: Время сеанса.
+        :param tickets: Количество билетов.
+        :return: Время открытия по time.time().
+        """
+
+        released_at = time.time()
+        with self.__lock:
+            self.__tickets.setdefault(day, {})[session] = tickets
+            self.__released[f'{day:%d.%m.%Y} {session:%H:%M}'] = released_at
+
+        return released_at
+
+    def events(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """События корзины и капчи в порядке появления"""
+
+        with self.__lock:
+            return [event for event in self.__events
+                    if kind is None or event['kind'] == kind]
+
+    def add_event(self, kind: str, **fields: Any) -> None:
+        """Запись события"""
+
+        with self.__lock:
+            self.__events.append({'kind': kind, 'time': time.time(),
+                                  **fields})
+
+    def calendar(self, month: int, year: int) -> str:
+        """Разметка календаря месяца"""
+
+        first = dt.date(year, month, 1)
+        cells = []
+        # Пустые ячейки до первого дня месяца.
+        cells.extend('<div class="calendar-day empty"></div>'
+                     for _ in range(first.weekday()))
+
+        day = first
+        with self.__lock:
+            while day.month == month:
+                sessions = self.__tickets.get(day, {})
+                color = ALLOWED_COLOR \
+                    if any(sessions.values()) else DISABLED_COLOR
+                cells.append(
+                    f'<div class="calendar-day" '
+                    f'style="background-color: {color};">'
+                    f'<span class="day-number" '
+                    f'data-date="{day:%d/%m/%Y}">{day.day}</span></div>'
+                )
+                day += dt.timedelta(days=1)
+
+        return f'<div class="calendar-grid">{"".join(cells)}</div>'
+
+    def performances(self, day: dt.date, page: int) -> str:
+        """Разметка одной страницы списка сеансов на дату"""
+
+        with self.__lock:
+            sessions = sorted(
+                (session, count)
+                for session, count in self.__tickets.get(day, {}).items()
+                if count > 0
+            )
+
+        pages = max((len(sessions) + self.per_page - 1) // self.per_page, 1)
+        page = min(max(page, 1), pages)
+        rows = []
+        for session, count in sessions[(page - 1) * self.per_page:
+                                       page * self.per_page]:
+            rows.append(
+                f'<div class="perf_row row-height2 text-center">'
+                f'<div class="col-time"><div>{session:%H:%M}</div></div>'
+                f'<div class="col-buy"><button type="button" '
+                f'class="btn-modalproduct btn btn-success btn-block '
+                f'showPerformance" data-date="{day:%d/%m/%Y}" '
+                f'data-time="{session:%H:%M}">Купить <span>({count})</span>'
+                f'</button></div></div>'
+            )
+
+        navigation = ''
+        if pages > 1:
+            items = ''.join(
+                ('<li class="active">' if number == page else '<li>')
+                + f'<a data-page="{number}">{number}</a></li>'
+                for number in range(1, pages + 1)
+            )
+            navigation = (
+                f'<ul>{items}<li class="next"><a data-page="'
+                f'{min(page + 1, pages)}">&raquo;</a></li></ul>'
+            )
+
+        return (f'<div class="perf_list" data-date="{day:%d/%m/%Y}" '
+                f'data-page="{page}">{"".join(rows)}</div>'
+                f'<div id="prfrmncPages">{navigation}</div>')
+
+    def modal(self, day: dt.date, session: dt.time) -> str:
+        """Разметка модального окна с билетами сеанса"""
+
+        with self.__lock:
+            count = self.__tickets.get(day, {}).get(session, 0)
+
+        return (
+            f'<div class="productrow" data-date="{day:%d/%m/%Y}" '
+            f'data-time="{session:%H:%M}">'
+            f'<span>Полный билет</span>'
+            f'<input id="qB6B0B700-CEEA-3087-359F-016CB3FAF5CB" '
+            f'type="number" min="0" max="{count}" value="0">'
+            f'</div>'
+            f'<div style="height: 800px;"></div>'
+            f'<button type="button" class="btn btn-primary addtocart">'
+            f'В корзину</button>'
+        )
+
+    def add_to_cart(self, day: dt.date, session: dt.time, count: int) -> bool:
+        """Добавление билетов в корзину"""
+
+        with self.__lock:
+            sessions = self.__tickets.get(day, {})
+            available = sessions.get(session, 0)
+            ok = 0 < count <= available
+            if ok:
+                sessions[session] = available - count
+            released_at = self.__released.get(
+                f'{day:%d.%m.%Y} {session:%H:%M}'
+            )
+
+        self.add_event('cart', date=f'{day:%d.%m.%Y}',
+                       time_slot=f'{session:%H:%M}', count=count, ok=ok,
+                       released_at=released_at)
+        return ok
+
+    def captcha_submit(self) -> str:
+        """Постановка капчи в очередь заглушки 2captcha"""
+
+        task_id = str(random.randint(10 ** 8, 10 ** 9))
+        with self.__lock:
+            self.__captcha_tasks[task_id] = time.time()
+
+        return task_id
+
+    def captcha_result(self, task_id: str) -> Optional[str]:
+        """Решение капчи, если оно готово"""
+
+        with self.__lock:
+            submitted = self.__captcha_tasks.get(task_id)
+
+        if submitted is None:
+            raise KeyError(task_id)
+        if time.time() - submitted < self.captcha_solve_time:
+            return None
+
+        return f'mock-token-{task_id}'
+
+    def delay(self) -> None:
+        """Имитация задержки ответа сервера"""
+
+        latency = self.latency
+        if self.latency_jitter:
+            latency += random.uniform(0, self.latency_jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+
+def _make_handler(site: MockSite) -> type:
+    """Создание обработчика запросов для имитации"""
+
+    page_template = (FIXTURES_DIR / 'page.html').read_text(encoding='utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            query = {key: values[0]
+                     for key, values in parse_qs(url.query).items()}
+
+            if url.path in ('/in.php', '/res.php'):
+                self._captcha(url.path, query)
+                return
+            if url.path == '/_admin/events':
+                self._send(json.dumps(site.events()), 'application/json')
+                return
+
+            site.delay()
+            if url.path == '/':
+                today = dt.date.today()
+                next_month = (today.replace(day=28)
+                              + dt.timedelta(days=4)).replace(day=1)
+                self._send(page_template
+                           .replace('{{month}}', str(today.month))
+                           .replace('{{year}}', str(today.year))
+                           .replace('{{next_month}}', str(next_month.month))
+                           .replace('{{next_year}}', str(next_month.year)))
+            elif url.path == '/calendar':
+                self._send(site.calendar(int(query['month']),
+                                         int(query['year'])))
+            elif url.path == '/performances':
+                self._send(site.performances(
+                    dt.datetime.strptime(query['date'], '%d/%m/%Y').date(),
+                    int(query.get('page', 1)),
+                ))
+            elif url.path == '/modal':
+                self._send(site.modal(
+                    dt.datetime.strptime(query['date'], '%d/%m/%Y').date(),
+                    dt.datetime.strptime(query['time'], '%H:%M').time(),
+                ))
+            else:
+                self.send_error(404)
+
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+
+            if url.path == '/in.php':
+                self._captcha(url.path, {})
+                return
+            if url.path == '/_admin/release':
+                released_at = site.release(
+                    dt.datetime.strptime(payload['date'], '%d.%m.%Y').date(),
+                    dt.datetime.strptime(payload['time'], '%H:%M').time(),
+                    int(payload['tickets']),
+                )
+                self._send(json.dumps({'released_at': released_at}),
+                           'application/json')
+                return
+            if url.path == '/_admin/reset':
+                site.reset()
+                self._send('{}', 'application/json')
+                return
+
+            site.delay()
+            if url.path == '/cart':
+                ok = site.add_to_cart(
+                    dt.datetime.strptime(payload['date'], '%d/%m/%Y').date(),
+                    dt.datetime.strptime(payload['time'], '%H:%M').time(),
+                    int(payload.get('count') or 0),
+                )
+                self._send(json.dumps({'ok': ok}), 'application/json')
+            elif url.path == '/captcha/verify':
+                site.add_event('captcha', token=payload.get('token'))
+                self._send('{}', 'application/json')
+            else:
+                self.send_error(404)
+
+        def _captcha(self, path: str, query: Dict[str, str]) -> None:
+            """Ответ заглушки API 2captcha"""
+
+            if path == '/in.php':
+                body = {'status': 1, 'request': site.captcha_submit()}
+            else:
+                try:
+                    token = site.captcha_result(query.get('id', ''))
+                except KeyError:
+                    body = {'status': 0, 'request': 'ERROR_WRONG_CAPTCHA_ID'}
+                else:
+                    body = {'status': 1, 'request': token} if token \
+                        else {'status': 0, 'request': 'CAPCHA_NOT_READY'}
+            self._send(json.dumps(body), 'application/json')
+
+        def _send(self, body: str,
+                  content_type: str = 'text/html; charset=utf-8') -> None:
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+class MockServer:
+    """HTTP-сервер имитации в фоновом потоке"""
+
+    def __init__(self, site: MockSite, host: str = '127.0.0.1',
+                 port: int = 0) -> None:
+        """
+        Инициализатор класса.
+
+        :param site: Состояние имитации.
+        :param host: Адрес сервера.
+        :param port: Порт сервера. 0 - любой свободный.
+        """
+
+        self.site = site
+        self.__server = ThreadingHTTPServer((host, port), _make_handler(site))
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Адрес страницы с билетами"""
+
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockServer':
+        """Запуск сервера"""
+
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, name='mock-site', daemon=True,
+        )
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Остановка сервера"""
+
+        self.site.cancel_releases()
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Имитация сайта билетов.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--scenario', type=Path, default=DEFAULT_SCENARIO)
+    parser.add_argument('--latency', type=float, default=None,
+                        help='Задержка ответа в секундах.')
+    args = parser.parse_args()
+
+    site = MockSite.load(args.scenario, latency=args.latency)
+    site.schedule_releases()
+    server = MockServer(site, args.host, args.port).start()
+    print(f'Страница: {server.url}/')
+    print(f'PROBE_CALENDAR_URL={server.url}/calendar?month={{month}}'
+          f'&year={{year}}')
+    print(f'PROBE_PERFORMANCES_URL={server.url}/performances?date={{date}}'
+          f'&page={{page}}')
+    print(f'CAPTCHA_SERVICE_URL={server.url}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
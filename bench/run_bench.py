@@ -0,0 +1,414 @@
+"""
+Бенчмарк сканирования и сбора билетов на локальной имитации сайта.
+
+Для каждого режима (browser - проверка в браузере, probe - HTTP-проверка
+с браузером только для сбора) измеряет:
+- scans_per_minute - сколько сканирований помещается в минуту подряд;
+- time_to_detect - время от открытия продажи до обнаружения слота;
+- time_to_cart - время от открытия продажи до добавления в корзину;
+- memory_mb - JS-куча страницы браузера после прогона.
+
+Сканирования идут подряд без пауз планировщика, поэтому time_to_detect -
+задержка самого конвейера сканирования. Результаты дописываются в
+bench/results/results.jsonl для сравнения между версиями.
+
+Запуск: python bench/run_bench.py --modes browser,probe --duration 60
+Сравнение: python bench/run_bench.py --compare 5
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+import datetime as dt
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+
+from mock_site import (  # noqa: E402
+    MockServer,
+    MockSite,
+)
+from tickets_parser.informer import Informer  # noqa: E402
+from tickets_parser.log_sinks import StreamSink  # noqa: E402
+from tickets_parser.metrics import metrics  # noqa: E402
+from tickets_parser.target import ObservedTarget  # noqa: E402
+
+DEFAULT_RESULTS = BENCH_DIR / 'results' / 'results.jsonl'
+# Сколько секунд ждать обнаружения открытого слота.
+DETECT_TIMEOUT = 120.0
+
+
+class BrowserScanner:
+    """
+    Сканирование и сбор билетов в браузере так же, как это делает
+    наблюдатель, но без планировщика.
+    """
+
+    def __init__(self, driver, url: str, informer: Informer) -> None:
+        """
+        Инициализатор класса.
+
+        :param driver: Веб-драйвер из пула.
+        :param url: Адрес страницы имитации.
+        :param informer: Объект информера.
+        """
+
+        from tickets_parser.phase_timer import PhaseTimer
+        from tickets_parser.time_index import TimePageIndex
+
+        self.__driver = driver
+        self.__url = url
+        self.__informer = informer
+        self.__checker = None
+        self.__time_index = TimePageIndex()
+        self.timer = PhaseTimer()
+
+    def scan(self, targets: List[ObservedTarget]) -> List[ObservedTarget]:
+        """Одно сканирование слотов"""
+
+        from tickets_parser.calendar_navigator import CalendarNavigator
+        from tickets_parser.datetime_checker import DateTimeChecker
+        from tickets_parser.driver_pool import close_cookie_card
+        from tickets_parser.phase_timer import PhaseTimer
+
+        self.timer = PhaseTimer()
+        reuse_page = CalendarNavigator.shown_month(self.__driver) is not None
+        if not reuse_page:
+            with self.timer.phase('page_load'):
+                self.__driver.get(self.__url)
+            try:
+                close_cookie_card(self.__driver)
+            except Exception:
+                pass
+
+        self.__checker = DateTimeChecker(
+            driver=self.__driver,
+            targets=targets,
+            informer=self.__informer,
+            timer=self.timer,
+            time_index=self.__time_index,
+        )
+        try:
+            return self.__checker.start_check(reuse_page=reuse_page)
+        except Exception:
+            CalendarNavigator.forget(self.__driver)
+            raise
+
+    def collect(self, target: ObservedTarget) -> None:
+        """Сбор билетов на слот, найденный последним сканированием"""
+
+        from tickets_parser.calendar_navigator import CalendarNavigator
+        from tickets_parser.ticket_collector import TicketCollector
+
+        element = self.__checker.locate(target)
+        if element is None:
+            raise RuntimeError(f'Слот {target} пропал со страницы')
+
+        TicketCollector(
+            driver=self.__driver,
+            time_info=element,
+            count_tickets=target.count_tickets,
+            informer=self.__informer,
+            timer=self.timer,
+        ).start_collect()
+        metrics.observe('time_to_cart_seconds', self.timer.total)
+
+        # После сбора страница меняется, следующее сканирование загружает
+        # ее заново.
+        CalendarNavigator.forget(self.__driver)
+
+    def memory_mb(self) -> float:
+        """JS-куча страницы в мегабайтах"""
+
+        used_heap = self.__driver.execute_script(
+            'return window.performance && performance.memory '
+            '? performance.memory.usedJSHeapSize : 0;'
+        )
+        return (used_heap or 0) / 1024 / 1024
+
+
+def measure_throughput(scan: Callable[[], Any], duration: float) -> float:
+    """
+    Количество сканирований в минуту.
+
+    :param scan: Функция одного сканирования.
+    :param duration: Сколько секунд сканировать.
+    :return: Сканирований в минуту.
+    """
+
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        scan()
+        count += 1
+
+    return count / (time.perf_counter() - started) * 60
+
+
+def measure_release(site: MockSite,
+                    target: ObservedTarget,
+                    detect: Callable[[], bool],
+                    collect: Callable[[], None],
+                    rounds: int) -> Dict[str, List[float]]:
+    """
+    Время обнаружения и сбора билетов после открытия продажи.
+
+    :param site: Имитация сайта.
+    :param target: Наблюдаемый слот.
+    :param detect: Сканирование, возвращающее True при обнаружении слота.
+    :param collect: Сбор билетов на слот.
+    :param rounds: Количество повторов.
+    :return: Списки time_to_detect и time_to_cart в секундах.
+    """
+
+    result: Dict[str, List[float]] = {'time_to_detect': [],
+                                      'time_to_cart': []}
+    for _ in range(rounds):
+        site.reset()
+        # Прогревочное сканирование: страница и календарь уже открыты к
+        # моменту открытия продажи, как при обычном мониторинге.
+        detect()
+
+        released_at = site.release(target.observed_date,
+                                   target.observed_time, 8)
+        while not detect():
+            if time.time() - released_at > DETECT_TIMEOUT:
+                raise TimeoutError(f'Слот {target} не обнаружен')
+        result['time_to_detect'].append(time.time() - released_at)
+
+        collect()
+        # Запрос добавления в корзину уходит со страницы асинхронно,
+        # дожидаемся его на стороне имитации.
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            carts = [event for event in site.events('cart') if event['ok']]
+            if carts:
+                result['time_to_cart'].append(carts[-1]['time']
+                                              - released_at)
+                break
+            time.sleep(0.01)
+
+    return result
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Среднее, минимум и максимум в секундах"""
+
+    if not values:
+        return {}
+
+    return {
+        'avg': round(sum(values) / len(values), 3),
+        'min': round(min(values), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def run_mode(mode: str, server: MockServer, target: ObservedTarget,
+             args: argparse.Namespace, informer: Informer) -> Dict[str, Any]:
+    """
+    Прогон одного режима.
+
+    :param mode: browser или probe.
+    :param server: Сервер имитации.
+    :param target: Наблюдаемый слот.
+    :param args: Аргументы командной строки.
+    :param informer: Объект информера.
+    :return: Результат прогона.
+    """
+
+    from tickets_parser.browser_profile import get_profile
+    from tickets_parser.driver_pool import DriverPool
+    from tickets_parser.driver_resolver import DriverResolver
+    from tickets_parser.http_probe import HttpProbe
+
+    metrics.reset()
+    site = server.site
+    page_url = f'{server.url}/'
+
+    driver_path = args.driver_path or DriverResolver(
+        informer=informer).resolve()
+    profile = get_profile(args.profile,
+                          headless=False if args.show_browser else None)
+    pool = DriverPool(url=page_url, driver_path=driver_path, size=1,
+                      profile=profile, informer=informer)
+    pool.start()
+    probe = HttpProbe(
+        calendar_url=f'{server.url}/calendar?month={{month}}&year={{year}}',
+        performances_url=f'{server.url}/performances?date={{date}}'
+                         f'&page={{page}}',
+    )
+
+    try:
+        with pool.lease(timeout=120) as driver:
+            scanner = BrowserScanner(driver, page_url, informer)
+
+            def browser_detect() -> bool:
+                return target in scanner.scan([target])
+
+            def probe_detect() -> bool:
+                if not probe.check_many([target])[target].hit:
+                    return False
+                # Как в наблюдателе: браузер открывает страницу только
+                # после обнаружения билетов HTTP-проверкой.
+                return browser_detect()
+
+            detect = browser_detect if mode == 'browser' else probe_detect
+
+            site.reset()
+            throughput = measure_throughput(detect, args.duration)
+            release = measure_release(site, target, detect,
+                                      lambda: scanner.collect(target),
+                                      args.rounds)
+            memory_mb = scanner.memory_mb()
+    finally:
+        probe.close()
+        pool.close()
+
+    return {
+        'mode': mode,
+        'scans_per_minute': round(throughput, 2),
+        'time_to_detect': summarize(release['time_to_detect']),
+        'time_to_cart': summarize(release['time_to_cart']),
+        'memory_mb': round(memory_mb, 1),
+        'phases': {
+            item['labels'].get('phase'): {
+                key: round(value, 4) for key, value in item.items()
+                if key != 'labels'
+            }
+            for item in metrics.to_dict()['histograms'].get(
+                'phase_seconds', [])
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Текущий коммит репозитория, если он доступен"""
+
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path: Path, results: List[Dict[str, Any]]) -> None:
+    """Дописывание результатов в файл JSON-lines"""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as file:
+        for result in results:
+            file.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+def compare(path: Path, last: int) -> None:
+    """Вывод последних результатов каждого режима для сравнения"""
+
+    if not path.exists():
+        print(f'Результатов нет: {path}')
+        return
+
+    by_mode: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                by_mode.setdefault(result['mode'], []).append(result)
+
+    header = f'{"дата":<20}{"коммит":<10}{"задержка":>9}{"скан/мин":>10}' \
+             f'{"обнаруж.":>10}{"корзина":>10}{"память":>9}'
+    for mode, results in by_mode.items():
+        print(f'\n{mode}\n{header}')
+        for result in results[-last:]:
+            print(
+                f'{result["started"][:19]:<20}'
+                f'{result.get("commit") or "-":<10}'
+                f'{result["latency"]:>9.3f}'
+                f'{result["scans_per_minute"]:>10.1f}'
+                f'{result["time_to_detect"].get("avg", 0):>10.2f}'
+                f'{result["time_to_cart"].get("avg", 0):>10.2f}'
+                f'{result["memory_mb"]:>9.1f}'
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк бота на локальной имитации сайта.',
+    )
+    parser.add_argument('--modes', default='browser,probe',
+                        help='Режимы через запятую: browser, probe.')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='Сколько секунд измерять частоту сканирований.')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='Сколько раз открывать продажу слота.')
+    parser.add_argument('--latency', type=float, default=None,
+                        help='Задержка ответа имитации в секундах.')
+    parser.add_argument('--driver-path',
+                        help='Путь к chromedriver. По умолчанию - '
+                             'как у бота.')
+    parser.add_argument('--show-browser', action='store_true',
+                        help='Запускать браузер с окном.')
+    parser.add_argument('--profile', default='scan',
+                        help='Профиль браузера: scan или full.')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS,
+                        help='Файл результатов JSON-lines.')
+    parser.add_argument('--compare', type=int, metavar='N',
+                        help='Только вывести N последних результатов '
+                             'каждого режима.')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Выводить сообщения бота.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results, args.compare)
+        return 0
+
+    informer = Informer([StreamSink(sys.stdout)] if args.verbose else [],
+                        repeat_interval=0)
+    site = MockSite.load(latency=args.latency)
+    server = MockServer(site).start()
+    target_config = site.scenario['target']
+    target = ObservedTarget(
+        observed_date=site.day(target_config['day_offset']),
+        observed_time=dt.datetime.strptime(target_config['time'],
+                                           '%H:%M').time(),
+        count_tickets=2,
+    )
+
+    started = dt.datetime.now().isoformat()
+    results = []
+    try:
+        for mode in args.modes.split(','):
+            result = run_mode(mode.strip(), server, target, args, informer)
+            result.update({
+                'started': started,
+                'commit': git_commit(),
+                'latency': site.latency,
+                'headless': not args.show_browser,
+                'profile': args.profile,
+            })
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+    finally:
+        server.stop()
+        informer.close()
+
+    save_results(args.results, results)
+    compare(args.results, 5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
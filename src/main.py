@@ -1,10 +1,14 @@
 import sys
+import multiprocessing
 from PyQt5 import QtWidgets
 
 from main_window import MainWindow
 
 
 def main():
+    # Нужно для запуска рабочих процессов из собранного exe-файла.
+    multiprocessing.freeze_support()
+
     app = QtWidgets.QApplication([])
     _main_window = MainWindow()
     _main_window.show()
@@ -1,19 +1,116 @@
 import datetime as dt
-from PyQt5 import QtWidgets
+from typing import (
+    List,
+    Optional,
+)
+from PyQt5 import (
+    QtCore,
+    QtWidgets,
+)
 from decouple import config
 
 from ui.main_window import Ui_MainWindow
-from tickets_parser.observer import Observer
-from tickets_parser.informer import Informer
+from tickets_parser.informer import (
+    Informer,
+    InformerEvent,
+)
+from tickets_parser.log_sinks import (
+    CallbackSink,
+    FileSink,
+)
+from tickets_parser.target import (
+    ObservedTarget,
+    parse_pages,
+    spread_pages,
+)
+from tickets_parser.worker import (
+    ObserverWorker,
+    create_status_queue,
+    get_status_event,
+)
+
+
+class StatusListener(QtCore.QThread):
+    """
+    Поток чтения сообщений рабочих процессов.
+
+    Читает очередь сообщений и передает их в поток интерфейса сигналом,
+    поскольку изменять виджеты можно только из потока интерфейса.
+    """
+
+    # Событие информера из рабочего процесса.
+    event_received = QtCore.pyqtSignal(object)
+
+    def __init__(self, status_queue, parent=None) -> None:
+        """
+        Инициализатор класса.
+
+        :param status_queue: Общая очередь сообщений рабочих процессов.
+        :param parent: Родительский объект Qt.
+        """
+
+        super(StatusListener, self).__init__(parent)
+        self.__status_queue = status_queue
+        self.__running = True
+
+    def run(self) -> None:
+        """Чтение очереди до остановки потока"""
+
+        while self.__running:
+            event = get_status_event(self.__status_queue)
+            if event is not None:
+                self.event_received.emit(event.event)
+
+    def stop(self) -> None:
+        """Остановка потока"""
+
+        self.__running = False
+        self.wait()
+
+
+class WorkerStopper(QtCore.QThread):
+    """
+    Поток остановки рабочих процессов.
+
+    Наблюдатель перед выходом прерывает сканирование и закрывает браузеры,
+    что занимает время. Процессы останавливаются в этом потоке, чтобы
+    интерфейс не зависал. По окончании поток отправляет сигнал finished.
+    """
+
+    def __init__(self, workers: List[ObserverWorker], parent=None) -> None:
+        """
+        Инициализатор класса.
+
+        :param workers: Останавливаемые рабочие процессы.
+        :param parent: Родительский объект Qt.
+        """
+
+        super(WorkerStopper, self).__init__(parent)
+        self.__workers = list(workers)
+
+    def run(self) -> None:
+        """Остановка всех процессов"""
+
+        # Сначала сигналим всем процессам, чтобы они останавливались
+        # одновременно, а затем ждем каждый.
+        for worker in self.__workers:
+            worker.request_stop()
+        for worker in self.__workers:
+            worker.stop()
 
 
 class MainWindow(QtWidgets.QMainWindow):
     """
     Класс главного окна.
 
-    Обрабатывает все сигналы главного окна.
+    Обрабатывает все сигналы главного окна. Наблюдатели работают в
+    отдельных процессах, поэтому интерфейс не зависает во время
+    сканирования и сбора билетов.
     """
 
+    # Пачка строк для вывода в окно сообщений.
+    log_lines = QtCore.pyqtSignal(list)
+
     def __init__(self) -> None:
         """Инициализатор класса"""
 
@@ -22,10 +119,31 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.setupUi(self)
         self.setWindowTitle('Colosseum Bot')
 
-        # Информер для получения информации о состоянии бота.
-        self.__informer = Informer('logs.log', self.ui.bot_info_input)
-        # Наблюдатель за доступными билетами.
-        self.__observer = Observer()
+        # Окно сообщений хранит ограниченное количество строк, чтобы при
+        # долгой работе не расходовать память без предела.
+        self.ui.bot_info_input.document().setMaximumBlockCount(
+            config('UI_LOG_LINES', default=1000, cast=int)
+        )
+        self.log_lines.connect(self._log_lines_slot)
+
+        # Информер для получения информации о состоянии бота. Строки
+        # приходят из потока вывода информера и передаются в окно
+        # сигналом. Повторы уже подавлены в рабочих процессах.
+        self.__informer = Informer(
+            [FileSink('logs.log'), CallbackSink(self.log_lines.emit)],
+            repeat_interval=0,
+        )
+
+        # Рабочие процессы наблюдателей и общая очередь их сообщений.
+        self.__workers: List[ObserverWorker] = []
+        # Поток остановки процессов, если остановка идет.
+        self.__stopper: Optional[WorkerStopper] = None
+        # Окно закроется, как только процессы остановятся.
+        self.__close_requested = False
+        self.__status_queue = create_status_queue()
+        self.__status_listener = StatusListener(self.__status_queue, self)
+        self.__status_listener.event_received.connect(self._status_slot)
+        self.__status_listener.start()
 
         # Подключаем обработчик сигнала для старта мониторинга.
         self.ui.start_monitoring.clicked.connect(self._init_observer_slot)
@@ -33,7 +151,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.stop_monitoring.clicked.connect(self._stop_observer_slot)
 
     def _init_observer_slot(self) -> None:
-        """Инициализация наблюдателя за билетами"""
+        """
+        Инициализация наблюдателя за билетами.
+
+        Слот наблюдается на основной странице и на дополнительных
+        страницах продуктов из настроек. Новые слоты добавляются в уже
+        запущенный рабочий процесс, чтобы все слоты сканировались общими
+        браузерами, планировщиком и капчей. Отдельный процесс запускается,
+        только если подходящего процесса нет.
+        """
 
         # Считываение всех значений.
         date = dt.datetime.strptime(self.ui.date_input.text(), '%d.%m.%Y').date()
@@ -50,20 +176,56 @@ class MainWindow(QtWidgets.QMainWindow):
         max_tickets = self.ui.max_tickets.isChecked()
         auto_captcha = self.ui.auto_captcha.isChecked()
 
-        # Настройка и запуск наблюдателя.
-        if not self.__observer.worked:
-            self.__set_active_start_monitor_btn(False)
-            self.__observer.set_params(
-                url=config('PAGE_URL'),
-                observer_date=date,
-                observer_time=time,
-                count_tickets=count_tickets,
-                max_tickets=max_tickets,
-                auto_captcha=auto_captcha,
-                informer=self.__informer,
-            )
-            self.__observer.start()
-            self.__set_active_start_monitor_btn(True)
+        url = config('PAGE_URL')
+        targets = spread_pages(
+            [
+                ObservedTarget(
+                    observed_date=date,
+                    observed_time=time,
+                    count_tickets=count_tickets,
+                    max_tickets=max_tickets,
+                ),
+            ],
+            parse_pages(config('PAGE_URLS', default=''), main=url),
+        )
+
+        # Слоты добавляются в запущенный процесс с тем же режимом капчи.
+        for worker in self.__workers:
+            if worker.alive and worker.auto_captcha == auto_captcha:
+                worker.add_targets(targets)
+                return
+
+        # Настройка и запуск наблюдателя в отдельном процессе.
+        self.__set_active_start_monitor_btn(False)
+        worker = ObserverWorker(len(self.__workers) + 1, self.__status_queue)
+        worker.start(
+            url=url,
+            targets=targets,
+            auto_captcha=auto_captcha,
+            probe_mode=config('PROBE_MODE', default=False, cast=bool),
+        )
+        self.__workers.append(worker)
+        self.__set_active_start_monitor_btn(True)
+
+    def _status_slot(self, event: InformerEvent) -> None:
+        """
+        Вывод сообщения рабочего процесса.
+
+        :param event: Событие информера.
+        """
+
+        self.__informer.push_event(event)
+
+    def _log_lines_slot(self, lines: List[str]) -> None:
+        """
+        Вывод пачки строк в окно сообщений.
+
+        Вызывается в потоке интерфейса.
+
+        :param lines: Строки сообщений.
+        """
+
+        self.ui.bot_info_input.append('\n'.join(lines))
 
     def __set_active_start_monitor_btn(self, active: bool) -> None:
         """
@@ -82,12 +244,22 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.start_monitoring.setDisabled(False)
 
     def _stop_observer_slot(self) -> None:
-        """Остановка наблюдателя за билетами"""
+        """Остановка всех наблюдателей за билетами в фоне"""
 
-        if self.__observer.worked:
+        if self.__workers and self.__stopper is None:
             self.__set_active_stop_monitor_btn(False)
-            self.__observer.stop()
-            self.__set_active_stop_monitor_btn(True)
+            self.__stopper = WorkerStopper(self.__workers, self)
+            self.__stopper.finished.connect(self._workers_stopped_slot)
+            self.__workers = []
+            self.__stopper.start()
+
+    def _workers_stopped_slot(self) -> None:
+        """Завершение остановки наблюдателей"""
+
+        self.__stopper = None
+        self.__set_active_stop_monitor_btn(True)
+        if self.__close_requested:
+            self.close()
 
     def __set_active_stop_monitor_btn(self, active: bool) -> None:
         """
@@ -104,3 +276,20 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             self.ui.stop_monitoring.setText('Стоп')
             self.ui.stop_monitoring.setDisabled(False)
+
+    def closeEvent(self, event) -> None:
+        """Остановка рабочих процессов при закрытии окна"""
+
+        # Окно закрывается только после остановки процессов, чтобы не
+        # оставить запущенные браузеры. Пока процессы останавливаются,
+        # интерфейс отвечает.
+        if self.__workers or self.__stopper is not None:
+            self.__close_requested = True
+            self._stop_observer_slot()
+            event.ignore()
+            return
+
+        self.__status_listener.stop()
+        self.__informer.close()
+
+        super(MainWindow, self).closeEvent(event)
@@ -0,0 +1,307 @@
+import hashlib
+import threading
+import datetime as dt
+from dataclasses import dataclass
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .metrics import metrics
+
+
+def fingerprint(markup: str) -> str:
+    """
+    Отпечаток фрагмента страницы.
+
+    :param markup: Разметка или текст фрагмента.
+    :return: Короткий хеш фрагмента в шестнадцатеричном виде.
+    """
+
+    return hashlib.blake2b(markup.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ChangeKind(Enum):
+    """Вид изменения доступности"""
+
+    # Дата стала доступна, либо на время появились билеты.
+    AVAILABLE = 'available'
+    # Изменилось количество доступных билетов на время.
+    COUNT_CHANGED = 'count_changed'
+    # Дата стала недоступна, либо билеты на время закончились.
+    SOLD_OUT = 'sold_out'
+
+
+@dataclass(frozen=True)
+class AvailabilityChange:
+    """Изменение доступности даты или времени между сканированиями"""
+
+    kind: ChangeKind
+    date: dt.date
+    # Время сеанса. None - изменение доступности всей даты.
+    time: Optional[dt.time] = None
+    # Количество билетов до и после изменения.
+    previous: Optional[int] = None
+    current: Optional[int] = None
+
+    def __str__(self) -> str:
+        slot = f'{self.date:%d.%m.%Y}'
+        if self.time is not None:
+            slot += f' {self.time:%H:%M}'
+
+        if self.kind == ChangeKind.AVAILABLE:
+            if self.current is None:
+                return f'{slot}: дата стала доступна'
+            return f'{slot}: появились билеты ({self.current})'
+        if self.kind == ChangeKind.COUNT_CHANGED:
+            return f'{slot}: билетов {self.previous} -> {self.current}'
+        if self.time is None:
+            return f'{slot}: дата стала недоступна'
+        return f'{slot}: билеты закончились'
+
+
+class AvailabilitySnapshot:
+    """
+    Класс хранилища последнего известного состояния доступности.
+
+    Хранит доступность дат и количество билетов на каждое время, а также
+    отпечатки фрагментов страницы (календаря месяца, страницы списка
+    сеансов) вместе с разобранным содержимым. Если отпечаток фрагмента не
+    изменился с прошлого сканирования, фрагмент не разбирается заново.
+    При обновлении состояния хранилище сообщает об изменениях слушателю.
+    Первое наблюдение даты или времени только запоминается, изменением оно
+    не считается.
+    """
+
+    def __init__(
+            self,
+            listener: Optional[Callable[[AvailabilityChange], None]] = None,
+    ) -> None:
+        """
+        Инициализатор класса.
+
+        :param listener: Функция, получающая изменения доступности.
+        """
+
+        self.__listener = listener
+
+        # Доступность дат.
+        self.__days: Dict[dt.date, bool] = {}
+        # Количество билетов на время сеанса.
+        self.__counts: Dict[Tuple[dt.date, dt.time], int] = {}
+        # Времена, которые в прошлый раз были в части списка сеансов даты.
+        self.__sections: Dict[Tuple[dt.date, Hashable], Set[dt.time]] = {}
+        # Фрагменты страницы: отпечаток и разобранное содержимое.
+        self.__fragments: Dict[Hashable, Tuple[str, Any]] = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def fragment(self, key: Hashable, digest: str) -> Optional[Any]:
+        """
+        Получение разобранного фрагмента, если он не изменился.
+
+        :param key: Ключ фрагмента, например ('calendar', месяц).
+        :param digest: Текущий отпечаток фрагмента.
+        :return:
+            Содержимое, сохраненное с тем же отпечатком, либо None, если
+            фрагмент изменился или еще не разбирался.
+        """
+
+        with self.__lock:
+            stored = self.__fragments.get(key)
+            hit = stored is not None and stored[0] == digest
+            if hit:
+                self.__hits += 1
+            else:
+                self.__misses += 1
+
+        metrics.inc('fragment_cache', result='hit' if hit else 'miss')
+
+        return stored[1] if hit else None
+
+    def known_fingerprint(self, key: Hashable) -> Optional[str]:
+        """
+        Отпечаток фрагмента с прошлого разбора.
+
+        :param key: Ключ фрагмента.
+        :return: Отпечаток, либо None, если фрагмент еще не разбирался.
+        """
+
+        with self.__lock:
+            stored = self.__fragments.get(key)
+
+        return stored[0] if stored is not None else None
+
+    def store_fragment(self, key: Hashable, digest: str, value: Any) -> None:
+        """
+        Сохранение разобранного фрагмента.
+
+        :param key: Ключ фрагмента.
+        :param digest: Отпечаток фрагмента.
+        :param value: Разобранное содержимое фрагмента.
+        """
+
+        with self.__lock:
+            self.__fragments[key] = (digest, value)
+
+    def update_days(self,
+                    days: Dict[dt.date, bool]) -> List[AvailabilityChange]:
+        """
+        Обновление доступности дат.
+
+        :param days: Словарь "дата - доступна ли дата".
+        :return: Изменения доступности.
+        """
+
+        changes: List[AvailabilityChange] = []
+        with self.__lock:
+            for day, available in days.items():
+                previous = self.__days.get(day)
+                self.__days[day] = available
+                if previous is None or previous == available:
+                    continue
+
+                changes.append(AvailabilityChange(
+                    kind=ChangeKind.AVAILABLE if available
+                    else ChangeKind.SOLD_OUT,
+                    date=day,
+                ))
+                # У недоступной даты билетов нет ни на одно время.
+                if not available:
+                    for key in self.__counts:
+                        if key[0] == day:
+                            self.__counts[key] = 0
+
+        self._notify(changes)
+
+        return changes
+
+    def update_times(self, day: dt.date,
+                     counts: Dict[dt.time, Optional[int]],
+                     section: Hashable = None) -> List[AvailabilityChange]:
+        """
+        Обновление количества билетов на времена сеансов даты.
+
+        Время, которое пропало из той же части списка и не показано в
+        другой его части, считается распроданным и забывается.
+
+        :param day: Дата сеансов.
+        :param counts:
+            Словарь "время сеанса - количество билетов". None - время есть
+            в списке, но количество неизвестно.
+        :param section:
+            Часть списка сеансов, которую целиком описывает counts,
+            например номер страницы. None - весь список.
+        :return: Изменения доступности.
+        """
+
+        changes: List[AvailabilityChange] = []
+        with self.__lock:
+            shown = set(counts)
+            known = self.__sections.get((day, section), set())
+            self.__sections[(day, section)] = shown
+            # При сдвиге списка время переходит на соседнюю страницу, и
+            # распроданным оно не считается.
+            elsewhere = set().union(*(
+                times for (other_day, other), times in self.__sections.items()
+                if other_day == day and other != section
+            ))
+            for time in sorted(known - shown - elsewhere):
+                previous = self.__counts.pop((day, time), None)
+                if previous:
+                    changes.append(AvailabilityChange(
+                        kind=ChangeKind.SOLD_OUT,
+                        date=day,
+                        time=time,
+                        previous=previous,
+                        current=0,
+                    ))
+
+            for time, count in counts.items():
+                if count is None:
+                    continue
+                previous = self.__counts.get((day, time))
+                self.__counts[(day, time)] = count
+                if previous is None or previous == count:
+                    continue
+
+                if previous == 0:
+                    kind = ChangeKind.AVAILABLE
+                elif count == 0:
+                    kind = ChangeKind.SOLD_OUT
+                else:
+                    kind = ChangeKind.COUNT_CHANGED
+                changes.append(AvailabilityChange(
+                    kind=kind,
+                    date=day,
+                    time=time,
+                    previous=previous,
+                    current=count,
+                ))
+
+        self._notify(changes)
+
+        return changes
+
+    def available(self, day: dt.date) -> Optional[bool]:
+        """
+        Последняя известная доступность даты.
+
+        :param day: Дата.
+        :return: Доступна ли дата, либо None, если дата не наблюдалась.
+        """
+
+        with self.__lock:
+            return self.__days.get(day)
+
+    def count(self, day: dt.date, time: dt.time) -> Optional[int]:
+        """
+        Последнее известное количество билетов на время сеанса.
+
+        :param day: Дата сеанса.
+        :param time: Время сеанса.
+        :return: Количество билетов, либо None, если время не наблюдалось.
+        """
+
+        with self.__lock:
+            return self.__counts.get((day, time))
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Статистика повторного использования фрагментов.
+
+        :return:
+            Словарь с ключами hits (фрагмент не изменился) и misses
+            (фрагмент разобран заново).
+        """
+
+        with self.__lock:
+            return {'hits': self.__hits, 'misses': self.__misses}
+
+    def reset(self) -> None:
+        """Сброс всего сохраненного состояния"""
+
+        with self.__lock:
+            self.__days.clear()
+            self.__counts.clear()
+            self.__sections.clear()
+            self.__fragments.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+    def _notify(self, changes: List[AvailabilityChange]) -> None:
+        """Передача изменений слушателю"""
+
+        for change in changes:
+            metrics.inc('availability_changes', kind=change.kind.value)
+            if self.__listener is not None:
+                self.__listener(change)
@@ -0,0 +1,166 @@
+from dataclasses import (
+    dataclass,
+    replace,
+)
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)
+from selenium import webdriver
+
+
+# Расширения файлов, которые не нужны для сканирования: картинки, видео,
+# звук и шрифты.
+_BLOCKED_EXTENSIONS = (
+    'png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'bmp',
+    'mp4', 'webm', 'mp3', 'ogg', 'wav',
+    'woff', 'woff2', 'ttf', 'otf', 'eot',
+)
+# Сторонние домены аналитики, рекламы, виджетов и шрифтов.
+_BLOCKED_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'facebook.net',
+    'connect.facebook.com',
+    'hotjar.com',
+    'mc.yandex.ru',
+    'clarity.ms',
+    'youtube.com',
+    'fonts.googleapis.com',
+    'fonts.gstatic.com',
+)
+
+# Шаблоны адресов для Network.setBlockedURLs. Расширения учитываются как
+# в конце адреса, так и перед строкой запроса.
+SCAN_BLOCKED_URLS: Tuple[str, ...] = tuple(
+    pattern
+    for extension in _BLOCKED_EXTENSIONS
+    for pattern in (f'*.{extension}', f'*.{extension}?*')
+) + tuple(f'*{domain}*' for domain in _BLOCKED_DOMAINS)
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """
+    Профиль запуска браузера.
+
+    Описывает флаги запуска Chrome и блокировку запросов. Флаги задаются
+    при запуске браузера, а блокировку запросов можно переключить в уже
+    запущенном браузере методом apply, например, перед сбором билетов.
+    """
+
+    name: str
+    headless: bool = False
+    # Шаблоны адресов запросов, которые браузер не выполняет.
+    blocked_urls: Tuple[str, ...] = ()
+    disable_extensions: bool = False
+    disable_gpu: bool = False
+    # Ограничение JS-кучи страницы в мегабайтах. 0 - без ограничения.
+    renderer_memory_mb: int = 0
+    # Стратегия загрузки страницы: normal - ждать загрузки всех ресурсов,
+    # eager - только DOM.
+    page_load_strategy: str = 'normal'
+    extra_arguments: Tuple[str, ...] = ()
+
+    def chrome_options(self) -> webdriver.ChromeOptions:
+        """
+        Настройки запуска Chrome для профиля.
+
+        :return: Настройки для webdriver.Chrome.
+        """
+
+        options = webdriver.ChromeOptions()
+        options.page_load_strategy = self.page_load_strategy
+        options.add_argument('--start-maximized')
+        if self.headless:
+            options.add_argument('--headless')
+            options.add_argument('--window-size=1920,1080')
+        if self.disable_extensions:
+            options.add_argument('--disable-extensions')
+        if self.disable_gpu:
+            options.add_argument('--disable-gpu')
+        if self.renderer_memory_mb > 0:
+            options.add_argument(
+                f'--js-flags=--max-old-space-size={self.renderer_memory_mb}'
+            )
+        for argument in self.extra_arguments:
+            options.add_argument(argument)
+
+        return options
+
+    def apply(self, driver: webdriver.Chrome) -> None:
+        """
+        Применение блокировки запросов профиля к запущенному браузеру.
+
+        :param driver: Веб-драйвер для управления браузером.
+        """
+
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs',
+                               {'urls': list(self.blocked_urls)})
+
+
+# Облегченный профиль для сканирования: без окна, без картинок, шрифтов
+# и сторонних скриптов, с ограниченной памятью.
+SCAN_PROFILE = BrowserProfile(
+    name='scan',
+    headless=True,
+    blocked_urls=SCAN_BLOCKED_URLS,
+    disable_extensions=True,
+    disable_gpu=True,
+    renderer_memory_mb=256,
+    page_load_strategy='eager',
+    extra_arguments=(
+        '--disable-dev-shm-usage',
+        '--disable-background-networking',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--mute-audio',
+        '--no-first-run',
+        '--renderer-process-limit=2',
+    ),
+)
+
+# Полный профиль для сбора билетов и оплаты: страница загружается целиком,
+# как в обычном браузере.
+FULL_PROFILE = BrowserProfile(name='full')
+
+PROFILES: Dict[str, BrowserProfile] = {
+    profile.name: profile for profile in (SCAN_PROFILE, FULL_PROFILE)
+}
+
+
+def get_profile(name: str, *,
+                headless: Optional[bool] = None,
+                extra_blocked_urls: Tuple[str, ...] = ()) -> BrowserProfile:
+    """
+    Получение профиля по имени.
+
+    :param name: Имя профиля: scan или full.
+    :param headless: Запускать без окна. None - как задано в профиле.
+    :param extra_blocked_urls:
+        Дополнительные шаблоны блокируемых адресов.
+    :return: Профиль браузера.
+    :raises ValueError: Если профиля с таким именем нет.
+    """
+
+    try:
+        profile = PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f'Неизвестный профиль браузера "{name}", '
+            f'доступны: {", ".join(PROFILES)}'
+        )
+
+    if headless is not None:
+        profile = replace(profile, headless=headless)
+    if extra_blocked_urls:
+        profile = replace(
+            profile,
+            blocked_urls=profile.blocked_urls + tuple(extra_blocked_urls),
+        )
+
+    return profile
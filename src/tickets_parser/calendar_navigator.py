@@ -0,0 +1,239 @@
+import datetime as dt
+from typing import (
+    Dict,
+    Optional,
+)
+from selenium import webdriver
+from selenium.common.exceptions import (
+    TimeoutException,
+    WebDriverException,
+)
+
+from .load_waiting import wait_condition
+from .informer import Informer
+from .site_profile import site
+
+
+# Скрипт прямого перехода к месяцу. Кнопка переключения хранит в атрибутах
+# следующие месяц и год, обработчик сайта загружает указанный в них месяц.
+# Подменяем атрибуты на нужный месяц и вызываем обработчик один раз.
+_JUMP_SCRIPT = '''
+var button = document.querySelector(arguments[0]);
+if (!button) {
+    return false;
+}
+button.setAttribute('data-month', arguments[1]);
+button.setAttribute('data-year', arguments[2]);
+if (window.jQuery) {
+    window.jQuery(button).data('month', arguments[1]);
+    window.jQuery(button).data('year', arguments[2]);
+}
+button.click();
+return true;
+'''
+
+# Скрипт чтения текущего месяца календаря. Возвращает null, пока идут
+# AJAX-запросы jQuery.
+_CURRENT_MONTH_SCRIPT = '''
+if (window.jQuery && window.jQuery.active !== 0) {
+    return null;
+}
+var button = document.querySelector(arguments[0]);
+if (!button) {
+    return null;
+}
+return [button.getAttribute('data-month'), button.getAttribute('data-year')];
+'''
+
+# Месяц, показанный в календаре каждой сессии браузера после последнего
+# сканирования. Позволяет не перезагружать страницу и не листать календарь
+# заново при повторных сканированиях.
+_shown_months: Dict[str, dt.date] = {}
+
+
+class CalendarNavigator:
+    """
+    Класс переключения месяцев календаря.
+
+    Переходит к нужному месяцу одним вызовом обработчика сайта вместо
+    последовательного нажатия кнопки "следующий месяц". Пошаговое
+    переключение используется только тогда, когда прямой переход
+    не удался.
+    """
+
+    # Сколько секунд ждать загрузки месяца после прямого перехода.
+    JUMP_TIMEOUT = 10.0
+
+    def __init__(self, driver: webdriver.Chrome,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param driver: Веб-драйвер для управления браузером.
+        :param informer: Объект информатора о состоянии бота.
+        """
+
+        self.__driver = driver
+        self.__informer = informer
+
+    @classmethod
+    def shown_month(cls, driver: webdriver.Chrome) -> Optional[dt.date]:
+        """
+        Месяц, оставшийся в календаре после прошлого сканирования.
+
+        :param driver: Веб-драйвер для управления браузером.
+        :return: Первый день месяца, либо None, если месяц неизвестен.
+        """
+
+        return _shown_months.get(driver.session_id)
+
+    @classmethod
+    def forget(cls, driver: webdriver.Chrome) -> None:
+        """
+        Сброс запомненного месяца, например, после перезагрузки страницы.
+
+        :param driver: Веб-драйвер для управления браузером.
+        """
+
+        _shown_months.pop(driver.session_id, None)
+
+    def current_month(self) -> dt.date:
+        """
+        Получение текущего месяца календаря.
+
+        :return: Первый день текущего месяца.
+        """
+
+        cached = self.shown_month(self.__driver)
+        if cached is not None:
+            return cached
+
+        return self.__read_current_month()
+
+    def go_to(self, month: dt.date, reload: bool = False) -> bool:
+        """
+        Переход к нужному месяцу.
+
+        :param month: Первый день нужного месяца.
+        :param reload:
+            Загрузить месяц заново, даже если он уже открыт. Нужно, чтобы
+            получить актуальную доступность дат без перезагрузки страницы.
+        :return:
+            True, если календарь показывает нужный месяц, False, если
+            перейти к месяцу можно только после перезагрузки страницы.
+        """
+
+        current = self.current_month()
+        if current == month and not reload:
+            return True
+
+        if self.__jump(month):
+            return True
+
+        self.__log(
+            'Прямой переход к месяцу не удался, переключение по одному месяцу',
+            Informer.MessageLevel.ERROR,
+        )
+        self.forget(self.__driver)
+        current = self.__read_current_month()
+
+        # Кнопкой можно листать только вперед, и обновить тот же месяц
+        # кнопкой нельзя.
+        if month < current or (month == current and reload):
+            return False
+
+        self.__step_to(month, current)
+        return True
+
+    def __jump(self, month: dt.date) -> bool:
+        """Прямой переход к месяцу одним вызовом обработчика"""
+
+        try:
+            clicked = self.__driver.execute_script(
+                _JUMP_SCRIPT, site['next_month'].css,
+                str(month.month), str(month.year),
+            )
+            if not clicked:
+                return False
+
+            wait_condition(
+                lambda: self.__month_from_script() == month,
+                timeout=self.JUMP_TIMEOUT,
+                name='month_jump',
+            )
+        except (TimeoutException, WebDriverException):
+            return False
+
+        _shown_months[self.__driver.session_id] = month
+        return True
+
+    def __step_to(self, month: dt.date, current: dt.date) -> None:
+        """Пошаговое переключение месяцев кнопкой"""
+
+        while current != month:
+            next_month_btn = site['next_month'].find(self.__driver)
+            webdriver.ActionChains(self.__driver).click(next_month_btn).perform()
+            # Ждем, пока календарь загрузит следующий месяц и кнопка
+            # переключения получит новые месяц и год.
+            current = wait_condition(
+                lambda previous=current: self.__month_switched(previous),
+                name='month_switch',
+            )
+
+        _shown_months[self.__driver.session_id] = month
+
+    def __month_switched(self, previous: dt.date) -> Optional[dt.date]:
+        """
+        Проверка того, что календарь переключился на другой месяц.
+
+        :param previous: Месяц календаря до переключения.
+        :return:
+            Новый месяц календаря, если переключение завершилось, иначе None.
+        """
+
+        current = self.__month_from_script()
+        return current if current is not None and current != previous \
+            else None
+
+    def __read_current_month(self) -> dt.date:
+        """Чтение текущего месяца календаря со страницы"""
+
+        current = wait_condition(self.__month_from_script,
+                                 name='month_read')
+        _shown_months[self.__driver.session_id] = current
+        return current
+
+    def __month_from_script(self) -> Optional[dt.date]:
+        """
+        Получение текущего месяца календаря одним вызовом скрипта.
+
+        Кнопка переключения хранит следующие месяц и год, из них
+        вычисляется текущий месяц.
+
+        :return: Первый день текущего месяца, либо None, если календарь
+            еще загружается.
+        """
+
+        attributes = self.__driver.execute_script(
+            _CURRENT_MONTH_SCRIPT, site['next_month'].css,
+        )
+        if not attributes:
+            return None
+
+        next_month, next_year = int(attributes[0]), int(attributes[1])
+
+        # Вычисление текущих месяца и года с учетом того, что следующий
+        # месяц может быть первым.
+        current_year = next_year
+        current_month = next_month - 1
+        if current_month == 0:
+            current_month = 12
+            current_year -= 1
+
+        return dt.date(year=current_year, month=current_month, day=1)
+
+    def __log(self, msg: str, level: Informer.MessageLevel) -> None:
+        """Сообщение информеру, если он задан"""
+
+        if self.__informer is not None:
+            self.__informer.push_message(msg, level)
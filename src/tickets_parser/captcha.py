@@ -0,0 +1,308 @@
+import time
+import threading
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+from .informer import Informer
+from .metrics import timed
+
+
+# Ошибки сервиса, которые не исчезнут при повторе: нужен другой ключ,
+# пополнение баланса или исправление настроек.
+FATAL_CAPTCHA_ERRORS = frozenset((
+    'ERROR_WRONG_USER_KEY',
+    'ERROR_KEY_DOES_NOT_EXIST',
+    'ERROR_ZERO_BALANCE',
+    'ERROR_IP_NOT_ALLOWED',
+    'IP_BANNED',
+    'ERROR_GOOGLEKEY',
+    'ERROR_WRONG_GOOGLEKEY',
+    'ERROR_PAGEURL',
+))
+
+
+class CaptchaError(Exception):
+    """Ошибка решения капчи"""
+
+    def __init__(self, message: str, code: Optional[str] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param message: Описание ошибки.
+        :param code:
+            Код ошибки сервиса, например ERROR_ZERO_BALANCE. None - сбой
+            связи с сервисом или ошибка без кода.
+        """
+
+        super().__init__(message)
+        self.code = code
+
+    @property
+    def fatal(self) -> bool:
+        """Повтор не поможет: ошибка в ключе, балансе или настройках"""
+
+        return self.code in FATAL_CAPTCHA_ERRORS
+
+
+class CaptchaSolver(ABC):
+    """
+    Бэкенд сервиса решения капчи.
+
+    Сервис принимает задачу на решение и затем отдает решение по запросу.
+    """
+
+    @abstractmethod
+    def submit(self, site_key: str, page_url: str) -> str:
+        """
+        Отправка капчи на решение.
+
+        :param site_key: Ключ рекапчи на странице.
+        :param page_url: URL-адрес страницы с рекапчей.
+        :return: Идентификатор задачи в сервисе.
+        :raises CaptchaError: Если сервис не принял задачу.
+        """
+
+    @abstractmethod
+    def poll(self, task_id: str) -> Optional[str]:
+        """
+        Запрос решения капчи.
+
+        :param task_id: Идентификатор задачи в сервисе.
+        :return: Токен решения, либо None, если капча еще не решена.
+        :raises CaptchaError: Если сервис не смог решить капчу.
+        """
+
+    def close(self) -> None:
+        """Освобождение ресурсов бэкенда"""
+
+
+class TwoCaptchaSolver(CaptchaSolver):
+    """
+    Бэкенд сервиса 2captcha.
+
+    Все запросы идут через одну HTTP-сессию с пулом соединений.
+    Адрес сервиса настраивается, поэтому вместо 2captcha можно использовать
+    локальную заглушку с тем же API.
+    """
+
+    def __init__(self, api_key: str,
+                 base_url: str = 'http://2captcha.com', *,
+                 timeout: float = 30.0,
+                 session: Optional[requests.Session] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param api_key: Ключ API сервиса.
+        :param base_url: Адрес сервиса.
+        :param timeout: Таймаут одного запроса в секундах.
+        :param session: Готовая HTTP-сессия, если ее нужно переиспользовать.
+        """
+
+        self.__api_key = api_key
+        self.__base_url = base_url.rstrip('/')
+        self.__timeout = timeout
+
+        self.__session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+    def submit(self, site_key: str, page_url: str) -> str:
+        payload = self._request('post', 'in.php', {
+            'key': self.__api_key,
+            'method': 'userrecaptcha',
+            'googlekey': site_key,
+            'pageurl': page_url,
+            'json': 1,
+        })
+
+        # Если капча успешно принята в обработку, вернет ее id.
+        if payload.get('status') != 1:
+            code = payload.get('request')
+            raise CaptchaError(f'Капча не принята: {code}', code=code)
+
+        return str(payload.get('request'))
+
+    def poll(self, task_id: str) -> Optional[str]:
+        payload = self._request('get', 'res.php', {
+            'key': self.__api_key,
+            'action': 'get',
+            'id': task_id,
+            'json': 1,
+        })
+
+        if payload.get('status') == 1:
+            return payload.get('request')
+        if payload.get('request') == 'CAPCHA_NOT_READY':
+            return None
+
+        code = payload.get('request')
+        raise CaptchaError(f'Капча не решена: {code}', code=code)
+
+    def close(self) -> None:
+        self.__session.close()
+
+    def _request(self, method: str, path: str, params: dict) -> dict:
+        """
+        Запрос к сервису и разбор JSON-ответа.
+
+        :param method: HTTP-метод.
+        :param path: Путь относительно адреса сервиса.
+        :param params: Параметры запроса.
+        :return: Ответ сервиса.
+        :raises CaptchaError: Если сервис недоступен или ответ не разобран.
+        """
+
+        try:
+            response = self.__session.request(
+                method, f'{self.__base_url}/{path}',
+                params=params, timeout=self.__timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise CaptchaError(f'Ошибка ответа сервиса капчи: {e}') from e
+
+
+class CaptchaService:
+    """
+    Класс неблокирующего решения капчи.
+
+    Решает капчи в пуле потоков, опрашивая сервис с нарастающим интервалом
+    и общим сроком на решение. Сбои связи при опросе не прерывают решение:
+    опрос повторяется до истечения срока. Решение можно запросить заранее, например,
+    как только слот стал доступен, и забрать его после добавления билетов в
+    корзину, чтобы ожидание капчи шло параллельно со сбором билетов.
+    """
+
+    def __init__(self, solver: CaptchaSolver, *,
+                 max_workers: int = 4,
+                 deadline: float = 180.0,
+                 initial_delay: float = 5.0,
+                 poll_interval: float = 5.0,
+                 max_poll_interval: float = 15.0,
+                 backoff: float = 1.5,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param solver: Бэкенд сервиса решения капчи.
+        :param max_workers: Сколько капч решается одновременно.
+        :param deadline: Общий срок решения одной капчи в секундах.
+        :param initial_delay:
+            Сколько секунд ждать перед первым запросом решения.
+        :param poll_interval: Первый интервал опроса сервиса в секундах.
+        :param max_poll_interval:
+            Максимальный интервал опроса сервиса в секундах.
+        :param backoff: Во сколько раз увеличивается интервал опроса.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__solver = solver
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='captcha',
+        )
+        self.__deadline = deadline
+        self.__initial_delay = initial_delay
+        self.__poll_interval = poll_interval
+        self.__max_poll_interval = max_poll_interval
+        self.__backoff = backoff
+        self.__informer = informer
+        # Выставляется при остановке, чтобы решения в фоне не продолжали
+        # опрашивать сервис.
+        self.__cancelled = threading.Event()
+
+    def solve_async(self, site_key: str, page_url: str) -> 'Future[str]':
+        """
+        Запуск решения капчи в фоне.
+
+        :param site_key: Ключ рекапчи на странице.
+        :param page_url: URL-адрес страницы с рекапчей.
+        :return: Future, которое вернет токен решения.
+        """
+
+        return self.__executor.submit(self.solve, site_key, page_url)
+
+    @timed('captcha_solve')
+    def solve(self, site_key: str, page_url: str) -> str:
+        """
+        Решение капчи.
+
+        :param site_key: Ключ рекапчи на странице.
+        :param page_url: URL-адрес страницы с рекапчей.
+        :return: Токен решения.
+        :raises CaptchaError:
+            Если капчу не удалось решить в срок, либо решение отменено
+            остановкой сервиса.
+        """
+
+        deadline = time.monotonic() + self.__deadline
+        self._check_cancelled()
+        task_id = self.__solver.submit(site_key, page_url)
+        self.__log('Капча отправлена на решение', Informer.MessageLevel.INFO)
+
+        interval = self.__poll_interval
+        self.__cancelled.wait(min(self.__initial_delay,
+                                  max(deadline - time.monotonic(), 0)))
+
+        # Опрашиваем сервис до тех пор, пока не получим решение капчи или
+        # не истечет срок.
+        while True:
+            self._check_cancelled()
+            try:
+                token = self.__solver.poll(task_id)
+            except CaptchaError as e:
+                # Ошибка с кодом - ответ сервиса, повтор не поможет. Без
+                # кода - сбой связи: задача уже решается, опрос повторяется.
+                if e.code is not None:
+                    raise
+                self.__log(f'Ошибка опроса сервиса капчи: {e}',
+                           Informer.MessageLevel.ERROR)
+                token = None
+            if token is not None:
+                self.__log('Капча решена!', Informer.MessageLevel.INFO)
+                return token
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CaptchaError(
+                    f'Капча не решена за {self.__deadline:.0f} с'
+                )
+            self.__log('Капча решается...', Informer.MessageLevel.INFO)
+            self.__cancelled.wait(min(interval, remaining))
+            interval = min(interval * self.__backoff, self.__max_poll_interval)
+
+    def _check_cancelled(self) -> None:
+        """
+        Проверка отмены решения.
+
+        :raises CaptchaError: Если сервис остановлен.
+        """
+
+        if self.__cancelled.is_set():
+            raise CaptchaError('Решение капчи отменено')
+
+    def shutdown(self) -> None:
+        """Остановка пула потоков и закрытие бэкенда"""
+
+        # Решения в фоне прерываются при следующей проверке отмены, а
+        # ожидающие в очереди завершатся сразу.
+        self.__cancelled.set()
+        self.__executor.shutdown(wait=False)
+        self.__solver.close()
+
+    def __log(self, msg: str, level: Informer.MessageLevel) -> None:
+        """Сообщение информеру, если он задан"""
+
+        if self.__informer is not None:
+            self.__informer.push_message(msg, level)
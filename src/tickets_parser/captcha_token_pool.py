@@ -0,0 +1,264 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import (
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .captcha import (
+    CaptchaError,
+    CaptchaService,
+)
+from .informer import Informer
+
+
+class CaptchaTokenPool:
+    """
+    Класс пула заранее решенных капч.
+
+    Пока идет мониторинг, держит наготове заданное количество свежих
+    токенов рекапчи. Токен живет около двух минут, поэтому у каждого
+    токена запоминается время получения, и токен выбрасывается до истечения
+    срока. Сбор билетов забирает токен мгновенно, а замена запрашивается
+    в фоне. После неудачного решения следующая капча заказывается с
+    нарастающей задержкой, а при ошибке ключа или баланса заблаговременное
+    решение прекращается, чтобы не тратить деньги на заведомо неудачные
+    запросы.
+    """
+
+    def __init__(self, service: CaptchaService,
+                 site_key: str,
+                 page_url: str, *,
+                 size: int = 1,
+                 ttl: float = 120.0,
+                 safety_margin: float = 20.0,
+                 retry_delay: float = 5.0,
+                 max_retry_delay: float = 300.0,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param service: Сервис решения капчи.
+        :param site_key: Ключ рекапчи на странице.
+        :param page_url: URL-адрес страницы с рекапчей.
+        :param size: Сколько свежих токенов держать наготове.
+        :param ttl: Срок жизни токена в секундах.
+        :param safety_margin:
+            За сколько секунд до истечения срока токен считается
+            устаревшим. Нужен запас на ввод токена и отправку формы.
+        :param retry_delay:
+            Задержка в секундах перед новым заказом капчи после первой
+            неудачи. Удваивается с каждой неудачей подряд.
+        :param max_retry_delay: Максимальная задержка после неудач.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__service = service
+        self.__site_key = site_key
+        self.__page_url = page_url
+        self.__size = size
+        self.__lifetime = ttl - safety_margin
+        self.__retry_delay = retry_delay
+        self.__max_retry_delay = max_retry_delay
+        self.__informer = informer
+
+        # Готовые токены с временем получения, от старых к новым.
+        self.__tokens: Deque[Tuple[str, float]] = deque()
+        # Запрошенные, но еще не решенные капчи.
+        self.__pending: List['Future[str]'] = []
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        # Неудачи решения подряд и время, раньше которого новые капчи не
+        # заказываются.
+        self.__failures = 0
+        self.__retry_at = 0.0
+        # Заблаговременное решение остановлено из-за неустранимой ошибки.
+        self.__disabled = False
+
+        # Метрики пула.
+        self.__hits = 0
+        self.__misses = 0
+        self.__wasted = 0
+        self.__spent = 0
+
+    def start(self) -> None:
+        """Запуск фонового пополнения пула"""
+
+        self.__stopped.clear()
+        self.__failures = 0
+        self.__retry_at = 0.0
+        self.__disabled = False
+        self.__thread = threading.Thread(
+            target=self._run, name='captcha-token-pool', daemon=True,
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Остановка фонового пополнения пула"""
+
+        self.__stopped.set()
+        self.__wakeup.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout=5)
+            self.__thread = None
+
+        with self.__lock:
+            for future in self.__pending:
+                future.cancel()
+            self.__pending.clear()
+            self.__wasted += len(self.__tokens)
+            self.__tokens.clear()
+
+    def take(self) -> Optional[str]:
+        """
+        Получение свежего токена из пула.
+
+        :return: Токен, либо None, если свежих токенов нет.
+        """
+
+        with self.__lock:
+            self._evict_expired()
+            if self.__tokens:
+                # Отдаем самый старый из свежих токенов, чтобы новые
+                # дольше оставались в пуле.
+                token, _ = self.__tokens.popleft()
+                self.__hits += 1
+            else:
+                token = None
+                self.__misses += 1
+
+        # Запрашиваем замену выданного токена.
+        self.__wakeup.set()
+        return token
+
+    def take_future(self) -> 'Future[str]':
+        """
+        Получение токена в виде Future.
+
+        Если в пуле есть свежий токен, Future уже выполнено. Иначе капча
+        отправляется на решение вне очереди.
+
+        :return: Future, которое вернет токен решения.
+        """
+
+        token = self.take()
+        if token is not None:
+            future: 'Future[str]' = Future()
+            future.set_result(token)
+            return future
+
+        with self.__lock:
+            self.__spent += 1
+        return self.__service.solve_async(self.__site_key, self.__page_url)
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        """
+        Метрики пула.
+
+        hits - выдано токенов из пула, misses - запросов без готового
+        токена, wasted - токенов, выброшенных по сроку, spent - всего
+        отправлено капч на платное решение.
+        """
+
+        with self.__lock:
+            requests_count = self.__hits + self.__misses
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'wasted': self.__wasted,
+                'spent': self.__spent,
+                'hit_rate': self.__hits / requests_count
+                if requests_count else 0.0,
+                'ready': len(self.__tokens),
+                'failures': self.__failures,
+            }
+
+    def _run(self) -> None:
+        """Цикл пополнения пула"""
+
+        while not self.__stopped.is_set():
+            submitted = []
+            with self.__lock:
+                self._evict_expired()
+                missing = self.__size - len(self.__tokens) \
+                    - len(self.__pending)
+                # После неудач новые капчи заказываются не сразу.
+                if self.__disabled or time.monotonic() < self.__retry_at:
+                    missing = 0
+                for _ in range(max(missing, 0)):
+                    future = self.__service.solve_async(self.__site_key,
+                                                        self.__page_url)
+                    self.__pending.append(future)
+                    self.__spent += 1
+                    submitted.append(future)
+
+            # Обработчик уже решенной капчи вызывается сразу и сам берет
+            # блокировку, поэтому подключается после ее освобождения.
+            for future in submitted:
+                future.add_done_callback(self._on_solved)
+
+            # Проверяем пул раз в секунду, либо сразу после выдачи токена.
+            self.__wakeup.wait(timeout=1.0)
+            self.__wakeup.clear()
+
+    def _on_solved(self, future: 'Future[str]') -> None:
+        """Добавление решенной капчи в пул"""
+
+        with self.__lock:
+            if future in self.__pending:
+                self.__pending.remove(future)
+            if future.cancelled() or self.__stopped.is_set():
+                return
+            error = future.exception()
+            if error is None:
+                self.__tokens.append((future.result(), time.monotonic()))
+                self.__failures = 0
+                self.__retry_at = 0.0
+            else:
+                self.__failures += 1
+                delay = min(
+                    self.__retry_delay * 2 ** (self.__failures - 1),
+                    self.__max_retry_delay,
+                )
+                self.__retry_at = time.monotonic() + delay
+                fatal = isinstance(error, CaptchaError) and error.fatal
+                if fatal:
+                    self.__disabled = True
+
+        if error is not None:
+            if fatal:
+                self.__log(
+                    f'Заблаговременное решение капчи остановлено: {error}',
+                    Informer.MessageLevel.ERROR,
+                )
+            else:
+                self.__log(
+                    f'Ошибка заблаговременного решения капчи: {error}. '
+                    f'Повтор через {delay:.0f} с',
+                    Informer.MessageLevel.ERROR,
+                )
+            return
+
+        self.__wakeup.set()
+
+    def __log(self, msg: str, level: Informer.MessageLevel) -> None:
+        """Сообщение информеру, если он задан"""
+
+        if self.__informer is not None:
+            self.__informer.push_message(msg, level)
+
+    def _evict_expired(self) -> None:
+        """Удаление устаревших токенов. Вызывается под блокировкой"""
+
+        now = time.monotonic()
+        while self.__tokens and now - self.__tokens[0][1] >= self.__lifetime:
+            self.__tokens.popleft()
+            self.__wasted += 1
@@ -0,0 +1,572 @@
+import queue
+import threading
+import time
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from dataclasses import (
+    dataclass,
+    field,
+)
+from enum import Enum
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from .browser_profile import BrowserProfile
+from .captcha import (
+    CaptchaError,
+    CaptchaService,
+)
+from .datetime_checker import DateTimeChecker
+from .driver_pool import (
+    DriverPool,
+    open_page,
+)
+from .calendar_navigator import CalendarNavigator
+from .informer import Informer
+from .metrics import metrics
+from .phase_timer import PhaseTimer
+from .session_store import (
+    SessionKind,
+    SessionStore,
+)
+from .supervisor import describe
+from .target import ObservedTarget
+from .time_index import TimePageIndex
+from .ticket_collector import TicketCollector
+
+
+class CheckoutStatus(Enum):
+    """Итог сбора билетов в одной сессии"""
+
+    # Билеты в корзине, браузер оставлен пользователю.
+    COLLECTED = 'collected'
+    # Другая сессия собрала билеты раньше, эта остановлена до корзины.
+    CANCELLED = 'cancelled'
+    # Другая сессия собрала билеты раньше, корзина этой сессии брошена.
+    ROLLED_BACK = 'rolled_back'
+    # Слот в этой сессии не найден.
+    NOT_FOUND = 'not_found'
+    # Ошибка браузера, капчи, другая ошибка сессии или нет свободного
+    # браузера.
+    FAILED = 'failed'
+
+
+@dataclass(frozen=True)
+class CheckoutSession:
+    """
+    Браузер, в котором слот уже найден.
+
+    Такой браузер не открывает страницу заново и обычно собирает билеты
+    быстрее всех.
+    """
+
+    driver: webdriver.Chrome
+    # Пул, из которого выдан браузер.
+    pool: DriverPool
+    # Чекер, нашедший слот в этом браузере.
+    checker: DateTimeChecker
+
+
+@dataclass
+class CheckoutResult:
+    """Результат сбора билетов в одной сессии"""
+
+    # Номер сессии. Сессия 0 - браузер, в котором слот уже найден.
+    session: int
+    # Сколько билетов сессия должна была собрать.
+    requested: int
+    status: CheckoutStatus = CheckoutStatus.FAILED
+    # Сколько билетов добавлено в корзину.
+    collected: int = 0
+    # Длительность работы сессии в секундах.
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def reusable(self) -> bool:
+        """Браузер сессии исправен и может использоваться дальше"""
+
+        return self.status in (CheckoutStatus.COLLECTED,
+                               CheckoutStatus.CANCELLED,
+                               CheckoutStatus.NOT_FOUND)
+
+
+@dataclass
+class CheckoutReport:
+    """Сводный отчет о сборе билетов на один слот"""
+
+    target: ObservedTarget
+    # Собирали ли сессии одно и то же количество билетов наперегонки.
+    race: bool
+    results: List[CheckoutResult] = field(default_factory=list)
+
+    @property
+    def collected(self) -> int:
+        """Сколько билетов добавлено в корзины"""
+
+        return sum(result.collected for result in self.results
+                   if result.status == CheckoutStatus.COLLECTED)
+
+    @property
+    def success(self) -> bool:
+        """Собран ли хотя бы один билет"""
+
+        return self.collected > 0
+
+    def session(self, number: int) -> Optional[CheckoutResult]:
+        """
+        Результат сессии по номеру.
+
+        :param number: Номер сессии.
+        :return: Результат сессии, либо None, если такой сессии не было.
+        """
+
+        for result in self.results:
+            if result.session == number:
+                return result
+
+        return None
+
+    def summary(self) -> str:
+        """
+        Текстовый отчет по сессиям.
+
+        :return: Строка вида "собрано N, сессия 0: collected (N) за N мс, ...".
+        """
+
+        parts = [f'собрано {self.collected}']
+        for result in sorted(self.results, key=lambda r: r.session):
+            part = f'сессия {result.session}: {result.status.value}'
+            if result.collected:
+                part += f' ({result.collected})'
+            part += f' за {result.duration * 1000:.0f} мс'
+            if result.error:
+                part += f' - {result.error}'
+            parts.append(part)
+
+        return ', '.join(parts)
+
+
+def split_tickets(count: int, cart_limit: int, sessions: int) -> List[int]:
+    """
+    Распределение билетов по сессиям.
+
+    :param count: Сколько билетов нужно собрать.
+    :param cart_limit:
+        Сколько билетов можно добавить в одну корзину. 0 - без ограничения.
+    :param sessions: Сколько сессий доступно.
+    :return:
+        Количество билетов для каждой сессии. Если весь заказ помещается в
+        одну корзину, каждая сессия собирает его целиком наперегонки. Иначе
+        заказ делится на корзины по лимиту, но не больше, чем сессий.
+    """
+
+    if cart_limit <= 0 or count <= cart_limit:
+        return [count] * sessions
+
+    parts = [cart_limit] * (count // cart_limit)
+    if count % cart_limit:
+        parts.append(count % cart_limit)
+
+    return parts[:sessions]
+
+
+class CheckoutCoordinator:
+    """
+    Класс параллельного сбора билетов в нескольких сессиях.
+
+    При обнаружении слота отправляет сбор билетов сразу в несколько
+    прогретых браузеров. Если заказ помещается в одну корзину, браузеры
+    собирают его наперегонки: первая корзина остается, остальные сессии
+    останавливаются, а уже собранные ими корзины бросаются вместе с
+    браузером. Если лимит корзины меньше заказа, заказ делится между
+    сессиями, и сохраняются все собранные части. Капча решается только
+    сессиями, корзины которых остаются. Сессия сайта с собранной
+    корзиной сохраняется в хранилище сессий, чтобы корзину можно было
+    открыть в другом браузере.
+    """
+
+    def __init__(self, pool: DriverPool,
+                 url: str, *,
+                 sessions: int = 1,
+                 cart_limit: int = 0,
+                 lease_timeout: float = 5.0,
+                 profile: Optional[BrowserProfile] = None,
+                 auto_captcha: bool = False,
+                 captcha_service: Optional[CaptchaService] = None,
+                 captcha_token: Optional[
+                     Callable[[str], Optional['Future[str]']]] = None,
+                 time_index: Optional[TimePageIndex] = None,
+                 session_store: Optional[SessionStore] = None,
+                 informer: Informer) -> None:
+        """
+        Инициализатор класса.
+
+        :param pool: Пул прогретых браузеров для дополнительных сессий.
+        :param url:
+            URL-адрес наблюдаемой страницы для слотов, у которых страница
+            не задана.
+        :param sessions: Сколько сессий собирают билеты на один слот.
+        :param cart_limit:
+            Сколько билетов можно добавить в одну корзину. 0 - без
+            ограничения.
+        :param lease_timeout: Сколько секунд ждать свободный браузер.
+        :param profile:
+            Профиль, на который переключаются браузеры пула перед сбором.
+            None - профиль пула.
+        :param auto_captcha: Автообход капчи.
+        :param captcha_service: Сервис решения капчи.
+        :param captcha_token:
+            Функция, запускающая решение капчи заранее для адреса
+            страницы слота. Вызывается на каждую корзину при начале
+            сбора.
+        :param time_index:
+            Индекс страниц списка сеансов из сканирований основной
+            страницы.
+        :param session_store: Хранилище сессий для сохранения корзины.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__pool = pool
+        self.__url = url
+        self.__sessions = max(1, sessions)
+        self.__cart_limit = cart_limit
+        self.__lease_timeout = lease_timeout
+        self.__profile = profile
+        self.__auto_captcha = auto_captcha
+        self.__captcha_service = captcha_service
+        self.__captcha_token = captcha_token
+        self.__time_index = time_index
+        self.__session_store = session_store
+        self.__informer = informer
+
+    def checkout(self, target: ObservedTarget,
+                 primary: Optional[CheckoutSession] = None,
+                 timer: Optional[PhaseTimer] = None,
+                 time_index: Optional[TimePageIndex] = None
+                 ) -> CheckoutReport:
+        """
+        Сбор билетов на слот.
+
+        :param target: Доступный слот.
+        :param primary:
+            Браузер, в котором слот уже найден. Становится сессией 0.
+        :param timer: Замер времени этапов для сессии 0.
+        :param time_index:
+            Индекс страниц списка сеансов страницы слота. None - индекс
+            основной страницы.
+        :return: Сводный отчет по всем сессиям.
+        """
+
+        # При сборе всех доступных билетов количество заранее неизвестно,
+        # поэтому каждая корзина заполняется до лимита.
+        if target.max_tickets and self.__cart_limit > 0:
+            count = self.__cart_limit * self.__sessions
+        else:
+            count = target.count_tickets
+        parts = split_tickets(count, self.__cart_limit, self.__sessions)
+        race = len(parts) > 1 and len(set(parts)) == 1 \
+            and parts[0] == count
+        max_tickets = target.max_tickets and self.__cart_limit <= 0
+
+        report = CheckoutReport(target=target, race=race)
+        state = _CheckoutState(race)
+        # В гонке решение капчи запускается один раз и достается
+        # победителю, при делении заказа - на каждую корзину.
+        captcha_tokens = [self._start_captcha(target.page or self.__url)
+                          for _ in range(1 if race else len(parts))]
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(parts),
+                                    thread_name_prefix='checkout') \
+                    as executor:
+                futures = [
+                    executor.submit(
+                        self._run_session,
+                        number, target, requested, max_tickets, state,
+                        captcha_tokens[0 if race else number],
+                        primary if number == 0 else None,
+                        timer if number == 0 and primary is not None
+                        else None,
+                        time_index or self.__time_index,
+                    )
+                    for number, requested in enumerate(parts)
+                ]
+                report.results = [future.result() for future in futures]
+        finally:
+            # Неиспользованные решения капчи больше не нужны.
+            for token in captcha_tokens:
+                if token is not None:
+                    token.cancel()
+
+        for result in report.results:
+            metrics.inc('checkout_sessions', status=result.status.value)
+        self.__informer.push_message(
+            f'Сбор билетов на {target}: {report.summary()}',
+            Informer.MessageLevel.INFO if report.success
+            else Informer.MessageLevel.ERROR,
+            phase='collect',
+            target=target,
+        )
+
+        return report
+
+    def _run_session(self, number: int,
+                     target: ObservedTarget,
+                     requested: int,
+                     max_tickets: bool,
+                     state: '_CheckoutState',
+                     captcha_token: Optional['Future[str]'],
+                     primary: Optional[CheckoutSession],
+                     timer: Optional[PhaseTimer],
+                     time_index: Optional[TimePageIndex]) -> CheckoutResult:
+        """
+        Сбор билетов в одной сессии.
+
+        :param number: Номер сессии.
+        :param target: Доступный слот.
+        :param requested: Сколько билетов собрать.
+        :param max_tickets: Собирать все доступные билеты.
+        :param state: Общее состояние сессий одного слота.
+        :param captcha_token: Заранее запущенное решение капчи.
+        :param primary: Браузер, в котором слот уже найден.
+        :param timer: Замер времени этапов.
+        :param time_index: Индекс страниц списка сеансов страницы слота.
+        :return: Результат сессии.
+        """
+
+        result = CheckoutResult(session=number, requested=requested)
+        started = time.perf_counter()
+        timer = timer or PhaseTimer()
+
+        try:
+            if primary is not None:
+                self._collect(primary.driver, primary.pool, primary.checker,
+                              target, max_tickets, state, captcha_token,
+                              timer, result)
+            else:
+                with self.__pool.lease(timeout=self.__lease_timeout) \
+                        as driver:
+                    if self.__profile is not None \
+                            and self.__profile != self.__pool.profile:
+                        self.__pool.switch_profile(driver, self.__profile)
+                    self._collect_in_new_session(driver, target, max_tickets,
+                                                 state, captcha_token, timer,
+                                                 time_index, result)
+        except queue.Empty:
+            result.error = 'нет свободного браузера'
+        except (WebDriverException, CaptchaError) as e:
+            result.status = CheckoutStatus.FAILED
+            result.error = getattr(e, 'msg', None) or str(e)
+        except Exception as e:
+            # Непредвиденная ошибка одной сессии не должна терять отчет
+            # остальных.
+            result.status = CheckoutStatus.FAILED
+            result.error = describe(e)
+
+        result.duration = time.perf_counter() - started
+        if result.status == CheckoutStatus.COLLECTED:
+            metrics.observe('time_to_cart_seconds', timer.total)
+
+        return result
+
+    def _collect_in_new_session(self, driver: webdriver.Chrome,
+                                target: ObservedTarget,
+                                max_tickets: bool,
+                                state: '_CheckoutState',
+                                captcha_token: Optional['Future[str]'],
+                                timer: PhaseTimer,
+                                time_index: Optional[TimePageIndex],
+                                result: CheckoutResult) -> None:
+        """
+        Поиск слота в новом браузере и сбор билетов.
+
+        :param driver: Браузер, выданный пулом.
+        :param target: Доступный слот.
+        :param max_tickets: Собирать все доступные билеты.
+        :param state: Общее состояние сессий одного слота.
+        :param captcha_token: Заранее запущенное решение капчи.
+        :param timer: Замер времени этапов.
+        :param time_index: Индекс страниц списка сеансов страницы слота.
+        :param result: Результат сессии.
+        """
+
+        if state.finished:
+            result.status = CheckoutStatus.CANCELLED
+            return
+
+        checker = DateTimeChecker(
+            driver=driver,
+            targets=[target],
+            informer=self.__informer,
+            timer=timer,
+            time_index=time_index,
+        )
+        try:
+            found = checker.start_check(
+                reuse_page=open_page(driver, target.page or self.__url, timer)
+            )
+        except Exception:
+            CalendarNavigator.forget(driver)
+            raise
+
+        if not found:
+            result.status = CheckoutStatus.NOT_FOUND
+            return
+
+        self._collect(driver, self.__pool, checker, target, max_tickets,
+                      state, captcha_token, timer, result)
+
+    def _collect(self, driver: webdriver.Chrome,
+                 pool: DriverPool,
+                 checker: DateTimeChecker,
+                 target: ObservedTarget,
+                 max_tickets: bool,
+                 state: '_CheckoutState',
+                 captcha_token: Optional['Future[str]'],
+                 timer: PhaseTimer,
+                 result: CheckoutResult) -> None:
+        """
+        Добавление билетов в корзину в браузере с найденным слотом.
+
+        :param driver: Браузер с найденным слотом.
+        :param pool: Пул, из которого выдан браузер.
+        :param checker: Чекер, нашедший слот в этом браузере.
+        :param target: Доступный слот.
+        :param max_tickets: Собирать все доступные билеты.
+        :param state: Общее состояние сессий одного слота.
+        :param captcha_token: Заранее запущенное решение капчи.
+        :param timer: Замер времени этапов.
+        :param result: Результат сессии.
+        """
+
+        if state.finished:
+            result.status = CheckoutStatus.CANCELLED
+            return
+
+        time_element = checker.locate(target)
+        if time_element is None:
+            result.status = CheckoutStatus.NOT_FOUND
+            return
+
+        collector = TicketCollector(
+            driver=driver,
+            time_info=time_element,
+            count_tickets=result.requested,
+            max_tickets=max_tickets,
+            auto_captcha=self.__auto_captcha,
+            captcha_service=self.__captcha_service,
+            captcha_token=captcha_token,
+            page_url=target.page or self.__url,
+            informer=self.__informer,
+            timer=timer,
+        )
+        if state.finished:
+            result.status = CheckoutStatus.CANCELLED
+            return
+        collector.add_to_cart()
+
+        # В гонке остается только первая корзина. Опоздавшая сессия
+        # бросает свою корзину вместе с браузером, билеты вернутся в
+        # продажу по истечении сессии на сайте.
+        if not state.claim():
+            CalendarNavigator.forget(driver)
+            pool.discard(driver)
+            result.status = CheckoutStatus.ROLLED_BACK
+            return
+
+        collector.solve_captcha()
+        result.status = CheckoutStatus.COLLECTED
+        result.collected = collector.count_tickets
+        self._save_cart(driver)
+
+        # Браузер с собранной корзиной остается пользователю и больше
+        # не используется для сканирования.
+        CalendarNavigator.forget(driver)
+        pool.detach(driver)
+
+    def _save_cart(self, driver: webdriver.Chrome) -> None:
+        """
+        Сохранение сессии сайта с собранной корзиной.
+
+        :param driver: Браузер с собранной корзиной.
+        """
+
+        if self.__session_store is None:
+            return
+
+        try:
+            self.__session_store.capture(driver, SessionKind.CART)
+        except WebDriverException as e:
+            self.__informer.push_message(
+                f'Не удалось сохранить сессию корзины: {e}',
+                Informer.MessageLevel.ERROR,
+                phase='collect',
+            )
+            return
+
+        if self.__session_store.path:
+            self.__informer.push_message(
+                f'Сессия корзины сохранена в {self.__session_store.path}. '
+                f'Открыть корзину в другом браузере: '
+                f'python -m tickets_parser --open-cart',
+                Informer.MessageLevel.INFO,
+                phase='collect',
+            )
+
+    def _start_captcha(self, page_url: str) -> Optional['Future[str]']:
+        """
+        Запуск решения капчи заранее.
+
+        :param page_url: URL-адрес страницы, на которой собираются билеты.
+        :return: Будущее решение капчи, либо None.
+        """
+
+        if self.__captcha_token is None:
+            return None
+
+        return self.__captcha_token(page_url)
+
+
+class _CheckoutState:
+    """Общее состояние сессий, собирающих билеты на один слот"""
+
+    def __init__(self, race: bool) -> None:
+        """
+        Инициализатор класса.
+
+        :param race: Сессии собирают один и тот же заказ наперегонки.
+        """
+
+        self.__race = race
+        self.__winner = False
+        self.__lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        """Гонка уже выиграна, и сессии можно останавливать"""
+
+        return self.__race and self.__winner
+
+    def claim(self) -> bool:
+        """
+        Попытка оставить за собой собранную корзину.
+
+        :return:
+            True, если корзину нужно сохранить, False, если в гонке уже
+            есть победитель.
+        """
+
+        with self.__lock:
+            if self.__race and self.__winner:
+                return False
+            self.__winner = True
+
+            return True
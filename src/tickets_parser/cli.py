@@ -0,0 +1,341 @@
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+import datetime as dt
+from typing import (
+    List,
+    Optional,
+    Sequence,
+)
+
+from .informer import Informer
+from .log_sinks import (
+    FileSink,
+    JsonLinesSink,
+    Sink,
+    StreamSink,
+)
+from .target import (
+    ObservedTarget,
+    parse_pages,
+    spread_pages,
+)
+
+
+def parse_target(value: str,
+                 count_tickets: int = 1,
+                 max_tickets: bool = False) -> ObservedTarget:
+    """
+    Разбор слота из аргумента командной строки.
+
+    :param value: Строка вида "дд.мм.гггг ЧЧ:ММ".
+    :param count_tickets: Количество билетов.
+    :param max_tickets: Брать ли все доступные билеты.
+    :return: Наблюдаемый слот.
+    :raises ValueError: Если строка не соответствует формату.
+    """
+
+    try:
+        moment = dt.datetime.strptime(value.strip(), '%d.%m.%Y %H:%M')
+    except ValueError:
+        raise ValueError(
+            f'слот "{value}" должен быть в формате "дд.мм.гггг ЧЧ:ММ"'
+        )
+
+    return ObservedTarget(
+        observed_date=moment.date(),
+        observed_time=moment.time(),
+        count_tickets=count_tickets,
+        max_tickets=max_tickets,
+    )
+
+
+def load_targets(path: str) -> List[ObservedTarget]:
+    """
+    Загрузка слотов из JSON-файла.
+
+    Файл содержит список объектов с полями date (дд.мм.гггг), time (ЧЧ:ММ)
+    и необязательными count_tickets, max_tickets, priority и url -
+    страницей продукта, если она отличается от основной.
+
+    :param path: Путь к файлу.
+    :return: Наблюдаемые слоты.
+    """
+
+    with open(path, encoding='utf-8') as file:
+        items = json.load(file)
+
+    targets = []
+    for item in items:
+        targets.append(ObservedTarget(
+            observed_date=dt.datetime.strptime(item['date'],
+                                               '%d.%m.%Y').date(),
+            observed_time=dt.datetime.strptime(item['time'],
+                                               '%H:%M').time(),
+            count_tickets=int(item.get('count_tickets', 1)),
+            max_tickets=bool(item.get('max_tickets', False)),
+            priority=int(item.get('priority', 0)),
+            page=item.get('url') or None,
+        ))
+
+    return targets
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Создание парсера аргументов командной строки"""
+
+    parser = argparse.ArgumentParser(
+        prog='python -m tickets_parser',
+        description='Мониторинг билетов в Колизей без графического '
+                    'интерфейса.',
+    )
+    parser.add_argument(
+        '-t', '--target', action='append', default=[],
+        help='Наблюдаемый слот "дд.мм.гггг ЧЧ:ММ". Можно указать '
+             'несколько раз.',
+    )
+    parser.add_argument(
+        '-f', '--targets-file',
+        help='JSON-файл со списком слотов.',
+    )
+    parser.add_argument(
+        '-c', '--count', type=int, default=1,
+        help='Количество билетов для слотов из --target (по умолчанию 1).',
+    )
+    parser.add_argument(
+        '--max-tickets', action='store_true',
+        help='Брать все доступные билеты для слотов из --target.',
+    )
+    parser.add_argument(
+        '--url',
+        help='Страница с билетами. По умолчанию - настройка PAGE_URL.',
+    )
+    parser.add_argument(
+        '--auto-captcha', action='store_true',
+        help='Автоматически решать капчу.',
+    )
+    parser.add_argument(
+        '--probe', action='store_true', default=None,
+        help='Проверять билеты HTTP-запросами, браузер открывать только '
+             'для сбора. По умолчанию - настройка PROBE_MODE.',
+    )
+    parser.add_argument(
+        '--show-browser', action='store_true',
+        help='Запускать браузеры с окном. По умолчанию браузеры '
+             'запускаются без окна.',
+    )
+    parser.add_argument(
+        '--log-file',
+        help='Файл для логирования. Сообщения всегда выводятся в stdout.',
+    )
+    parser.add_argument(
+        '--json-log',
+        help='Файл для логирования событий в формате JSON-lines.',
+    )
+    parser.add_argument(
+        '--release-report', type=int, metavar='DAYS', nargs='?', const=30,
+        help='Вывести отчет о том, когда появлялись билеты, по истории '
+             'наблюдений за последние DAYS дней (по умолчанию 30), и выйти.',
+    )
+    parser.add_argument(
+        '--open-cart', metavar='FILE', nargs='?', const='',
+        help='Открыть браузер с сессией собранной корзины из файла FILE '
+             '(по умолчанию - настройка SESSION_FILE) и ждать, пока '
+             'пользователь оформит заказ.',
+    )
+
+    return parser
+
+
+def release_report(days: int) -> int:
+    """
+    Вывод отчета о появлении билетов по истории наблюдений.
+
+    :param days: За сколько последних дней учитывать наблюдения.
+    :return: Код завершения.
+    """
+
+    from decouple import config
+    from .history import AvailabilityHistory
+
+    history_db = config('HISTORY_DB', default='history.sqlite3')
+    if not history_db or not os.path.exists(history_db):
+        print(f'История наблюдений не найдена: {history_db}',
+              file=sys.stderr)
+        return 1
+
+    history = AvailabilityHistory(history_db)
+    try:
+        patterns = history.patterns(days=days)
+    finally:
+        history.close()
+
+    print(patterns.report())
+    windows = patterns.windows(
+        min_share=config('HISTORY_MIN_SHARE', default=0.1, cast=float),
+    )
+    if windows:
+        print('Окна для RELEASE_WINDOWS: ' + ','.join(
+            f'{window.start:%H:%M}-{window.end:%H:%M}' for window in windows
+        ))
+
+    return 0
+
+
+def open_cart(path: str) -> int:
+    """
+    Открытие браузера с сохраненной сессией собранной корзины.
+
+    :param path: Файл сессий. Пустая строка - настройка SESSION_FILE.
+    :return: Код завершения.
+    """
+
+    from decouple import config
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+    from .browser_profile import FULL_PROFILE
+    from .driver_resolver import (
+        DriverResolver,
+        DriverResolveError,
+    )
+    from .session_store import (
+        SessionKind,
+        SessionStore,
+    )
+
+    path = path or config('SESSION_FILE', default='session_state.json')
+    store = SessionStore(path, max_age=config('SESSION_MAX_AGE', default=12.0,
+                                              cast=float) * 3600)
+    state = store.get(SessionKind.CART)
+    if state is None:
+        print(f'Сохраненной корзины нет или она устарела: {path}',
+              file=sys.stderr)
+        return 1
+
+    try:
+        driver_path = DriverResolver(
+            pinned_path=config('CHROMEDRIVER_PATH', default=None),
+            offline=config('DRIVER_OFFLINE', default=False, cast=bool),
+        ).resolve()
+        driver = webdriver.Chrome(driver_path,
+                                  options=FULL_PROFILE.chrome_options())
+    except (DriverResolveError, WebDriverException) as e:
+        print(f'Ошибка запуска браузера: {e}', file=sys.stderr)
+        return 1
+
+    try:
+        store.restore(driver, SessionKind.CART)
+        driver.get(config('PAGE_URL', default=state.origin))
+        # Браузер закрывается вместе с программой, поэтому ждем, пока
+        # пользователь оформит заказ.
+        input('Корзина открыта в браузере. Нажмите Enter, чтобы закрыть '
+              'браузер.')
+    except WebDriverException as e:
+        print(f'Ошибка браузера: {e}', file=sys.stderr)
+        return 1
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Запускает наблюдатель и работает до тех пор, пока не будут собраны
+    билеты на все слоты, либо до сигнала остановки (Ctrl+C, SIGTERM).
+
+    :param argv: Аргументы командной строки.
+    :return: Код завершения.
+    """
+
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    if args.release_report is not None:
+        return release_report(args.release_report)
+    if args.open_cart is not None:
+        return open_cart(args.open_cart)
+
+    try:
+        targets = [
+            parse_target(value, args.count, args.max_tickets)
+            for value in args.target
+        ]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.targets_file:
+        try:
+            targets.extend(load_targets(args.targets_file))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f'не удалось загрузить слоты: {e}')
+    if not targets:
+        parser.error('не указано ни одного слота (--target или '
+                     '--targets-file)')
+
+    # Настройки и наблюдатель импортируются после разбора аргументов,
+    # чтобы --help работал без зависимостей движка.
+    from decouple import config
+    from .observer import Observer
+
+    # Слоты без страницы наблюдаются и на дополнительных страницах
+    # продуктов.
+    url = args.url or config('PAGE_URL')
+    targets = spread_pages(
+        targets, parse_pages(config('PAGE_URLS', default=''), main=url),
+    )
+
+    sinks: List[Sink] = [StreamSink(sys.stdout)]
+    if args.log_file:
+        sinks.append(FileSink(args.log_file))
+    if args.json_log:
+        sinks.append(JsonLinesSink(args.json_log))
+    informer = Informer(
+        sinks,
+        repeat_interval=config('LOG_REPEAT_INTERVAL', default=300.0,
+                               cast=float),
+    )
+    observer = Observer(
+        url=url,
+        targets=targets,
+        auto_captcha=args.auto_captcha,
+        informer=informer,
+        probe_mode=args.probe if args.probe is not None
+        else config('PROBE_MODE', default=False, cast=bool),
+        headless=not args.show_browser,
+    )
+
+    stop_event = threading.Event()
+
+    def _on_signal(signum, frame) -> None:
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+
+    observer.start()
+    if not observer.worked:
+        informer.close()
+        return 1
+
+    try:
+        # Проверяем раз в секунду, остались ли несобранные слоты и не
+        # остановился ли бот из-за неустранимой ошибки.
+        while not stop_event.wait(timeout=1.0) and observer.worked \
+                and observer.targets:
+            pass
+        failed = not observer.worked and not stop_event.is_set()
+    finally:
+        observer.stop()
+        informer.close()
+
+    return 1 if failed else 0
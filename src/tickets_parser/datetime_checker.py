@@ -1,12 +1,48 @@
-import time
 import datetime as dt
-from typing import Optional
+from dataclasses import replace
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set,
+)
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
-
-from .load_waiting import wait_element
+from selenium.common.exceptions import (
+    TimeoutException,
+    WebDriverException,
+)
+
+from .load_waiting import (
+    wait_condition,
+    wait_element,
+    wait_page_idle,
+)
+from .phase_timer import PhaseTimer
+from .availability import AvailabilitySnapshot
+from .time_index import (
+    PageRange,
+    TimePageIndex,
+    page_range,
+    search_page,
+)
+from .page_extractor import (
+    DayCell,
+    TimePage,
+    TimeRow,
+    extract_calendar,
+    extract_time_page,
+)
+from .calendar_navigator import CalendarNavigator
 from .informer import Informer
+from .site_profile import site
+from .target import (
+    ObservedTarget,
+    by_priority,
+    group_by_month,
+    group_by_date,
+)
 
 
 class DateTimeChecker:
@@ -14,127 +50,320 @@ class DateTimeChecker:
     Класс для проверки даты и времени на доступность.
 
     Отвечает за нахождение и проверку даты и времени на доступность.
+    Проверяет сразу множество слотов: каждый месяц календаря открывается
+    один раз, список сеансов каждой даты просматривается один раз.
+    Если задано хранилище состояния доступности, календарь и страницы
+    списка сеансов, не изменившиеся с прошлого сканирования, не
+    извлекаются из браузера заново. Страница списка сеансов с нужным
+    временем выбирается двоичным поиском или по индексу страниц с прошлых
+    сканирований, и список переключается прямо на нее.
     """
 
     def __init__(self, driver: webdriver.Chrome,
-                 observed_date: dt.date,
-                 observed_time: dt.time,
-                 informer: Informer) -> None:
+                 targets: List[ObservedTarget],
+                 informer: Informer,
+                 timer: Optional[PhaseTimer] = None,
+                 snapshot: Optional[AvailabilitySnapshot] = None,
+                 time_index: Optional[TimePageIndex] = None) -> None:
         """
         Инициализатор класса.
 
         :param driver: Веб-драйвер для управления браузером.
-        :param observed_date: Наблюдаемая дата.
-        :param observed_time: Наблюдаемое время.
+        :param targets: Наблюдаемые слоты.
         :param informer: Объект информатора о состоянии бота.
+        :param timer: Объект замера времени этапов.
+        :param snapshot: Хранилище состояния доступности между сканированиями.
+        :param time_index: Индекс страниц списка сеансов между сканированиями.
         """
 
         self.__driver = driver
-        self.__observed_date = observed_date
-        self.__observed_time = observed_time
+        self.__targets = targets
         self.__informer = informer
+        self.__timer = timer or PhaseTimer()
+        self.__snapshot = snapshot
+        self.__time_index = time_index
+        self.__navigator = CalendarNavigator(driver, informer)
+
+        # Дата, список сеансов которой сейчас открыт на странице, и номер
+        # открытой страницы списка, начиная с 0.
+        self.__shown_date: Optional[dt.date] = None
+        self.__time_page = 0
+        # Количество билетов на слоты по итогам проверки.
+        self.__counts: Dict[ObservedTarget, int] = {}
+
+    def start_check(self, reuse_page: bool = False) -> List[ObservedTarget]:
+        """
+        Проверка наблюдаемых слотов на доступность.
 
-    def start_check(self) -> Optional[WebElement]:
+        :param reuse_page:
+            Страница осталась открытой после прошлого сканирования и не
+            перезагружалась. Календарь не листается заново, а месяцы
+            загружаются повторно прямым переходом.
+        :return:
+            Список доступных слотов, отсортированный по приоритету.
+            Пустой список, если доступных слотов нет.
         """
-        Проверка указанных даты и времени на доступность.
 
+        with self.__timer.phase('calendar_wait'):
+            self.__wait_calendar()
+
+        allowed_targets: List[ObservedTarget] = []
+
+        # Месяцы идут по возрастанию, поэтому календарь листается только
+        # вперед, и все месяцы проверяются за одну загрузку страницы.
+        for month, month_targets in group_by_month(self.__targets).items():
+            with self.__timer.phase('month_navigation'):
+                self.__go_to_month(month, reload=reuse_page)
+            with self.__timer.phase('day_lookup'):
+                days = self.__get_days(month)
+
+            self.__informer.push_message(
+                'Поиск нужных дней',
+                Informer.MessageLevel.INFO,
+            )
+
+            for day, day_targets in group_by_date(month_targets).items():
+                with self.__timer.phase('day_open'):
+                    opened = self.__open_day(days.get(day))
+                if not opened:
+                    self.__informer.push_message(
+                        f'Ошибка, день {day:%d.%m.%Y} не обнаружен',
+                        Informer.MessageLevel.ERROR,
+                    )
+                    for target in day_targets:
+                        self.__counts[target] = 0
+                    if self.__time_index is not None:
+                        self.__time_index.forget(day)
+                    continue
+
+                self.__shown_date = day
+                with self.__timer.phase('time_lookup'):
+                    found_times = self.__find_times(
+                        {target.observed_time for target in day_targets}
+                    )
+                for target in day_targets:
+                    row = found_times.get(target.observed_time)
+                    if row is not None:
+                        allowed_targets.append(target)
+                        # Если количество в строке не указано, оно
+                        # неизвестно, и слот в подсчет не попадает.
+                        if row.count is not None:
+                            self.__counts[target] = row.count
+                    else:
+                        self.__counts[target] = 0
+
+        return by_priority(allowed_targets)
+
+    @property
+    def counts(self) -> Dict[ObservedTarget, int]:
+        """
+        Количество доступных билетов на проверенные слоты.
+
+        0 - дата недоступна или время не найдено. Слоты, количество билетов
+        на которые не указано на странице, в словарь не попадают.
+        """
+
+        return dict(self.__counts)
+
+    def locate(self, target: ObservedTarget) -> Optional[WebElement]:
+        """
+        Поиск веб-элемента с нужным временем для сбора билетов.
+
+        Если список сеансов нужной даты уже открыт, элемент берется с
+        текущей страницы. Иначе страница обновляется и дата открывается
+        заново.
+
+        :param target: Доступный слот.
         :return:
             Возвращает элемент, содержащий доступную дату и кнопку для старта
             процесса добавления билетов в корзину, если дата и время доступны,
             иначе None.
         """
 
-        # Дождемся загрузки календаря. Если доступен хотя бы один элемент
-        # day-number, значит, календарь загружен.
-        wait_element(self.__driver, By.CLASS_NAME, 'day-number')
-        # Дождемся загрузки кнопки переключения месяцев.
-        wait_element(self.__driver, By.CSS_SELECTOR,
-                     '.next.changemonth.glyphicon.glyphicon-chevron-right',)
+        with self.__timer.phase('locate'):
+            if self.__shown_date != target.observed_date:
+                self.__reload_page()
+                self.__go_to_month(target.month)
+                if not self.__open_day(
+                        self.__get_days(target.month)
+                        .get(target.observed_date)):
+                    return None
+                self.__shown_date = target.observed_date
+
+            row = self.__find_times({target.observed_time}, fresh=True) \
+                .get(target.observed_time)
+            return row.element if row is not None else None
+
+    def __wait_calendar(self) -> None:
+        """Ожидание загрузки календаря и прокрутка до него"""
+
+        # Дождемся загрузки календаря. Если доступна хотя бы одна ячейка
+        # с датой, значит, календарь загружен. Затем дождемся загрузки
+        # кнопки переключения месяцев.
+        try:
+            wait_element(self.__driver, By.CSS_SELECTOR,
+                         site['calendar_day'].css, name='calendar')
+            wait_element(self.__driver, By.CSS_SELECTOR,
+                         site['next_month'].css, name='next_month_button')
+        except TimeoutException:
+            self.__report_missing(['calendar_day', 'next_month'])
+            raise
 
         # Прокрутка до календаря.
         # Убедимся, что спускаем на 500 пиксеелй вниз точно от начала страницы.
         self.__driver.execute_script('window.scrollTo(0, 0);')
         self.__driver.execute_script('window.scrollBy(0, 500);')
 
-        time.sleep(2)
+        # Дождемся завершения загрузки страницы и появления календаря
+        # на экране.
+        wait_page_idle(self.__driver, name='calendar_idle')
+        wait_condition(
+            lambda: site['calendar_day'].find(self.__driver).is_displayed(),
+            name='calendar_visible',
+        )
+
+    def __report_missing(self, names: List[str]) -> None:
+        """
+        Сообщение о пропавших со страницы элементах.
+
+        Все селекторы проверяются одним запросом. Если элементов нет на
+        загруженной странице, скорее всего, сайт изменил разметку, и
+        селекторы нужно поправить в профиле сайта.
+
+        :param names: Имена селекторов, которых не дождались.
+        """
+
+        try:
+            missing = site.missing(self.__driver, names)
+        except WebDriverException:
+            return
+
+        if missing:
+            self.__informer.push_message(
+                f'На странице нет элементов: {", ".join(missing)}. '
+                f'Возможно, сайт изменил разметку, селекторы можно '
+                f'переопределить в файле SITE_PROFILE',
+                Informer.MessageLevel.ERROR,
+                phase='scan',
+            )
+
+    def __go_to_month(self, month: dt.date, reload: bool = False) -> None:
+        """
+        Переключение календаря на нужный месяц.
 
-        # Объект кнопки для переключения на следующий месяц.
-        next_month_btn = self.__get_next_month_btn()
-        # Получение текущего месяца и года из кнопки.
-        current_date = self.__get_current_date(next_month_btn)
+        :param month: Первый день нужного месяца.
+        :param reload: Загрузить месяц заново, даже если он уже открыт.
+        """
 
         self.__informer.push_message(
             'Поиск нужного месяца и года',
             Informer.MessageLevel.INFO,
         )
 
-        # Переключаем месяца в календаре до тех пор, пока не найдем
-        # нужный месяц и год.
-        while current_date.month != self.__observed_date.month \
-                or current_date.year != self.__observed_date.year:
-            webdriver.ActionChains(self.__driver).click(next_month_btn).perform()
-            time.sleep(1)
-            next_month_btn = self.__get_next_month_btn()
-            current_date = self.__get_current_date(next_month_btn)
+        # Если к месяцу нельзя перейти без перезагрузки страницы,
+        # перезагружаем ее и переходим от текущего месяца.
+        if not self.__navigator.go_to(month, reload=reload):
+            self.__reload_page()
+            self.__navigator.go_to(month)
 
-        time.sleep(1)
+    def __reload_page(self) -> None:
+        """Перезагрузка страницы с календарем"""
 
-        # Парсим все дни в календаре.
-        days_elements = self.__driver.find_elements(
-            By.CSS_SELECTOR,
-            '.calendar-day > .day-number',
-        )
+        CalendarNavigator.forget(self.__driver)
+        self.__driver.refresh()
+        self.__wait_calendar()
 
-        # Текущая ячейка с датой в календаре.
-        current_day_element: Optional[WebElement] = None
+    def __get_days(self, month: dt.date) -> Dict[dt.date, DayCell]:
+        """
+        Получение ячеек с датами текущего месяца календаря.
 
-        self.__informer.push_message(
-            'Поиск нужного дня',
-            Informer.MessageLevel.INFO,
+        Все ячейки вместе с цветом фона извлекаются одним запросом к
+        браузеру. Если календарь не изменился с прошлого сканирования,
+        ячейки берутся из хранилища состояния без элементов.
+
+        :param month: Первый день открытого месяца.
+        :return: Словарь "дата - ячейка с датой".
+        """
+
+        if self.__snapshot is None:
+            _, cells = extract_calendar(self.__driver)
+            return {cell.date: cell for cell in cells or []}
+
+        key = ('browser', 'calendar', month)
+        digest, cells = extract_calendar(
+            self.__driver, self.__snapshot.known_fingerprint(key)
+        )
+        cached = self.__snapshot.fragment(key, digest)
+        if cells is None:
+            return dict(cached or {})
+
+        days = {cell.date: cell for cell in cells}
+        self.__snapshot.store_fragment(
+            key, digest,
+            {day: replace(cell, element=None) for day, cell in days.items()},
+        )
+        self.__snapshot.update_days(
+            {day: self.__allowed_day(cell) for day, cell in days.items()}
         )
 
-        # Находим в цикле нужную ячейку с датой.
-        for day_element in days_elements:
-            # Парсим дату в объект python.
-            date_object = dt.datetime.strptime(
-                day_element.get_attribute('data-date'), '%d/%m/%Y'
-            ).date()
-            if self.__observed_date == date_object:
-                current_day_element = day_element
-                break
+        return days
+
+    def __open_day(self, day_cell: Optional[DayCell]) -> bool:
+        """
+        Открытие списка со временем для доступной даты.
+
+        :param day_cell: Ячейка с датой в календаре.
+        :return: True, если дата доступна и список открыт, иначе False.
+        """
 
         # Если дата доступна, открываем список со временем для старта
         # проверки доступности времени.
-        if current_day_element is not None \
-               and self.__allowed_day(current_day_element):
-            self.__informer.push_message(
-                'Нужный день обнаружен',
-                Informer.MessageLevel.INFO,
-            )
-            webdriver.ActionChains(self.__driver).click(current_day_element).perform()
-            # Дожидаемся загрузки списка со временем.
-            wait_element(self.__driver, By.CSS_SELECTOR,
-                         '.perf_row.row-height2.text-center')
-        else:
-            self.__informer.push_message(
-                'Ошибка, нужный день не обнаружен',
-                Informer.MessageLevel.ERROR,
-            )
-            # Если день недоступен, возвращаем None.
-            return None
+        if day_cell is None or not self.__allowed_day(day_cell):
+            return False
 
+        self.__informer.push_message(
+            'Нужный день обнаружен',
+            Informer.MessageLevel.INFO,
+        )
+        # У ячейки из хранилища состояния элемента нет, ищем его по дате.
+        day_element = day_cell.element or self.__driver.find_element(
+            By.CSS_SELECTOR,
+            ', '.join(f'{variant}[data-date="{day_cell.date:%d/%m/%Y}"]'
+                      for variant in site['calendar_day'].variants),
+        )
+        webdriver.ActionChains(self.__driver).click(day_element).perform()
         # Дожидаемся загрузки списка со временем.
-        wait_element(self.__driver, By.CSS_SELECTOR,
-                     '.perf_row.row-height2.text-center')
+        wait_page_idle(self.__driver, name='time_list_idle')
+        try:
+            wait_element(self.__driver, By.CSS_SELECTOR,
+                         site['time_row'].css, name='time_list')
+        except TimeoutException:
+            self.__report_missing(['time_row'])
+            raise
+        self.__time_page = 0
 
-        # Если день доступен, определяем, доступно ли время.
-        return self.__allowed_time()
+        return True
 
-    def __allowed_time(self) -> Optional[WebElement]:
+    def __find_times(self,
+                     observed_times: Set[dt.time],
+                     fresh: bool = False) -> Dict[dt.time, TimeRow]:
         """
-        Проверка доступности веб-элемента с нужным временем.
-
-        :return: True, если время доступно, иначе False.
+        Поиск строк с нужными временами.
+
+        Времена в списке идут по возрастанию, поэтому страница с нужным
+        временем выбирается двоичным поиском по первому и последнему
+        времени просмотренных страниц, а при наличии индекса - сразу по
+        индексу. Каждая страница списка вместе с навигацией извлекается
+        одним запросом к браузеру.
+
+        :param observed_times: Наблюдаемые времена.
+        :param fresh:
+            Извлекать страницы из браузера, даже если они не изменились, чтобы
+            у строк были элементы.
+        :return:
+            Словарь "найденное время - строка списка". Элементы, найденные на
+            предыдущих страницах, к моменту возврата могут устареть,
+            поэтому для сбора билетов используется метод locate.
         """
 
         self.__informer.push_message(
@@ -142,149 +371,199 @@ class DateTimeChecker:
             Informer.MessageLevel.INFO,
         )
 
-        # Получаем количество страниц с временами.
-        pages = self.__get_count_time_pages()
-        current_time_elem: Optional[WebElement] = None
+        found: Dict[dt.time, TimeRow] = {}
+        # Просмотренные в этом сканировании страницы по номерам.
+        seen: Dict[int, TimePage] = {}
+
+        time_page = self.__read_time_page(self.__time_page, fresh)
+        self.__remember_page(self.__time_page, time_page, seen)
+
+        for time in sorted(observed_times):
+            page = self.__choose_page(time, time_page.pages, seen)
+            while page is not None and page not in seen:
+                time_page = self.__show_time_page(page, time_page, fresh,
+                                                  seen)
+                # Перейти на страницу не удалось.
+                if page not in seen:
+                    break
+                page = self.__choose_page(time, time_page.pages, seen)
+
+            # Если времени нет на странице, где оно должно быть, его нет
+            # в списке.
+            rows = seen[page].rows if page in seen else []
+            row = next((row for row in rows if row.time == time), None)
+            if row is not None:
+                self.__informer.push_message(
+                    f'Время {row.time:%H:%M} обнаружено',
+                    Informer.MessageLevel.INFO,
+                )
+                found[time] = row
+
+        return found
+
+    def __choose_page(self, time: dt.time, pages: int,
+                      seen: Dict[int, TimePage]) -> Optional[int]:
+        """
+        Выбор страницы списка, на которой нужно искать время.
 
-        # Проходимся по каждой странице.
-        for _ in range(pages):
-            # Кнопка переключения страниц.
-            next_page_btn = self.__get_next_page_btn()
+        :param time: Искомое время.
+        :param pages: Общее количество страниц.
+        :param seen: Просмотренные в этом сканировании страницы.
+        :return:
+            Номер страницы. None - времени в списке нет.
+        """
 
-            # Получаем список текущих времен с кнопками для выбора билетов.
-            current_time_list = self.__driver.find_elements(
-                By.CSS_SELECTOR,
-                '.perf_row.row-height2.text-center',
-            )
+        known: Dict[int, PageRange] = {}
+        for page, time_page in seen.items():
+            bounds = page_range(row.time for row in time_page.rows)
+            if bounds is not None:
+                known[page] = bounds
 
-            # Ищем в текущем списке нужное время.
-            for time_elem in current_time_list:
-                # Берем время в виде текста из веб-элемента.
-                current_time_str = time_elem.find_element(By.TAG_NAME, 'div') \
-                    .find_element(By.TAG_NAME, 'div').text
-                # Конвертируем строку в объект python.
-                current_time_obj = dt.datetime.strptime(current_time_str, '%H:%M').time()
-
-                # Если нужное время меньше самого минимального времени в
-                # списке, останавливаем процесс поиска, т.к. дальше искать -
-                # нет смысла, т.к. все времена идут по возрастанию.
-                if self.__observed_time < current_time_obj:
-                    self.__informer.push_message(
-                        'Нужное время не обнаружено',
-                        Informer.MessageLevel.INFO,
-                    )
-                    return None
+        hint = None
+        if self.__time_index is not None and self.__shown_date is not None:
+            hint = self.__time_index.guess(self.__shown_date, pages, time)
 
-                # Нашли нужное время.
-                if self.__observed_time == current_time_obj:
-                    self.__informer.push_message(
-                        'Нужное время обнаружено',
-                        Informer.MessageLevel.INFO,
-                    )
-                    return time_elem
+        return search_page(time, pages, known, hint)
 
-            # Если в текущем списке нужного времени нет, переключаем страницу
-            # и повторяем все операции выше.
-            if next_page_btn is not None:
-                webdriver.ActionChains(self.__driver).click(next_page_btn).perform()
-                time.sleep(3)
+    def __show_time_page(self, page: int, time_page: TimePage, fresh: bool,
+                         seen: Dict[int, TimePage]) -> TimePage:
+        """
+        Переключение списка сеансов на нужную страницу.
+
+        Список переключается ссылкой с номером страницы. Если сайт
+        показывает ссылки не на все страницы, список переключается на
+        ближайшую к нужной видимую страницу, пока нужная не станет видна.
+
+        :param page: Номер нужной страницы, начиная с 0.
+        :param time_page: Открытая страница.
+        :param fresh: Извлечь страницы, даже если они не изменились.
+        :param seen: Просмотренные в этом сканировании страницы.
+        :return: Нужная страница, либо последняя открытая, если перейти
+            на нужную не удалось.
+        """
 
-        # Если элемент найден, вернем его для дальнейшей обработки.
-        return current_time_elem
+        for _ in range(time_page.pages):
+            if self.__time_page == page:
+                break
 
-    def __get_count_time_pages(self) -> int:
-        """Получение количества страниц списка со временем"""
+            forward = page > self.__time_page
+            links = time_page.page_links or self.__find_page_links(page)
+            if page in links:
+                step = page
+            else:
+                steps = [number for number in links
+                         if (number > self.__time_page) == forward
+                         and number != self.__time_page]
+                step = min(steps, key=lambda number: abs(page - number)) \
+                    if steps else None
+
+            if step is not None:
+                button = links[step]
+            elif forward:
+                # Ссылок с номерами нет, остается кнопка следующей страницы.
+                step = self.__time_page + 1
+                button = time_page.next_page_btn \
+                    or site['pagination'].find(self.__driver).find_element(
+                        By.CSS_SELECTOR, 'ul > li:last-child'
+                    )
+            else:
+                break
 
-        # Открытый список с навигационной панелью.
-        navigation = self.__driver.find_element(By.ID, 'prfrmncPages')
+            webdriver.ActionChains(self.__driver).click(button).perform()
+            wait_page_idle(self.__driver, name='time_page_idle')
 
-        # Если панель навигации пуста, значит, есть только одна страница.
-        if navigation.text == '':
-            return 1
+            time_page = self.__read_time_page(step, fresh)
+            # Если сайт отмечает текущую страницу, сверяемся с ним.
+            self.__time_page = time_page.current \
+                if time_page.current is not None else step
+            self.__remember_page(self.__time_page, time_page, seen)
 
-        # Если панель навигации не пуста, собираем все элементы списка.
-        li_list = navigation.find_element(By.TAG_NAME, 'ul') \
-            .find_elements(By.TAG_NAME, 'li')
+        return time_page
 
-        # Предпоследний элемент - элемент, содержащий номер последней страницы.
-        value = int(li_list[-2].find_element(By.TAG_NAME, 'a').text)
+    def __find_page_links(self, page: int) -> Dict[int, WebElement]:
+        """
+        Поиск ссылок с номерами страниц на открытой странице.
 
-        return value
+        Используется, когда страница взята из хранилища состояния без
+        элементов. Сначала ищется ссылка на нужную страницу одним запросом.
 
-    def __get_next_page_btn(self) -> Optional[WebElement]:
-        """Получение кнопки переключения страниц со временем"""
+        :param page: Номер нужной страницы, начиная с 0.
+        :return: Словарь "номер страницы - ссылка".
+        """
 
-        # Открытый список с навигационной панелью.
-        navigation = self.__driver.find_element(By.ID, 'prfrmncPages')
+        navigation = site['pagination'].find_all(self.__driver)
+        if not navigation:
+            return {}
 
-        # Если панель навигации пуста, значит, кнопки нет.
-        if navigation.text == '':
-            return None
+        links = navigation[0].find_elements(
+            By.XPATH, f'.//li/a[normalize-space()="{page + 1}"]',
+        )
+        if links:
+            return {page: links[0]}
 
-        # Если панель навигации не пуста, собираем все элементы списка.
-        li_list = navigation.find_element(By.TAG_NAME, 'ul') \
-            .find_elements(By.TAG_NAME, 'li')
+        result: Dict[int, WebElement] = {}
+        for link in navigation[0].find_elements(By.CSS_SELECTOR,
+                                                'ul > li > a'):
+            text = link.text.strip()
+            if text.isdigit():
+                result[int(text) - 1] = link
 
-        # Последний элемент - элемент, содержащий кнопку переключения.
-        return li_list[-1]
+        return result
 
-    @staticmethod
-    def __allowed_day(day_element: WebElement) -> bool:
-        """
-        Проверка ячейки с датой календаря на доступность.
+    def __remember_page(self, page: int, time_page: TimePage,
+                        seen: Dict[int, TimePage]) -> None:
+        """Запись просмотренной страницы в текущий поиск и в индекс"""
 
-        Цвет заднего фона ячейки определяет доступноть даты.
+        seen[page] = time_page
+        if self.__time_index is not None and self.__shown_date is not None:
+            self.__time_index.update(self.__shown_date, time_page.pages,
+                                     page, [row.time for row in time_page.rows])
 
-        :return: True, если дата доступна, иначе False.
+    def __read_time_page(self, page: int, fresh: bool = False) -> TimePage:
         """
+        Извлечение текущей страницы списка сеансов открытой даты.
 
-        # Получение родительского элемента. У него и проверяем цвет фона.
-        parent = day_element.find_element(By.XPATH, '..')
-
-        ALLOWED_DATE_COLOR = 'rgba(206, 234, 208, 1)'
-        CHOSEN_DATE_COLOR = 'rgba(56, 58, 62, 1)'
-        css_rgb = parent.value_of_css_property('background-color')
+        Если страница не изменилась с прошлого сканирования, строки берутся
+        из хранилища состояния без элементов. Иначе количество билетов
+        на времена страницы обновляется в хранилище.
 
-        return css_rgb == ALLOWED_DATE_COLOR or css_rgb == CHOSEN_DATE_COLOR
-
-    def __get_next_month_btn(self) -> WebElement:
+        :param page: Номер страницы, начиная с 0.
+        :param fresh: Извлечь страницу, даже если она не изменилась.
+        :return: Строки списка и навигация по страницам.
         """
-        Получение кнопки переключения следующего месяца.
 
-        Необходимо получать ее каждый раз, т.к. в ней меняются параметры
-        следующих месяца и года.
+        if self.__snapshot is None or self.__shown_date is None:
+            _, time_page = extract_time_page(self.__driver)
+            return time_page or TimePage(rows=[], pages=1, next_page_btn=None)
 
-        :return: Кнопка переключения на следующий месяц.
-        """
-
-        next_month_btn = self.__driver.find_element(
-            By.CSS_SELECTOR,
-            '.next.changemonth.glyphicon.glyphicon-chevron-right',
+        key = ('browser', 'times', self.__shown_date, page)
+        digest, time_page = extract_time_page(
+            self.__driver,
+            None if fresh else self.__snapshot.known_fingerprint(key),
         )
+        cached = self.__snapshot.fragment(key, digest)
+        if time_page is None:
+            return cached or TimePage(rows=[], pages=1, next_page_btn=None)
 
-        return next_month_btn
+        self.__snapshot.store_fragment(key, digest, TimePage(
+            rows=[replace(row, element=None) for row in time_page.rows],
+            pages=time_page.pages,
+            next_page_btn=None,
+        ))
+        self.__snapshot.update_times(self.__shown_date, {
+            row.time: row.count for row in time_page.rows
+        }, section=page)
 
-    @staticmethod
-    def __get_current_date(next_month_btn: WebElement) -> dt.date:
-        """
-        Получение текущего месяца и года в календаре.
+        return time_page
 
-        :param next_month_btn:
-            Кнопка переключения месяцев, из которой вычисляем
-            текущие месяц и год.
-        :return: Объект даты с вычисленными годом и месяцем.
+    @staticmethod
+    def __allowed_day(day_cell: DayCell) -> bool:
         """
+        Проверка ячейки с датой календаря на доступность.
 
-        # Получение из кнопки следующих месяца и года.
-        next_month = int(next_month_btn.get_attribute('data-month'))
-        next_year = int(next_month_btn.get_attribute('data-year'))
+        Цвет заднего фона ячейки определяет доступноть даты.
 
-        # Вычисление текущих месяца и года.
-        current_year = next_year
-        current_month = next_month - 1
-        # Учет того, что следующий месяц может быть первым.
-        if current_month == 0:
-            current_month = 12
-            current_year -= 1
+        :return: True, если дата доступна, иначе False.
+        """
 
-        return dt.date(year=current_year, month=current_month, day=1)
+        return site.allowed_day(day_cell.color)
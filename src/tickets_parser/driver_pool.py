@@ -0,0 +1,506 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import (
+    Iterator,
+    List,
+    Optional,
+)
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from .browser_profile import (
+    FULL_PROFILE,
+    BrowserProfile,
+)
+from .calendar_navigator import CalendarNavigator
+from .informer import Informer
+from .metrics import timed
+from .phase_timer import PhaseTimer
+from .session_store import (
+    SessionKind,
+    SessionStore,
+)
+from .site_profile import site
+
+
+def close_cookie_card(driver: webdriver.Chrome) -> bool:
+    """
+    Закрытие плашки с куки.
+
+    :param driver: Веб-драйвер с открытой страницей.
+    :return:
+        True, если плашка была и закрыта. Если согласие с куки
+        восстановлено из сохраненной сессии, плашки нет.
+    """
+
+    buttons = site['cookie_close'].find_all(driver)
+    if not buttons:
+        return False
+
+    buttons[0].click()
+
+    return True
+
+
+def open_page(driver: webdriver.Chrome, url: str,
+              timer: PhaseTimer) -> bool:
+    """
+    Открытие наблюдаемой страницы в браузере.
+
+    :param driver: Веб-драйвер, выданный пулом.
+    :param url: URL-адрес наблюдаемой страницы.
+    :param timer: Замер времени этапов текущего прогона.
+    :return:
+        True, если календарь остался открытым после прошлого
+        сканирования и страница не перезагружалась.
+    """
+
+    # Если календарь остался открытым после прошлого сканирования,
+    # страницу не перезагружаем: нужный месяц загружается заново прямым
+    # переходом.
+    reuse_page = CalendarNavigator.shown_month(driver) is not None \
+        and driver.current_url.rstrip('/') == url.rstrip('/')
+
+    if not reuse_page:
+        CalendarNavigator.forget(driver)
+
+        # Открытие указанной страницы.
+        with timer.phase('page_load'):
+            driver.get(url)
+
+        # Плашка с куки мешается при взаимодействии с элементами
+        # страницы. Попытаемся закрыть ее, если она есть.
+        try:
+            close_cookie_card(driver)
+        except WebDriverException:
+            pass
+
+    return reuse_page
+
+
+class PooledDriver:
+    """
+    Веб-драйвер пула.
+
+    Хранит сам драйвер и статистику его использования.
+    """
+
+    def __init__(self, driver: webdriver.Chrome) -> None:
+        """
+        Инициализатор класса.
+
+        :param driver: Веб-драйвер для управления браузером.
+        """
+
+        self.driver = driver
+        # Сколько раз драйвер выдавался из пула.
+        self.uses = 0
+
+
+class DriverStartError(Exception):
+    """Ошибка запуска браузеров пула"""
+
+
+class DriverPool:
+    """
+    Класс пула прогретых веб-драйверов.
+
+    Заранее запускает несколько браузеров, открывает в них наблюдаемую
+    страницу и закрывает плашку с куки. Если задано хранилище сессий,
+    новые браузеры запускаются с сохраненными куки согласия и
+    localStorage сайта, а состояние первого прогретого браузера
+    сохраняется. Задачи сканирования и сбора билетов берут драйверы из
+    пула во временное пользование, поэтому запуск браузера не попадает на
+    критический путь. Драйверы проверяются на работоспособность и
+    пересоздаются после заданного количества использований или при
+    превышении порога памяти. При запуске пула каждому браузеру дается
+    несколько попыток: если не запустился ни один, пул не запускается.
+    Замена браузера в работающем пуле повторяется с нарастающей задержкой,
+    пока пул не закрыт. Браузеры запускаются с профилем пула, профиль
+    отдельного браузера можно временно сменить.
+    """
+
+    def __init__(self, url: str,
+                 driver_path: str,
+                 size: int = 2, *,
+                 max_uses: int = 50,
+                 max_memory_mb: int = 512,
+                 page_load_timeout: float = 0.0,
+                 profile: BrowserProfile = FULL_PROFILE,
+                 session_store: Optional[SessionStore] = None,
+                 retry_delay: float = 5.0,
+                 max_retry_delay: float = 300.0,
+                 start_attempts: int = 3,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param url: URL-адрес страницы для прогрева драйверов.
+        :param driver_path: Путь к исполняемому файлу chromedriver.
+        :param size: Количество драйверов в пуле.
+        :param max_uses: Через сколько использований драйвер пересоздается.
+        :param max_memory_mb:
+            Порог памяти JS-кучи страницы в мегабайтах, после которого
+            драйвер пересоздается. Если куча ограничена профилем, порог
+            не выше 90% ограничения.
+        :param page_load_timeout:
+            Сколько секунд ждать загрузки страницы. 0 - ограничение
+            chromedriver по умолчанию.
+        :param profile: Профиль запуска браузеров.
+        :param session_store: Хранилище сессий сайта.
+        :param retry_delay:
+            Задержка в секундах перед повторным запуском браузера после
+            первой неудачи. Удваивается с каждой неудачей подряд.
+        :param max_retry_delay: Максимальная задержка повторного запуска.
+        :param start_attempts:
+            Сколько попыток запуска дается каждому браузеру при запуске
+            пула.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__url = url
+        self.__driver_path = driver_path
+        self.__size = size
+        self.__max_uses = max_uses
+        # Куча страницы не вырастет выше ограничения профиля, поэтому
+        # порог берется чуть ниже этого ограничения.
+        self.__max_memory_mb = max_memory_mb
+        if profile.renderer_memory_mb > 0:
+            self.__max_memory_mb = min(max_memory_mb,
+                                       profile.renderer_memory_mb * 0.9)
+        self.__page_load_timeout = page_load_timeout
+        self.__profile = profile
+        self.__session_store = session_store
+        self.__retry_delay = retry_delay
+        self.__max_retry_delay = max_retry_delay
+        self.__start_attempts = max(start_attempts, 1)
+        self.__informer = informer
+
+        # Свободные прогретые драйверы.
+        self.__idle: 'queue.Queue[PooledDriver]' = queue.Queue()
+        # Драйверы, выданные задачам.
+        self.__leased: List[webdriver.Chrome] = []
+        # Драйверы, переданные пользователю (например, с собранной корзиной).
+        self.__detached: List[webdriver.Chrome] = []
+        # Драйверы, профиль которых временно сменен.
+        self.__switched: List[webdriver.Chrome] = []
+        self.__lock = threading.Lock()
+        self.__closed = True
+        # Событие закрытия прерывает ожидание повторного запуска.
+        self.__closing = threading.Event()
+
+    def start(self) -> None:
+        """
+        Запуск и прогрев всех драйверов пула.
+
+        Браузеры, которые не запустились за отведенные попытки, дальше
+        запускаются в фоне.
+
+        :raises DriverStartError: Если не запустился ни один браузер.
+        """
+
+        self.__closed = False
+        self.__closing.clear()
+        started = [False] * self.__size
+
+        def _start(number: int) -> None:
+            started[number] = self._replenish(self.__start_attempts)
+
+        threads = [threading.Thread(target=_start, args=(number,),
+                                    daemon=True)
+                   for number in range(self.__size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not any(started):
+            self.close()
+            raise DriverStartError(
+                f'не запустился ни один браузер за '
+                f'{self.__start_attempts} попыток'
+            )
+
+        missing = started.count(False)
+        if missing:
+            self.__log(
+                f'Не запустилось браузеров: {missing} из {self.__size}, '
+                f'запуск продолжается в фоне',
+                Informer.MessageLevel.ERROR,
+            )
+            for _ in range(missing):
+                self._replenish_async()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None
+              ) -> Iterator[webdriver.Chrome]:
+        """
+        Получение драйвера из пула во временное пользование.
+
+        После выхода из контекста драйвер возвращается в пул или
+        пересоздается, если он неисправен или отработал свой ресурс.
+
+        :param timeout: Сколько секунд ждать свободный драйвер.
+        :return: Прогретый веб-драйвер.
+        """
+
+        pooled = self.__idle.get(timeout=timeout)
+        pooled.uses += 1
+        with self.__lock:
+            self.__leased.append(pooled.driver)
+        try:
+            yield pooled.driver
+        finally:
+            self._release(pooled)
+
+    def detach(self, driver: webdriver.Chrome) -> None:
+        """
+        Изъятие драйвера из пула.
+
+        Драйвер больше не будет выдаваться задачам, а вместо него в фоне
+        запускается новый. Используется, когда в браузере собрана корзина,
+        и его нужно оставить пользователю.
+
+        :param driver: Выданный из пула веб-драйвер.
+        """
+
+        with self.__lock:
+            if driver not in self.__detached:
+                self.__detached.append(driver)
+
+    def switch_profile(self, driver: webdriver.Chrome,
+                       profile: BrowserProfile) -> None:
+        """
+        Временная смена блокировки запросов выданного драйвера.
+
+        Например, перед сбором билетов сканирующий браузер переключается на
+        полный профиль. При возврате в пул профиль пула восстанавливается.
+
+        :param driver: Выданный из пула веб-драйвер.
+        :param profile: Новый профиль.
+        """
+
+        profile.apply(driver)
+        with self.__lock:
+            if driver not in self.__switched:
+                self.__switched.append(driver)
+
+    @property
+    def profile(self) -> BrowserProfile:
+        """Профиль запуска браузеров пула"""
+
+        return self.__profile
+
+    def discard(self, driver: webdriver.Chrome) -> None:
+        """
+        Принудительное пересоздание драйвера.
+
+        Браузер закрывается вместе с запомненным состоянием календаря.
+
+        :param driver: Выданный из пула неисправный веб-драйвер.
+        """
+
+        # Закрытый драйвер при возврате в пул только заменяется новым.
+        with self.__lock:
+            if driver in self.__leased:
+                self.__leased.remove(driver)
+        self._quit(driver)
+
+    def close(self) -> None:
+        """
+        Закрытие всех драйверов пула.
+
+        Закрываются и выданные задачам драйверы: задачи, которые их
+        используют, завершатся ошибкой браузера.
+        """
+
+        self.__closed = True
+        self.__closing.set()
+        while True:
+            try:
+                self._quit(self.__idle.get_nowait().driver)
+            except queue.Empty:
+                break
+
+        with self.__lock:
+            detached, self.__detached = self.__detached, []
+            leased, self.__leased = self.__leased, []
+        for driver in detached:
+            self._quit(driver)
+        for driver in leased:
+            if driver not in detached:
+                self._quit(driver)
+
+    def _release(self, pooled: PooledDriver) -> None:
+        """Возврат драйвера в пул после использования"""
+
+        with self.__lock:
+            detached = pooled.driver in self.__detached
+            switched = pooled.driver in self.__switched
+            if switched:
+                self.__switched.remove(pooled.driver)
+            # Драйвер уже закрыт пулом: при закрытии пула или принудительно.
+            closed = pooled.driver not in self.__leased
+            if not closed:
+                self.__leased.remove(pooled.driver)
+
+        if closed:
+            self._replenish_async()
+            return
+
+        if detached or self.__closed:
+            if not detached:
+                self._quit(pooled.driver)
+            self._replenish_async()
+            return
+
+        if pooled.uses >= self.__max_uses or not self._healthy(pooled.driver):
+            self._quit(pooled.driver)
+            self._replenish_async()
+            return
+
+        if switched:
+            try:
+                self.__profile.apply(pooled.driver)
+            except WebDriverException:
+                self._quit(pooled.driver)
+                self._replenish_async()
+                return
+
+        self.__idle.put(pooled)
+
+    def _healthy(self, driver: webdriver.Chrome) -> bool:
+        """
+        Проверка драйвера на работоспособность.
+
+        :return:
+            True, если браузер отвечает и не превысил порог памяти,
+            иначе False.
+        """
+
+        try:
+            used_heap = driver.execute_script(
+                'return window.performance && performance.memory '
+                '? performance.memory.usedJSHeapSize : 0;'
+            )
+        except WebDriverException:
+            return False
+
+        return (used_heap or 0) / 1024 / 1024 < self.__max_memory_mb
+
+    def _replenish_async(self) -> None:
+        """Запуск нового драйвера в фоне"""
+
+        if not self.__closed:
+            threading.Thread(target=self._replenish, daemon=True).start()
+
+    def _replenish(self, attempts: Optional[int] = None) -> bool:
+        """
+        Запуск, прогрев и добавление в пул нового драйвера.
+
+        Неудачный запуск повторяется с нарастающей задержкой, пока пул не
+        закрыт: иначе место браузера в пуле терялось бы насовсем.
+
+        :param attempts: Сколько попыток дается. None - без ограничения.
+        :return: True, если драйвер добавлен в пул.
+        """
+
+        delay = self.__retry_delay
+        failures = 0
+        while not self.__closed:
+            driver: Optional[webdriver.Chrome] = None
+            try:
+                driver = self._create_driver()
+                self._warm_up(driver)
+            # Поток пополнения не должен завершиться молча, какой бы ни была
+            # ошибка запуска.
+            except Exception as e:
+                if driver is not None:
+                    self._quit(driver)
+                failures += 1
+                if attempts is not None and failures >= attempts:
+                    self.__log(f'Ошибка запуска браузера: {e}',
+                               Informer.MessageLevel.ERROR)
+                    return False
+                self.__log(
+                    f'Ошибка запуска браузера: {e}. Повтор через '
+                    f'{delay:.0f} с',
+                    Informer.MessageLevel.ERROR,
+                )
+                if self.__closing.wait(timeout=delay):
+                    return False
+                delay = min(delay * 2, self.__max_retry_delay)
+                continue
+
+            if self.__closed:
+                self._quit(driver)
+                return False
+            self.__idle.put(PooledDriver(driver))
+            return True
+
+        return False
+
+    @timed('driver_start')
+    def _create_driver(self) -> webdriver.Chrome:
+        """Запуск нового браузера с профилем пула"""
+
+        driver = webdriver.Chrome(
+            self.__driver_path,
+            options=self.__profile.chrome_options(),
+        )
+        # Зависшая загрузка страницы завершается ошибкой, а не блокирует
+        # сканирование.
+        if self.__page_load_timeout > 0:
+            driver.set_page_load_timeout(self.__page_load_timeout)
+        # Блокировка запросов включается до первой загрузки страницы.
+        if self.__profile.blocked_urls:
+            self.__profile.apply(driver)
+
+        return driver
+
+    def _warm_up(self, driver: webdriver.Chrome) -> None:
+        """Открытие наблюдаемой страницы и закрытие плашки с куки"""
+
+        store = self.__session_store
+        # Сохраненная сессия восстанавливается до первой загрузки
+        # страницы, чтобы сайт сразу ее увидел.
+        restoring = store.restore(driver) if store is not None else None
+
+        driver.get(self.__url)
+        if restoring is not None:
+            store.stop_restoring(driver, restoring)
+
+        # Плашка с куки мешается при взаимодействии с элементами страницы.
+        # Попытаемся закрыть ее, если она есть.
+        try:
+            closed = close_cookie_card(driver)
+        except WebDriverException:
+            closed = False
+
+        # Сессия снимается с первого прогретого браузера, а также если
+        # сохраненная устарела или сайт снова показал плашку с куки.
+        if store is not None \
+                and (closed or store.get(SessionKind.BASE) is None):
+            store.capture(driver, SessionKind.BASE)
+
+    def _quit(self, driver: webdriver.Chrome) -> None:
+        """Закрытие браузера"""
+
+        # Запомненный месяц календаря хранится по сессии браузера, и
+        # без сброса записи закрытых браузеров копились бы.
+        CalendarNavigator.forget(driver)
+
+        # Пользователь может сам закрыть окно браузера, что вызовет ошибку.
+        # Исключим такое поведение.
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            self.__log(f'Ошибка закрытия браузера: {e}',
+                       Informer.MessageLevel.ERROR)
+
+    def __log(self, msg: str, level: Informer.MessageLevel) -> None:
+        """Сообщение информеру, если он задан"""
+
+        if self.__informer is not None:
+            self.__informer.push_message(msg, level)
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import subprocess
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)
+from appdirs import user_cache_dir
+from webdriver_manager.chrome import ChromeDriverManager
+
+from .informer import Informer
+
+
+class DriverResolveError(Exception):
+    """Ошибка поиска исполняемого файла chromedriver"""
+
+
+class DriverResolver:
+    """
+    Класс поиска исполняемого файла chromedriver.
+
+    Запоминает найденный chromedriver в локальном кэше по версии
+    установленного Chrome. При повторном запуске на той же машине
+    webdriver_manager не обращается к сети, и запуск занимает миллисекунды.
+    В автономном режиме используется только закрепленный путь или кэш.
+    """
+
+    CACHE_FILE_NAME = 'chromedriver_cache.json'
+
+    # Пути к исполняемому файлу Chrome на разных платформах.
+    CHROME_BINARIES = (
+        'google-chrome',
+        'google-chrome-stable',
+        'chromium',
+        'chromium-browser',
+        '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    )
+
+    def __init__(self, *,
+                 pinned_path: Optional[str] = None,
+                 offline: bool = False,
+                 cache_dir: Optional[str] = None,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param pinned_path: Закрепленный путь к chromedriver из настроек.
+        :param offline: Не обращаться к сети за chromedriver.
+        :param cache_dir: Каталог кэша. По умолчанию - кэш пользователя.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__pinned_path = pinned_path
+        self.__offline = offline
+        self.__cache_dir = cache_dir or user_cache_dir('colosseum_bot')
+        self.__informer = informer
+
+        # Найденный путь запоминается на время жизни процесса.
+        self.__resolved_path: Optional[str] = None
+
+    @property
+    def cache_path(self) -> str:
+        """Путь к файлу кэша"""
+
+        return os.path.join(self.__cache_dir, self.CACHE_FILE_NAME)
+
+    def resolve(self) -> str:
+        """
+        Поиск исполняемого файла chromedriver.
+
+        :return: Путь к chromedriver.
+        :raises DriverResolveError: Если chromedriver найти не удалось.
+        """
+
+        if self.__resolved_path is not None:
+            return self.__resolved_path
+
+        started = time.perf_counter()
+        path, source = self._resolve()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if self.__informer is not None:
+            self.__informer.push_message(
+                f'chromedriver найден за {elapsed_ms:.0f} мс ({source}): {path}',
+                Informer.MessageLevel.INFO,
+            )
+
+        self.__resolved_path = path
+        return path
+
+    def _resolve(self) -> Tuple[str, str]:
+        """
+        Поиск chromedriver по закрепленному пути, кэшу или через сеть.
+
+        :return: Путь к chromedriver и источник, откуда он взят.
+        """
+
+        if self.__pinned_path:
+            if not os.path.isfile(self.__pinned_path):
+                raise DriverResolveError(
+                    f'Закрепленный chromedriver не найден: {self.__pinned_path}'
+                )
+            return self.__pinned_path, 'закрепленный путь'
+
+        chrome_version = self.detect_chrome_version()
+        cache = self._load_cache()
+
+        cached_path = cache.get(chrome_version or '')
+        if cached_path and os.path.isfile(cached_path):
+            return cached_path, 'кэш'
+
+        if self.__offline:
+            raise DriverResolveError(
+                'Автономный режим: chromedriver для Chrome '
+                f'{chrome_version or "неизвестной версии"} отсутствует в кэше, '
+                'укажите путь в CHROMEDRIVER_PATH'
+            )
+
+        path = ChromeDriverManager().install()
+        if chrome_version:
+            cache[chrome_version] = path
+            self._save_cache(cache)
+
+        return path, 'webdriver_manager'
+
+    @classmethod
+    def detect_chrome_version(cls) -> Optional[str]:
+        """
+        Определение версии установленного Chrome.
+
+        :return: Версия Chrome, либо None, если Chrome не найден.
+        """
+
+        if sys.platform.startswith('win'):
+            return cls._detect_windows_chrome_version()
+
+        for binary in cls.CHROME_BINARIES:
+            executable = shutil.which(binary) or (
+                binary if os.path.isfile(binary) else None
+            )
+            if executable is None:
+                continue
+            try:
+                output = subprocess.run(
+                    [executable, '--version'],
+                    capture_output=True, text=True, timeout=5,
+                ).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            match = re.search(r'(\d+\.\d+\.\d+\.\d+)', output)
+            if match:
+                return match.group(1)
+
+        return None
+
+    @staticmethod
+    def _detect_windows_chrome_version() -> Optional[str]:
+        """Определение версии Chrome по реестру Windows"""
+
+        import winreg
+
+        for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                with winreg.OpenKey(root, r'Software\Google\Chrome\BLBeacon') as key:
+                    return winreg.QueryValueEx(key, 'version')[0]
+            except OSError:
+                continue
+
+        return None
+
+    def _load_cache(self) -> Dict[str, str]:
+        """Загрузка кэша "версия Chrome - путь к chromedriver" """
+
+        try:
+            with open(self.cache_path, encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache: Dict[str, str]) -> None:
+        """Сохранение кэша "версия Chrome - путь к chromedriver" """
+
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(cache, cache_file, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(e)
@@ -0,0 +1,392 @@
+import sqlite3
+import threading
+import datetime as dt
+from collections import Counter
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from .scan_scheduler import ReleaseWindow
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS observations (
+    page TEXT NOT NULL DEFAULT '',
+    slot_day INTEGER NOT NULL,
+    slot_minute INTEGER NOT NULL,
+    observed_at INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (page, slot_day, slot_minute, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_time
+    ON observations (observed_at);
+'''
+
+# Перенос базы, созданной до появления страниц продуктов. Старые
+# наблюдения относятся к неизвестной странице.
+_MIGRATION = '''
+ALTER TABLE observations RENAME TO observations_old;
+DROP INDEX IF EXISTS observations_time;
+%s
+INSERT INTO observations (page, slot_day, slot_minute, observed_at, count)
+    SELECT '', slot_day, slot_minute, observed_at, count
+    FROM observations_old;
+DROP TABLE observations_old;
+''' % _SCHEMA
+
+
+@dataclass(frozen=True)
+class Observation:
+    """Наблюдение количества билетов на слот"""
+
+    # Момент наблюдения с точностью до секунды.
+    observed_at: dt.datetime
+    date: dt.date
+    time: dt.time
+    # Количество доступных билетов. 0 - билетов нет или дата недоступна.
+    count: int
+    # URL-адрес страницы продукта. Пустая строка - страница неизвестна.
+    page: str = ''
+
+
+@dataclass(frozen=True)
+class Release:
+    """Появление билетов на слот между двумя наблюдениями"""
+
+    page: str
+    date: dt.date
+    time: dt.time
+    # Последнее наблюдение до появления билетов и первое после.
+    previous_at: dt.datetime
+    detected_at: dt.datetime
+    previous: int
+    current: int
+
+    @property
+    def restock(self) -> bool:
+        """Билеты добавились к уже доступным, а не появились с нуля"""
+
+        return self.previous > 0
+
+    @property
+    def estimated_at(self) -> dt.datetime:
+        """Оценка момента появления билетов - середина между наблюдениями"""
+
+        return self.previous_at + (self.detected_at - self.previous_at) / 2
+
+
+class ReleasePatterns:
+    """
+    Отчет о том, когда обычно появляются билеты.
+
+    Появления билетов раскладываются по интервалам времени суток и по
+    дням недели. Интервалы, на которые приходится заметная доля появлений,
+    объединяются в окна для учащенного сканирования.
+    """
+
+    def __init__(self, releases: Iterable[Release],
+                 bucket_minutes: int = 15) -> None:
+        """
+        Инициализатор класса.
+
+        :param releases: Появления билетов.
+        :param bucket_minutes: Длина интервала времени суток в минутах.
+        """
+
+        self.__releases = list(releases)
+        self.__bucket_minutes = bucket_minutes
+
+        # Количество появлений по началу интервала в минутах от полуночи.
+        self.__buckets: Counter = Counter()
+        # Количество появлений по дням недели (0 - понедельник).
+        self.__weekdays: Counter = Counter()
+        for release in self.__releases:
+            moment = release.estimated_at
+            minute = moment.hour * 60 + moment.minute
+            self.__buckets[minute - minute % bucket_minutes] += 1
+            self.__weekdays[moment.weekday()] += 1
+
+    @property
+    def total(self) -> int:
+        """Количество появлений билетов"""
+
+        return len(self.__releases)
+
+    @property
+    def buckets(self) -> Dict[dt.time, int]:
+        """Количество появлений по интервалам времени суток"""
+
+        return {
+            dt.time(minute // 60, minute % 60): count
+            for minute, count in sorted(self.__buckets.items())
+        }
+
+    @property
+    def weekdays(self) -> Dict[int, int]:
+        """Количество появлений по дням недели (0 - понедельник)"""
+
+        return dict(sorted(self.__weekdays.items()))
+
+    def windows(self, min_share: float = 0.1,
+                padding_minutes: int = 5) -> List[ReleaseWindow]:
+        """
+        Окна появления билетов.
+
+        :param min_share:
+            Минимальная доля появлений в интервале, чтобы он вошел в окно.
+        :param padding_minutes:
+            Насколько минут раньше начинать окно, чтобы успеть к началу
+            продажи.
+        :return: Окна в порядке времени суток.
+        """
+
+        if not self.__releases:
+            return []
+
+        threshold = max(1, min_share * self.total)
+        hot = sorted(minute for minute, count in self.__buckets.items()
+                     if count >= threshold)
+
+        # Соседние интервалы объединяются в одно окно.
+        ranges: List[List[int]] = []
+        for minute in hot:
+            if ranges and ranges[-1][1] == minute:
+                ranges[-1][1] = minute + self.__bucket_minutes
+            else:
+                ranges.append([minute, minute + self.__bucket_minutes])
+
+        windows = []
+        for start, end in ranges:
+            start = (start - padding_minutes) % (24 * 60)
+            end = end % (24 * 60)
+            windows.append(ReleaseWindow(
+                start=dt.time(start // 60, start % 60),
+                end=dt.time(end // 60, end % 60),
+            ))
+
+        return windows
+
+    def report(self) -> str:
+        """
+        Текстовый отчет.
+
+        :return: Строки вида "09:00-09:15: N (N%)" по интервалам.
+        """
+
+        if not self.__releases:
+            return 'Появлений билетов не зафиксировано'
+
+        restocks = sum(1 for release in self.__releases if release.restock)
+        lines = [f'Появлений билетов: {self.total}, '
+                 f'из них пополнений: {restocks}']
+        for start, count in self.buckets.items():
+            end = (dt.datetime.combine(dt.date.min, start)
+                   + dt.timedelta(minutes=self.__bucket_minutes)).time()
+            lines.append(f'{start:%H:%M}-{end:%H:%M}: {count} '
+                         f'({count / self.total:.0%})')
+
+        return '\n'.join(lines)
+
+
+class AvailabilityHistory:
+    """
+    Класс истории наблюдений доступности.
+
+    Хранит каждое наблюдение количества билетов на слот в локальной базе
+    SQLite. Таблица только дополняется и упорядочена по странице продукта,
+    слоту и времени наблюдения, поэтому история слота читается
+    последовательно, а по истории определяется, когда на сайте обычно
+    появляются билеты.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Инициализатор класса.
+
+        :param path: Путь к файлу базы. ':memory:' - база в памяти.
+        """
+
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self._migrate()
+        self.__connection.executescript(_SCHEMA)
+        self.__lock = threading.Lock()
+
+    def record(self, observations: Iterable[Observation]) -> None:
+        """
+        Запись наблюдений одного сканирования.
+
+        :param observations: Наблюдения.
+        """
+
+        rows = [
+            (observation.page,
+             observation.date.toordinal(),
+             observation.time.hour * 60 + observation.time.minute,
+             int(observation.observed_at.timestamp()),
+             observation.count)
+            for observation in observations
+        ]
+        if not rows:
+            return
+
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO observations '
+                '(page, slot_day, slot_minute, observed_at, count) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def observations(self, date: Optional[dt.date] = None,
+                     time: Optional[dt.time] = None,
+                     since: Optional[dt.datetime] = None,
+                     until: Optional[dt.datetime] = None,
+                     page: Optional[str] = None) -> List[Observation]:
+        """
+        Выборка наблюдений.
+
+        :param date: Дата слота. None - все даты.
+        :param time: Время слота. None - все времена.
+        :param since: Начало периода наблюдений включительно.
+        :param until: Конец периода наблюдений не включительно.
+        :param page: Страница продукта. None - все страницы.
+        :return: Наблюдения по страницам, слотам и времени наблюдения.
+        """
+
+        return list(self._select(date, time, since, until,
+                                 pages=None if page is None else [page]))
+
+    def releases(self, since: Optional[dt.datetime] = None,
+                 until: Optional[dt.datetime] = None,
+                 pages: Optional[Iterable[str]] = None) -> List[Release]:
+        """
+        Появления и пополнения билетов.
+
+        :param since: Начало периода наблюдений.
+        :param until: Конец периода наблюдений.
+        :param pages: Страницы продуктов. None - все страницы.
+        :return:
+            Случаи, когда количество билетов на слот выросло между
+            соседними наблюдениями.
+        """
+
+        releases: List[Release] = []
+        previous: Optional[Observation] = None
+        for observation in self._select(since=since, until=until,
+                                        pages=pages):
+            same_slot = previous is not None \
+                and previous.page == observation.page \
+                and previous.date == observation.date \
+                and previous.time == observation.time
+            if same_slot and observation.count > previous.count:
+                releases.append(Release(
+                    page=observation.page,
+                    date=observation.date,
+                    time=observation.time,
+                    previous_at=previous.observed_at,
+                    detected_at=observation.observed_at,
+                    previous=previous.count,
+                    current=observation.count,
+                ))
+            previous = observation
+
+        return releases
+
+    def patterns(self, days: int = 30,
+                 bucket_minutes: int = 15,
+                 pages: Optional[Iterable[str]] = None) -> ReleasePatterns:
+        """
+        Отчет о появлении билетов за последние дни.
+
+        :param days: За сколько последних дней учитывать наблюдения.
+        :param bucket_minutes: Длина интервала времени суток в минутах.
+        :param pages: Страницы продуктов. None - все страницы.
+        :return: Отчет о появлении билетов.
+        """
+
+        since = dt.datetime.now() - dt.timedelta(days=days)
+        return ReleasePatterns(self.releases(since=since, pages=pages),
+                               bucket_minutes=bucket_minutes)
+
+    def prune(self, before: dt.datetime) -> int:
+        """
+        Удаление старых наблюдений.
+
+        :param before: Наблюдения раньше этого момента удаляются.
+        :return: Количество удаленных наблюдений.
+        """
+
+        with self.__lock, self.__connection:
+            cursor = self.__connection.execute(
+                'DELETE FROM observations WHERE observed_at < ?',
+                (int(before.timestamp()),),
+            )
+
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Закрытие базы"""
+
+        with self.__lock:
+            self.__connection.close()
+
+    def _migrate(self) -> None:
+        """Перенос таблицы наблюдений без страниц в новую схему"""
+
+        columns = [row[1] for row in self.__connection.execute(
+            'PRAGMA table_info(observations)'
+        )]
+        if columns and 'page' not in columns:
+            self.__connection.executescript(_MIGRATION)
+
+    def _select(self, date: Optional[dt.date] = None,
+                time: Optional[dt.time] = None,
+                since: Optional[dt.datetime] = None,
+                until: Optional[dt.datetime] = None,
+                pages: Optional[Iterable[str]] = None
+                ) -> Iterator[Observation]:
+        """Чтение наблюдений по условиям в порядке страницы, слота и времени"""
+
+        conditions = []
+        parameters = []
+        if pages is not None:
+            pages = list(pages)
+            conditions.append(
+                f'page IN ({", ".join("?" for _ in pages)})'
+            )
+            parameters.extend(pages)
+        if date is not None:
+            conditions.append('slot_day = ?')
+            parameters.append(date.toordinal())
+        if time is not None:
+            conditions.append('slot_minute = ?')
+            parameters.append(time.hour * 60 + time.minute)
+        if since is not None:
+            conditions.append('observed_at >= ?')
+            parameters.append(int(since.timestamp()))
+        if until is not None:
+            conditions.append('observed_at < ?')
+            parameters.append(int(until.timestamp()))
+
+        query = 'SELECT page, slot_day, slot_minute, observed_at, count ' \
+                'FROM observations'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY page, slot_day, slot_minute, observed_at'
+
+        with self.__lock:
+            rows = self.__connection.execute(query, parameters).fetchall()
+
+        for page, slot_day, slot_minute, observed_at, count in rows:
+            yield Observation(
+                observed_at=dt.datetime.fromtimestamp(observed_at),
+                date=dt.date.fromordinal(slot_day),
+                time=dt.time(slot_minute // 60, slot_minute % 60),
+                count=count,
+                page=page,
+            )
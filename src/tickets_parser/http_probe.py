@@ -0,0 +1,398 @@
+import json
+import datetime as dt
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html
+
+from .availability import (
+    AvailabilitySnapshot,
+    fingerprint,
+)
+from .metrics import timed
+from .site_profile import (
+    Selector,
+    parse_count,
+    parse_date,
+    parse_time,
+    site,
+)
+from .target import (
+    ObservedTarget,
+    group_by_month,
+    group_by_date,
+)
+
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    """
+    Результат легковесной проверки даты и времени.
+
+    Содержит тот же ответ, что и проверка через браузер: доступна ли дата,
+    доступно ли время и сколько билетов осталось.
+    """
+
+    date_available: bool = False
+    time_available: bool = False
+    count_tickets: int = 0
+
+    @property
+    def hit(self) -> bool:
+        """Найдены ли доступные билеты"""
+
+        return self.date_available and self.time_available \
+            and self.count_tickets > 0
+
+
+class HttpProbe:
+    """
+    Класс легковесной проверки доступности билетов по HTTP.
+
+    Вместо загрузки страницы в браузере напрямую запрашивает календарь и
+    список сеансов у сервера и разбирает ответы парсером lxml.
+    Браузер нужен только тогда, когда билеты действительно найдены.
+    Если задано хранилище состояния доступности, ответы запрашиваются
+    условно (If-None-Match, If-Modified-Since), а фрагменты, не
+    изменившиеся с прошлой проверки, не разбираются заново.
+    """
+
+    def __init__(self, calendar_url: str,
+                 performances_url: str, *,
+                 timeout: float = 10.0,
+                 pool_size: int = 4,
+                 session: Optional[requests.Session] = None,
+                 snapshot: Optional[AvailabilitySnapshot] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param calendar_url:
+            Шаблон URL-адреса календаря месяца. Поддерживает подстановки
+            {month} и {year}.
+        :param performances_url:
+            Шаблон URL-адреса списка сеансов на дату. Поддерживает
+            подстановки {date} (в формате дд/мм/гггг) и {page}.
+        :param timeout: Таймаут одного запроса в секундах.
+        :param pool_size: Размер пула соединений HTTP-сессии.
+        :param session: Готовая HTTP-сессия, если ее нужно переиспользовать.
+        :param snapshot: Хранилище состояния доступности между проверками.
+        """
+
+        self.__calendar_url = calendar_url
+        self.__performances_url = performances_url
+        self.__timeout = timeout
+        self.__snapshot = snapshot
+        # Заголовки ETag и Last-Modified последних ответов по адресам.
+        self.__validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+        # Одна сессия с пулом соединений на все запросы: не тратим время
+        # на установку TCP- и TLS-соединений при каждой проверке.
+        self.__session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+    @property
+    def session(self) -> requests.Session:
+        """Получение HTTP-сессии проверки"""
+
+        return self.__session
+
+    @timed('probe')
+    def check_many(
+            self, targets: Iterable[ObservedTarget]
+    ) -> Dict[ObservedTarget, ProbeResult]:
+        """
+        Проверка множества слотов на доступность.
+
+        Календарь запрашивается один раз на месяц, список сеансов - один раз
+        на дату, независимо от количества слотов.
+
+        :param targets: Наблюдаемые слоты.
+        :return: Результаты проверки для каждого слота.
+        """
+
+        results: Dict[ObservedTarget, ProbeResult] = {}
+        for month, month_targets in group_by_month(targets).items():
+            days = self.fetch_calendar(month)
+
+            for day, day_targets in group_by_date(month_targets).items():
+                if not days.get(day, False):
+                    for target in day_targets:
+                        results[target] = ProbeResult()
+                    continue
+
+                counts = self.find_times(
+                    day, {target.observed_time for target in day_targets}
+                )
+                for target in day_targets:
+                    count_tickets = counts.get(target.observed_time)
+                    results[target] = ProbeResult(
+                        date_available=True,
+                        time_available=count_tickets is not None,
+                        count_tickets=count_tickets or 0,
+                    )
+
+        return results
+
+    def fetch_calendar(self, month: dt.date) -> Dict[dt.date, bool]:
+        """
+        Получение доступности дней месяца.
+
+        :param month: Любая дата нужного месяца.
+        :return: Словарь "дата - доступна ли дата".
+        """
+
+        url = self.__calendar_url.format(month=month.month, year=month.year)
+        month = month.replace(day=1)
+        days, changed = self._fetch(('http', 'calendar', month), url,
+                                    self._parse_calendar)
+        if changed and self.__snapshot is not None:
+            self.__snapshot.update_days(days)
+
+        return days
+
+    def _parse_calendar(self,
+                        document: html.HtmlElement) -> Dict[dt.date, bool]:
+        """Разбор доступности дней месяца"""
+
+        days: Dict[dt.date, bool] = {}
+        for day_element in self._select(document, site['calendar_day']):
+            date_object = parse_date(day_element.get('data-date') or '')
+            if date_object is None:
+                continue
+            days[date_object] = self._allowed_day(day_element.getparent())
+
+        return days
+
+    def find_times(self, day: dt.date,
+                   observed_times: Set[dt.time]) -> Dict[dt.time, int]:
+        """
+        Поиск времен в списке сеансов на дату.
+
+        :param day: Дата сеансов.
+        :param observed_times: Наблюдаемые времена.
+        :return:
+            Словарь "найденное время - количество доступных билетов".
+            Ненайденные времена в словарь не попадают.
+        """
+
+        found: Dict[dt.time, int] = {}
+        if not observed_times:
+            return found
+
+        performances, pages = self._get_performances_page(day, 1)
+        last_time = max(observed_times)
+
+        for page in range(1, pages + 1):
+            if page > 1:
+                performances, _ = self._get_performances_page(day, page)
+
+            for observed_time in observed_times & performances.keys():
+                found[observed_time] = performances[observed_time]
+
+            # Времена идут по возрастанию, дальше искать нет смысла.
+            if len(found) == len(observed_times) \
+                    or (performances and last_time < max(performances)):
+                break
+
+        return found
+
+    def close(self) -> None:
+        """Закрытие HTTP-сессии"""
+
+        self.__session.close()
+
+    def _get_performances_page(
+            self, day: dt.date, page: int
+    ) -> Tuple[Dict[dt.time, int], int]:
+        """
+        Загрузка и разбор страницы списка сеансов.
+
+        :return:
+            Словарь "время сеанса - количество доступных билетов" и
+            общее количество страниц списка.
+        """
+
+        url = self.__performances_url.format(
+            date=day.strftime('%d/%m/%Y'),
+            page=page,
+        )
+        result, changed = self._fetch(
+            ('http', 'times', day, page), url,
+            lambda document: (self._parse_performances(document),
+                              self._count_pages(document)),
+        )
+        if changed and self.__snapshot is not None:
+            self.__snapshot.update_times(day, result[0], section=page)
+
+        return result
+
+    def _fetch(self, key: Hashable, url: str,
+               parse: Callable[[html.HtmlElement], T]) -> Tuple[T, bool]:
+        """
+        Загрузка и разбор фрагмента страницы.
+
+        Если фрагмент не изменился с прошлой загрузки, разобранное
+        содержимое берется из хранилища состояния.
+
+        :param key: Ключ фрагмента в хранилище состояния.
+        :param url: URL-адрес фрагмента.
+        :param parse: Функция разбора HTML-документа фрагмента.
+        :return: Разобранное содержимое и признак изменения фрагмента.
+        """
+
+        if self.__snapshot is None:
+            return parse(self._to_document(self._get_markup(url))), True
+
+        known = self.__snapshot.known_fingerprint(key)
+        headers: Dict[str, str] = {}
+        etag, last_modified = self.__validators.get(url, (None, None))
+        if known is not None:
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        markup = self._get_markup(url, headers)
+        # Сервер подтвердил, что фрагмент не изменился, либо отпечаток
+        # разметки совпал с прошлым.
+        digest = known if markup is None else fingerprint(markup)
+        cached = self.__snapshot.fragment(key, digest)
+        if cached is not None:
+            return cached, False
+        if markup is None:
+            markup = self._get_markup(url) or ''
+            digest = fingerprint(markup)
+
+        value = parse(self._to_document(markup))
+        self.__snapshot.store_fragment(key, digest, value)
+
+        return value, True
+
+    def _get_markup(self, url: str,
+                    headers: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Загрузка разметки фрагмента.
+
+        Сервер может отдавать фрагмент как в виде HTML, так и завернутым
+        в JSON. Во втором случае фрагмент берется из первого строкового
+        поля с разметкой.
+
+        :param url: URL-адрес фрагмента.
+        :param headers: Заголовки условного запроса.
+        :return:
+            Разметка фрагмента, либо None, если сервер ответил, что фрагмент
+            не изменился.
+        """
+
+        response = self.__session.get(url, headers=headers,
+                                      timeout=self.__timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        self.__validators[url] = (response.headers.get('ETag'),
+                                  response.headers.get('Last-Modified'))
+
+        content_type = response.headers.get('Content-Type', '')
+        markup = response.text
+        if 'json' in content_type:
+            markup = self._extract_markup(response.json())
+
+        return markup
+
+    @staticmethod
+    def _to_document(markup: Optional[str]) -> html.HtmlElement:
+        """Разбор разметки фрагмента парсером lxml"""
+
+        return html.fromstring(markup or '<div></div>')
+
+    @classmethod
+    def _extract_markup(cls, payload) -> str:
+        """Извлечение HTML-фрагмента из JSON-ответа"""
+
+        if isinstance(payload, str):
+            return payload
+        if isinstance(payload, dict):
+            for key in ('html', 'content', 'data', 'result'):
+                if key in payload:
+                    return cls._extract_markup(payload[key])
+        if isinstance(payload, list):
+            return ''.join(cls._extract_markup(item) for item in payload)
+        return json.dumps(payload) if payload is not None else ''
+
+    @classmethod
+    def _count_pages(cls, document: html.HtmlElement) -> int:
+        """Получение количества страниц списка со временем"""
+
+        numbers = [
+            int(link.text_content().strip())
+            for navigation in cls._select(document, site['pagination'])
+            for link in navigation.cssselect('ul li a')
+            if link.text_content().strip().isdigit()
+        ]
+
+        return max(numbers) if numbers else 1
+
+    @classmethod
+    def _parse_performances(
+            cls, document: html.HtmlElement
+    ) -> Dict[dt.time, int]:
+        """Разбор строк списка сеансов"""
+
+        performances: Dict[dt.time, int] = {}
+        for row in cls._select(document, site['time_row']):
+            # Время - первое время в тексте строки, количество билетов -
+            # число в скобках на кнопке покупки.
+            time_object = parse_time(row.text_content())
+            if time_object is None:
+                continue
+
+            count_elements = cls._select(row, site['row_count'])
+            count = parse_count(count_elements[0].text_content()) \
+                if count_elements else None
+            performances[time_object] = count or 0
+
+        return performances
+
+    @staticmethod
+    def _select(element: html.HtmlElement,
+                selector: Selector) -> List[html.HtmlElement]:
+        """Поиск элементов по первому сработавшему варианту селектора"""
+
+        for variant in selector.variants:
+            # Варианты с :scope рассчитаны на браузер, lxml их не
+            # поддерживает.
+            if ':scope' in variant:
+                continue
+            elements = element.cssselect(variant)
+            if elements:
+                return elements
+
+        return []
+
+    @staticmethod
+    def _allowed_day(cell: Optional[html.HtmlElement]) -> bool:
+        """Проверка ячейки с датой календаря на доступность"""
+
+        if cell is None:
+            return False
+
+        return site.allowed_day(cell.get('style') or '',
+                                (cell.get('class') or '').split())
@@ -1,68 +1,261 @@
-import logging
+import queue
+import atexit
+import threading
 import datetime as dt
+from collections import OrderedDict
+from dataclasses import (
+    dataclass,
+    replace,
+)
+from typing import (
+    TYPE_CHECKING,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from enum import (
     Enum,
     auto,
 )
-from PyQt5 import QtWidgets
+
+if TYPE_CHECKING:
+    from .log_sinks import Sink
 
 
 class Informer:
     """
     Класс информатора.
 
-    Обеспечивает информацию о состоянии бота в целом.
+    Обеспечивает информацию о состоянии бота в целом. Сообщения не пишутся
+    в месте вызова: они попадают в очередь, а фоновый поток пачками
+    передает их приемникам (файл, интерфейс, stdout, JSON-lines). Поэтому
+    вывод сообщений не задерживает сканирование и сбор билетов.
     """
 
     class MessageLevel(Enum):
         INFO = auto()
         ERROR = auto()
 
-    def __init__(self, file_name: str, ui_view: QtWidgets.QTextEdit) -> None:
+    def __init__(self, sinks: Optional[Sequence['Sink']] = None, *,
+                 repeat_interval: float = 300.0,
+                 max_repeats: int = 1000,
+                 max_batch: int = 500) -> None:
         """
         Инициализатор класса.
 
-        :param file_name: Имя файла для логирования.
-        :param ui_view: Элемент интерфейса для вывода сообщений пользователю.
+        :param sinks: Приемники сообщений.
+        :param repeat_interval:
+            Сколько секунд одинаковые информационные сообщения не
+            повторяются. 0 - повторять всегда.
+        :param max_repeats:
+            Сколько разных сообщений помнить для подавления повторов.
+            Давно не встречавшиеся сообщения забываются первыми.
+        :param max_batch: Максимальное количество сообщений в одной пачке.
         """
 
-        # Настройка логгера.
-        self.__file_name = file_name
-        self.__logger = logging.getLogger('main_logger')
-        self.__logger.setLevel(logging.INFO)
-        self.__logger.addHandler(self._create_logger_handler())
-
-        # Настройка объекта UI для вывода информации пользователю.
-        self.__ui_view = ui_view
-
-    def _create_logger_handler(self) -> logging.FileHandler:
-        """
-        Создание и настройка обработчика файла логирования.
+        self.__sinks = list(sinks or [])
+        self.__repeat_interval = repeat_interval
+        self.__max_repeats = max_repeats
+        self.__max_batch = max_batch
 
-        :return: Настроенный обработчик для файла логирования.
-        """
+        # Время последнего вывода и количество подавленных повторов
+        # каждого сообщения в порядке последнего появления. Сообщения
+        # бывают с меняющимися числами, поэтому словарь ограничен.
+        self.__repeats: \
+            'OrderedDict[Tuple[str, str], Tuple[dt.datetime, int]]' \
+            = OrderedDict()
+        self.__repeats_lock = threading.Lock()
 
-        file_handler = logging.FileHandler(self.__file_name)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        self.__queue: 'queue.SimpleQueue[Union[InformerEvent, threading.Event]]' \
+            = queue.SimpleQueue()
+        self.__closed = False
+        self.__thread = threading.Thread(
+            target=self._run, name='informer', daemon=True,
         )
-        file_handler.setFormatter(formatter)
+        self.__thread.start()
 
-        return file_handler
+        # Оставшиеся в очереди сообщения выводятся при завершении программы.
+        atexit.register(self.close)
 
-    def push_message(self, msg: str, level: MessageLevel) -> None:
+    def push_message(self, msg: str,
+                     level: MessageLevel,
+                     phase: Optional[str] = None,
+                     target: Optional[object] = None,
+                     duration: Optional[float] = None) -> None:
         """
         Логирование сообщения и вывод его пользователю.
 
         :param msg: Текст сообщения.
         :param level: Уровень сообщения.
+        :param phase: Этап работы бота, к которому относится сообщение.
+        :param target: Слот, к которому относится сообщение.
+        :param duration: Длительность этапа в секундах.
+        """
+
+        self.push_event(InformerEvent(
+            level=level,
+            msg=msg,
+            timestamp=dt.datetime.now(),
+            phase=phase,
+            target=str(target) if target is not None else None,
+            duration=duration,
+        ))
+
+    def push_event(self, event: 'InformerEvent') -> None:
+        """
+        Логирование готового события.
+
+        Используется для событий из рабочих процессов, которые приходят
+        с задержкой.
+
+        :param event: Событие.
+        """
+
+        if self.__closed:
+            return
+
+        event = self._limit_repeats(event)
+        if event is not None:
+            self.__queue.put(event)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ожидание вывода всех сообщений, поставленных в очередь.
+
+        :param timeout: Сколько секунд ждать.
+        :return: True, если все сообщения выведены.
+        """
+
+        if self.__closed or not self.__thread.is_alive():
+            return False
+
+        done = threading.Event()
+        self.__queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Вывод оставшихся сообщений и закрытие приемников"""
+
+        if self.__closed:
+            return
+
+        self.flush(timeout=5)
+        self.__closed = True
+        self.__queue.put(_STOP)
+        self.__thread.join(timeout=5)
+
+        for sink in self.__sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
+
+    def _limit_repeats(
+            self, event: 'InformerEvent'
+    ) -> Optional['InformerEvent']:
+        """
+        Подавление повторяющихся информационных сообщений.
+
+        Одинаковое сообщение выводится не чаще раза в repeat_interval
+        секунд. При следующем выводе к нему добавляется количество
+        подавленных повторов. Ошибки не подавляются.
+
+        :param event: Событие.
+        :return: Событие для вывода, либо None, если оно подавлено.
         """
 
-        if level == self.MessageLevel.INFO:
-            self.__logger.info(msg)
-            msg_for_ui = f'{dt.datetime.now()} - INFO - {msg}'
-            self.__ui_view.append(msg_for_ui)
-        elif level == self.MessageLevel.ERROR:
-            self.__logger.error(msg)
-            msg_for_ui = f'{dt.datetime.now()} - ERROR - {msg}'
-            self.__ui_view.append(msg_for_ui)
+        if self.__repeat_interval <= 0 \
+                or event.level != self.MessageLevel.INFO:
+            return event
+
+        key = (event.msg, event.target or '')
+        with self.__repeats_lock:
+            last = self.__repeats.get(key)
+            if last is not None:
+                shown, suppressed = last
+                self.__repeats.move_to_end(key)
+                if (event.timestamp - shown).total_seconds() \
+                        < self.__repeat_interval:
+                    self.__repeats[key] = (shown, suppressed + 1)
+                    return None
+                if suppressed:
+                    event = replace(
+                        event,
+                        msg=f'{event.msg} (повторов: {suppressed})',
+                    )
+            self.__repeats[key] = (event.timestamp, 0)
+            while len(self.__repeats) > self.__max_repeats:
+                self.__repeats.popitem(last=False)
+
+        return event
+
+    def _run(self) -> None:
+        """Цикл передачи сообщений приемникам"""
+
+        while True:
+            item = self.__queue.get()
+
+            # Забираем из очереди все, что успело накопиться, чтобы
+            # передать приемникам одной пачкой.
+            batch: List[InformerEvent] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+
+                if stop or len(batch) >= self.__max_batch:
+                    break
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, batch: List['InformerEvent']) -> None:
+        """Передача пачки сообщений всем приемникам"""
+
+        for sink in self.__sinks:
+            # Ошибка одного приемника не должна мешать остальным и
+            # останавливать поток вывода.
+            try:
+                sink.write(batch)
+            except Exception:
+                pass
+
+
+@dataclass(frozen=True)
+class InformerEvent:
+    """Событие информера"""
+
+    level: Informer.MessageLevel
+    msg: str
+    timestamp: dt.datetime
+    # Этап работы бота, например, 'scan' или 'collect'.
+    phase: Optional[str] = None
+    # Слот в виде строки "дд.мм.гггг ЧЧ:ММ".
+    target: Optional[str] = None
+    # Длительность этапа в секундах.
+    duration: Optional[float] = None
+
+    def format(self) -> str:
+        """Текстовое представление события для вывода пользователю"""
+
+        return f'{self.timestamp:%Y-%m-%d %H:%M:%S} - {self.level.name} - ' \
+               f'{self.msg}'
+
+
+# Метка остановки потока вывода.
+_STOP = object()
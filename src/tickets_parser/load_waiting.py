@@ -1,19 +1,156 @@
 import time
+import threading
+from enum import (
+    Enum,
+    auto,
+)
 from typing import (
+    Any,
+    Callable,
+    Dict,
     List,
     Union,
     Optional,
 )
 from selenium import webdriver
+from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+
+from .metrics import metrics
+
+
+# Таймаут ожидания элемента по умолчанию, в секундах.
+DEFAULT_TIMEOUT = 30.0
+# Первый интервал опроса страницы, в секундах.
+INITIAL_POLL_INTERVAL = 0.005
+# Максимальный интервал опроса страницы, в секундах.
+MAX_POLL_INTERVAL = 0.25
+# Во сколько раз увеличивается интервал опроса после каждой неудачи.
+POLL_BACKOFF = 2.0
+
+# Скрипт ожидания элемента внутри страницы. Возвращает элемент, как только
+# он появляется в DOM, либо null по истечении таймаута.
+_MUTATION_WAIT_SCRIPT = '''
+var selector = arguments[0];
+var timeoutMs = arguments[1];
+var done = arguments[arguments.length - 1];
+var found = document.querySelector(selector);
+if (found) {
+    done(found);
+    return;
+}
+var timer = null;
+var observer = new MutationObserver(function () {
+    var element = document.querySelector(selector);
+    if (element) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(element);
+    }
+});
+observer.observe(document.documentElement, {
+    childList: true,
+    subtree: true,
+    attributes: true,
+});
+timer = setTimeout(function () {
+    observer.disconnect();
+    done(null);
+}, timeoutMs);
+'''
+
+# Скрипт проверки того, что страница загружена и AJAX-запросы jQuery
+# завершены.
+_PAGE_IDLE_SCRIPT = '''
+return document.readyState === 'complete'
+    && (!window.jQuery || window.jQuery.active === 0);
+'''
+
+
+class WaitMode(Enum):
+    """Способ ожидания элемента"""
+
+    # Опрос страницы с нарастающим интервалом.
+    POLL = auto()
+    # Ожидание внутри страницы через MutationObserver.
+    MUTATION = auto()
+    # MutationObserver, если его можно использовать, иначе опрос.
+    AUTO = auto()
+
+
+class WaitStats:
+    """
+    Статистика задержек ожидания элементов.
+
+    Для каждой точки ожидания хранит количество ожиданий, суммарное и
+    максимальное время. Задержки также учитываются в гистограмме
+    wait_seconds общих метрик бота.
+    """
+
+    def __init__(self) -> None:
+        """Инициализатор класса"""
+
+        self.__lock = threading.Lock()
+        self.__stats: Dict[str, List[float]] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Запись задержки ожидания.
+
+        :param name: Название точки ожидания.
+        :param seconds: Время ожидания в секундах.
+        """
+
+        with self.__lock:
+            count, total, maximum = self.__stats.get(name, [0, 0.0, 0.0])
+            self.__stats[name] = [count + 1, total + seconds,
+                                  max(maximum, seconds)]
+        metrics.observe('wait_seconds', seconds, point=name)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Сводка по всем точкам ожидания.
+
+        :return:
+            Словарь "точка ожидания - количество, среднее и максимальное
+            время в секундах".
+        """
+
+        with self.__lock:
+            return {
+                name: {
+                    'count': count,
+                    'avg': total / count if count else 0.0,
+                    'max': maximum,
+                }
+                for name, (count, total, maximum) in self.__stats.items()
+            }
+
+    def reset(self) -> None:
+        """Сброс статистики"""
+
+        with self.__lock:
+            self.__stats.clear()
+
+
+# Общая статистика ожиданий бота.
+wait_stats = WaitStats()
 
 
 def wait_element(
         base_element: Union[WebElement, webdriver.Chrome],
         select_by: str,
         select_value: str,
-        many: bool = False
+        many: bool = False, *,
+        timeout: float = DEFAULT_TIMEOUT,
+        mode: WaitMode = WaitMode.AUTO,
+        name: Optional[str] = None,
 ) -> Optional[Union[WebElement, List[WebElement]]]:
     """
     Функция ожидания загрузки веб-элемента по селектору.
@@ -23,17 +160,158 @@ def wait_element(
     :param select_value: Значение селектора.
     :param many:
         Флаг, указывающий, нужно выбирать один или множество элементво.
+    :param timeout: Максимальное время ожидания в секундах.
+    :param mode: Способ ожидания.
+    :param name:
+        Название точки ожидания для статистики. По умолчанию - селектор.
     :return: Найденные по указанному селектору веб-элементы.
+    :raises TimeoutException: Если элемент не появился за отведенное время.
     """
 
-    # Пытаем получить доступ к элементу до тех пор, пока
-    # успешно не получим его.
+    started = time.perf_counter()
+    try:
+        css_selector = _to_css_selector(select_by, select_value)
+        if mode != WaitMode.POLL and not many and css_selector is not None \
+                and isinstance(base_element, webdriver.Remote):
+            try:
+                return _wait_mutation(base_element, css_selector, timeout)
+            except TimeoutException:
+                raise
+            except WebDriverException:
+                # Страница могла перезагрузиться во время ожидания.
+                # Продолжаем ждать опросом.
+                if mode == WaitMode.MUTATION:
+                    raise
+
+        remaining = timeout - (time.perf_counter() - started)
+        return _wait_poll(base_element, select_by, select_value, many,
+                          remaining)
+    finally:
+        wait_stats.record(name or select_value, time.perf_counter() - started)
+
+
+def _wait_poll(base_element: Union[WebElement, webdriver.Chrome],
+               select_by: str,
+               select_value: str,
+               many: bool,
+               timeout: float) -> Union[WebElement, List[WebElement]]:
+    """Ожидание элемента опросом с нарастающим интервалом"""
+
+    def find() -> Optional[Union[WebElement, List[WebElement]]]:
+        if not many:
+            return base_element.find_element(select_by, select_value)
+        return base_element.find_elements(select_by, select_value)
+
+    return _poll(find, timeout,
+                 f'Элемент {select_value} не появился за {timeout:.1f} с')
+
+
+def wait_condition(condition: Callable[[], Any], *,
+                   timeout: float = DEFAULT_TIMEOUT,
+                   name: str = 'condition',
+                   message: Optional[str] = None) -> Any:
+    """
+    Функция ожидания выполнения условия.
+
+    Условие проверяется с нарастающим интервалом до тех пор, пока не вернет
+    истинное значение. Исчезновение или устаревание элемента во время
+    проверки считается невыполненным условием.
+
+    :param condition: Функция проверки условия.
+    :param timeout: Максимальное время ожидания в секундах.
+    :param name: Название точки ожидания для статистики.
+    :param message: Текст ошибки при истечении таймаута.
+    :return: Значение, которое вернуло условие.
+    :raises TimeoutException: Если условие не выполнилось за отведенное время.
+    """
+
+    started = time.perf_counter()
+    try:
+        return _poll(condition, timeout,
+                     message or f'Условие {name} не выполнено '
+                                f'за {timeout:.1f} с')
+    finally:
+        wait_stats.record(name, time.perf_counter() - started)
+
+
+def wait_page_idle(driver: webdriver.Chrome, *,
+                   timeout: float = DEFAULT_TIMEOUT,
+                   name: str = 'page_idle') -> None:
+    """
+    Функция ожидания загрузки страницы и завершения AJAX-запросов.
+
+    :param driver: Веб-драйвер для управления браузером.
+    :param timeout: Максимальное время ожидания в секундах.
+    :param name: Название точки ожидания для статистики.
+    """
+
+    wait_condition(lambda: driver.execute_script(_PAGE_IDLE_SCRIPT),
+                   timeout=timeout, name=name)
+
+
+def _poll(condition: Callable[[], Any],
+          timeout: float,
+          message: str) -> Any:
+    """Опрос условия с нарастающим интервалом"""
+
+    deadline = time.perf_counter() + timeout
+    interval = INITIAL_POLL_INTERVAL
+
+    # Проверяем условие до тех пор, пока оно не выполнится или не истечет
+    # таймаут.
     while True:
         try:
-            if not many:
-                return base_element.find_element(select_by, select_value)
-            else:
-                return base_element.find_elements(select_by, select_value)
-        except NoSuchElementException as e:
-            print(e)
-            time.sleep(1)
+            result = condition()
+            if result:
+                return result
+        except (NoSuchElementException, StaleElementReferenceException):
+            pass
+
+        now = time.perf_counter()
+        if now >= deadline:
+            raise TimeoutException(message)
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+
+def _wait_mutation(driver: webdriver.Remote,
+                   css_selector: str,
+                   timeout: float) -> WebElement:
+    """Ожидание элемента внутри страницы через MutationObserver"""
+
+    # Таймаут скрипта должен быть больше таймаута ожидания, иначе драйвер
+    # прервет скрипт раньше. После ожидания прежний таймаут возвращается,
+    # чтобы не изменить поведение других скриптов этого браузера.
+    previous = driver.timeouts.script
+    driver.set_script_timeout(timeout + 1)
+    try:
+        element = driver.execute_async_script(
+            _MUTATION_WAIT_SCRIPT, css_selector, int(timeout * 1000),
+        )
+    finally:
+        driver.set_script_timeout(previous)
+    if element is None:
+        raise TimeoutException(
+            f'Элемент {css_selector} не появился за {timeout:.1f} с'
+        )
+
+    return element
+
+
+def _to_css_selector(select_by: str, select_value: str) -> Optional[str]:
+    """
+    Перевод селектора в CSS-селектор.
+
+    :return: CSS-селектор, либо None, если перевести селектор нельзя.
+    """
+
+    if select_by == By.CSS_SELECTOR:
+        return select_value
+    if select_by == By.CLASS_NAME:
+        return f'.{select_value}'
+    if select_by == By.ID:
+        return f'#{select_value}'
+    if select_by == By.TAG_NAME:
+        return select_value
+
+    return None
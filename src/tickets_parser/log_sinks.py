@@ -0,0 +1,124 @@
+import json
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from typing import (
+    Callable,
+    List,
+    TextIO,
+)
+
+from .informer import InformerEvent
+
+
+class Sink(ABC):
+    """
+    Приемник сообщений информера.
+
+    Получает сообщения пачками из потока вывода информера, поэтому может
+    писать медленно, не задерживая работу бота.
+    """
+
+    @abstractmethod
+    def write(self, events: List[InformerEvent]) -> None:
+        """
+        Вывод пачки сообщений.
+
+        :param events: События в порядке появления.
+        """
+
+    def close(self) -> None:
+        """Освобождение ресурсов приемника"""
+
+
+class StreamSink(Sink):
+    """Вывод сообщений в текстовый поток, например, sys.stdout"""
+
+    def __init__(self, stream: TextIO) -> None:
+        """
+        Инициализатор класса.
+
+        :param stream: Поток для вывода сообщений.
+        """
+
+        self.__stream = stream
+
+    def write(self, events: List[InformerEvent]) -> None:
+        self.__stream.write(
+            ''.join(f'{event.format()}\n' for event in events)
+        )
+        self.__stream.flush()
+
+
+class FileSink(StreamSink):
+    """Вывод сообщений в текстовый файл"""
+
+    def __init__(self, file_name: str) -> None:
+        """
+        Инициализатор класса.
+
+        :param file_name: Имя файла для логирования.
+        """
+
+        self.__file = open(file_name, 'a', encoding='utf-8')
+        super().__init__(self.__file)
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class JsonLinesSink(Sink):
+    """
+    Вывод сообщений в файл JSON-lines.
+
+    Каждое событие записывается отдельной строкой со всеми полями, чтобы
+    журнал можно было разбирать программно.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        """
+        Инициализатор класса.
+
+        :param file_name: Имя файла для логирования.
+        """
+
+        self.__file = open(file_name, 'a', encoding='utf-8')
+
+    def write(self, events: List[InformerEvent]) -> None:
+        for event in events:
+            self.__file.write(json.dumps({
+                'timestamp': event.timestamp.isoformat(),
+                'level': event.level.name,
+                'msg': event.msg,
+                'phase': event.phase,
+                'target': event.target,
+                'duration': event.duration,
+            }, ensure_ascii=False))
+            self.__file.write('\n')
+        self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class CallbackSink(Sink):
+    """
+    Передача сообщений функции, например, для вывода в интерфейс.
+
+    Функция вызывается из потока вывода информера один раз на пачку и
+    получает уже отформатированные строки. Интерфейс должен сам передать
+    их в свой поток.
+    """
+
+    def __init__(self, callback: Callable[[List[str]], None]) -> None:
+        """
+        Инициализатор класса.
+
+        :param callback: Функция, принимающая строки сообщений.
+        """
+
+        self.__callback = callback
+
+    def write(self, events: List[InformerEvent]) -> None:
+        self.__callback([event.format() for event in events])
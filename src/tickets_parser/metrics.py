@@ -0,0 +1,387 @@
+import json
+import time
+import bisect
+import functools
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+# Границы корзин гистограмм по умолчанию, в секундах.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0)
+# Префикс имен метрик в формате Prometheus.
+METRIC_PREFIX = 'colosseum_bot_'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Гистограмма значений с фиксированными корзинами.
+
+    Хранит только счетчики корзин, сумму и максимум, поэтому память не
+    растет со временем работы бота.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        Инициализатор класса.
+
+        :param buckets: Верхние границы корзин по возрастанию.
+        """
+
+        self.__bounds = list(buckets)
+        # Последняя корзина - значения больше всех границ.
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__count = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Учет значения.
+
+        :param value: Значение.
+        """
+
+        self.__counts[bisect.bisect_left(self.__bounds, value)] += 1
+        self.__count += 1
+        self.__sum += value
+        self.__max = max(self.__max, value)
+
+    @property
+    def count(self) -> int:
+        """Количество значений"""
+
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        """Сумма значений"""
+
+        return self.__sum
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        Накопленные счетчики корзин.
+
+        :return: Пары "верхняя граница - количество значений не больше ее".
+        """
+
+        result = []
+        total = 0
+        for bound, count in zip(self.__bounds + [float('inf')],
+                                self.__counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля по корзинам.
+
+        :param q: Квантиль от 0 до 1.
+        :return: Верхняя граница корзины, в которую попадает квантиль.
+        """
+
+        if not self.__count:
+            return 0.0
+
+        rank = q * self.__count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.__max)
+
+        return self.__max
+
+    def summary(self) -> Dict[str, float]:
+        """Сводка: количество, сумма, среднее, медиана, p95 и максимум"""
+
+        return {
+            'count': self.__count,
+            'sum': self.__sum,
+            'avg': self.__sum / self.__count if self.__count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.__max,
+        }
+
+
+class MetricsRegistry:
+    """
+    Хранилище метрик бота.
+
+    Гистограммы длительностей и счетчики событий с метками. Потокобезопасно:
+    метрики пишутся из потоков планировщика, пула драйверов и капчи.
+    """
+
+    def __init__(self) -> None:
+        """Инициализатор класса"""
+
+        self.__lock = threading.Lock()
+        self.__histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.__counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Учет значения в гистограмме.
+
+        :param name: Имя гистограммы.
+        :param value: Значение.
+        :param labels: Метки значения.
+        """
+
+        key = self._labels(labels)
+        with self.__lock:
+            series = self.__histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Увеличение счетчика.
+
+        :param name: Имя счетчика.
+        :param amount: На сколько увеличить.
+        :param labels: Метки счетчика.
+        """
+
+        key = self._labels(labels)
+        with self.__lock:
+            series = self.__counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Все метрики в виде словаря для JSON.
+
+        :return: Словарь "имя - список рядов с метками и значениями".
+        """
+
+        with self.__lock:
+            return {
+                'histograms': {
+                    name: [{'labels': dict(key), **histogram.summary()}
+                           for key, histogram in series.items()]
+                    for name, series in self.__histograms.items()
+                },
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value}
+                           for key, value in series.items()]
+                    for name, series in self.__counters.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus.
+
+        :return: Текст для ответа на запрос /metrics.
+        """
+
+        lines: List[str] = []
+        with self.__lock:
+            for name, series in sorted(self.__counters.items()):
+                full_name = f'{METRIC_PREFIX}{name}_total'
+                lines.append(f'# TYPE {full_name} counter')
+                for key, value in series.items():
+                    lines.append(f'{full_name}{self._format(key)} {value}')
+
+            for name, series in sorted(self.__histograms.items()):
+                full_name = f'{METRIC_PREFIX}{name}'
+                lines.append(f'# TYPE {full_name} histogram')
+                for key, histogram in series.items():
+                    for bound, total in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else f'{bound}'
+                        lines.append(
+                            f'{full_name}_bucket'
+                            f'{self._format(key + (("le", le),))} {total}'
+                        )
+                    lines.append(f'{full_name}_sum{self._format(key)} '
+                                 f'{histogram.sum}')
+                    lines.append(f'{full_name}_count{self._format(key)} '
+                                 f'{histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        """Сброс всех метрик"""
+
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        """Приведение меток к ключу словаря"""
+
+        return tuple(sorted((name, str(value))
+                            for name, value in labels.items()))
+
+    @staticmethod
+    def _format(key: Labels) -> str:
+        """Метки в формате Prometheus"""
+
+        if not key:
+            return ''
+
+        parts = []
+        for name, value in key:
+            value = value.replace('\\', '\\\\').replace('"', '\\"')
+            parts.append(f'{name}="{value}"')
+
+        return '{' + ','.join(parts) + '}'
+
+
+# Общие метрики бота.
+metrics = MetricsRegistry()
+
+
+def timed(phase: str) -> Callable[[Callable], Callable]:
+    """
+    Декоратор замера длительности вызова функции.
+
+    Длительность учитывается в гистограмме phase_seconds с меткой этапа,
+    в том числе, если функция завершилась исключением.
+
+    :param phase: Название этапа.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe('phase_seconds',
+                                time.perf_counter() - started, phase=phase)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsServer:
+    """
+    Локальный HTTP-сервер метрик.
+
+    Отдает метрики в формате Prometheus по адресу /metrics и в формате JSON
+    по адресу /metrics.json. Работает в фоновом потоке.
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics, *,
+                 host: str = '127.0.0.1',
+                 port: int = 9105) -> None:
+        """
+        Инициализатор класса.
+
+        :param registry: Хранилище метрик.
+        :param host: Адрес, на котором слушает сервер.
+        :param port: Порт сервера.
+        """
+
+        self.__registry = registry
+        self.__host = host
+        self.__port = port
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запуск сервера.
+
+        :raises OSError: Если порт занят.
+        """
+
+        registry = self.__registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == '/metrics':
+                    body = registry.render_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(registry.to_dict(),
+                                      ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Запросы к метрикам не логируются.
+                pass
+
+        self.__server = ThreadingHTTPServer((self.__host, self.__port),
+                                            Handler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, name='metrics-server',
+            daemon=True,
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Остановка сервера"""
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+        if self.__thread is not None:
+            self.__thread.join(timeout=5)
+            self.__thread = None
+
+
+class TraceExporter:
+    """
+    Запись трасс прогонов в файл JSON-lines.
+
+    Каждая строка - один прогон сканирования или сбора билетов с
+    длительностями всех этапов, чтобы по истории было видно, когда
+    выросло время до корзины.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        """
+        Инициализатор класса.
+
+        :param file_name: Имя файла трасс.
+        """
+
+        self.__file_name = file_name
+        self.__lock = threading.Lock()
+
+    def export(self, trace: Dict[str, Any]) -> None:
+        """
+        Запись трассы.
+
+        :param trace: Трасса прогона.
+        """
+
+        line = json.dumps(trace, ensure_ascii=False)
+        with self.__lock:
+            with open(self.__file_name, 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
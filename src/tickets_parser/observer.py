@@ -1,92 +1,220 @@
 import time
-import random
+import sqlite3
+import threading
 import datetime as dt
-from typing import Optional
-from PyQt5.QtWidgets import QMessageBox
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 from apscheduler.job import Job
 from apscheduler.schedulers.background import BackgroundScheduler
+import requests
+from decouple import (
+    config,
+    UndefinedValueError,
+)
 from selenium import webdriver
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
 
 from .datetime_checker import DateTimeChecker
-from .ticket_collector import TicketCollector
 from .informer import Informer
+from .http_probe import HttpProbe
+from .driver_resolver import (
+    DriverResolver,
+    DriverResolveError,
+)
+from .driver_pool import (
+    DriverPool,
+    DriverStartError,
+    open_page,
+)
+from .checkout import (
+    CheckoutCoordinator,
+    CheckoutSession,
+)
+from .browser_profile import (
+    BrowserProfile,
+    get_profile,
+)
+from .target import (
+    ObservedTarget,
+    group_by_page,
+)
+from .availability import (
+    AvailabilityChange,
+    AvailabilitySnapshot,
+)
+from .time_index import TimePageIndex
+from .session_store import SessionStore
+from .site_profile import site
+from .history import (
+    AvailabilityHistory,
+    Observation,
+)
+from .phase_timer import PhaseTimer
+from .calendar_navigator import CalendarNavigator
+from .captcha import (
+    CaptchaService,
+    TwoCaptchaSolver,
+)
+from .captcha_token_pool import CaptchaTokenPool
+from .metrics import (
+    MetricsServer,
+    TraceExporter,
+    metrics,
+)
+from .scan_scheduler import (
+    BackoffPolicy,
+    FixedRatePolicy,
+    PageRotation,
+    ReleaseWindow,
+    ReleaseWindowPolicy,
+    ScanOutcome,
+    ScanReport,
+    ScanScheduler,
+    parse_release_windows,
+)
+from .supervisor import (
+    FailureKind,
+    ScanCancelled,
+    ScanSupervisor,
+    Watchdog,
+    classify,
+    describe,
+)
 
 
 class Observer:
     """
     Класс для мониторинга даты и времени.
 
-    Мониторит указанную дату и время и, если дата и время доступны,
-    сообщает об этом парсеру билетов.
+    Мониторит указанные слоты (дату и время) и, если слоты доступны,
+    сообщает об этом парсеру билетов. Все слоты одного месяца проверяются
+    за одну загрузку календаря. Слоты нескольких страниц продуктов
+    наблюдаются с общими пулом браузеров, планировщиком, пулом капчи и
+    бюджетом сканирований: страницы сканируются параллельно, но не больше
+    заданного количества за раз, и по очереди.
     """
 
     def __init__(self,
                  url: Optional[str] = None,
-                 observer_date: Optional[dt.date] = None,
-                 observer_time: Optional[dt.time] = None,
-                 count_tickets: int = 1,
-                 max_tickets: bool = False,
+                 targets: Optional[List[ObservedTarget]] = None,
                  auto_captcha: bool = False,
-                 informer: Optional[Informer] = None) -> None:
+                 informer: Optional[Informer] = None,
+                 probe_mode: bool = False,
+                 headless: Optional[bool] = None) -> None:
         """
         Инициализатор класса.
 
-        :param url: URL-адрес наблюдаемой страницы.
-        :param observer_date: Наблюдаемая дата.
-        :param observer_time: Наблюдаемое время.
-        :param count_tickets:
-            Количество билетов, которые необходимо добавить в корзину.
-        :param max_tickets: Брать ли все доступные билеты, которые есть.
+        :param url:
+            URL-адрес наблюдаемой страницы. Слоты других страниц
+            продуктов задают страницу сами.
+        :param targets:
+            Наблюдаемые слоты с количеством билетов и приоритетом каждого.
         :param auto_captcha: Автообход капчи.
         :param informer: Объект информера для отслеживания состояния бота.
+        :param probe_mode:
+            Проверять билеты легковесными HTTP-запросами и открывать
+            браузер только при обнаружении билетов.
+        :param headless:
+            Запускать браузеры без окна. None - сканирующие браузеры
+            по профилю сканирования, браузеры для сбора билетов по
+            настройке HEADLESS.
         """
 
         # Параметры наблюдателя.
         self.__url = url
-        self.__observed_date = observer_date
-        self.__observed_time = observer_time
-        self.__count_tickets = count_tickets
-        self.__max_tickets = max_tickets
+        self.__targets = list(targets or [])
         self.__auto_captcha = auto_captcha
+        self.__probe_mode = probe_mode
+        self.__headless = headless
 
         # Системные параметры наблюдателя.
         self.__scheduler: Optional[BackgroundScheduler] = None
         self.__current_job: Optional[Job] = None
         self.__worked = False
-        self.__driver: Optional[webdriver.Chrome] = None
+        # Наблюдатель запущен и держит ресурсы, которые освобождает stop().
+        # После неустранимой ошибки self.__worked сбрасывается сразу, а
+        # ресурсы остаются до вызова stop().
+        self.__running = False
+        self.__stop_lock = threading.Lock()
+        self.__driver_pool: Optional[DriverPool] = None
+        self.__checkout_pool: Optional[DriverPool] = None
+        self.__checkout_profile: Optional[BrowserProfile] = None
+        self.__checkout: Optional[CheckoutCoordinator] = None
+        self.__probe: Optional[HttpProbe] = None
+        self.__captcha_service: Optional[CaptchaService] = None
+        # Токен рекапчи решается для адреса конкретной страницы, поэтому
+        # у каждой страницы продукта свой пул готовых решений.
+        self.__captcha_pools: Dict[str, CaptchaTokenPool] = {}
+        self.__captcha_pools_lock = threading.Lock()
+        self.__captcha_pool_size = 0
+        self.__captcha_presolve = True
+        self.__site_key: Optional[str] = None
+        self.__metrics_server: Optional[MetricsServer] = None
+        self.__trace_exporter: Optional[TraceExporter] = None
+        self.__targets_lock = threading.Lock()
+        # Цепочка сканирований остановлена, т.к. все билеты собраны.
+        self.__idle = False
+        # Состояние страниц продуктов между сканированиями.
+        self.__pages: Dict[str, _PageState] = {}
+        self.__pages_lock = threading.Lock()
+        self.__availability_diff = False
+        self.__page_rotation: Optional[PageRotation] = None
+        self.__page_workers = 1
+        self.__session_store: Optional[SessionStore] = None
+        self.__history: Optional[AvailabilityHistory] = None
+        self.__learned_at: Optional[dt.datetime] = None
+        self.__pruned_at: Optional[dt.datetime] = None
+        self.__release_policy: Optional[ReleaseWindowPolicy] = None
+        # Окна появления билетов из настроек.
+        self.__release_windows: List[ReleaseWindow] = []
+        self.__supervisor: Optional[ScanSupervisor] = None
+        self.__watchdog: Optional[Watchdog] = None
+        # Браузеры, в которых сейчас идет сканирование.
+        self.__active_drivers: List[webdriver.Chrome] = []
+        self.__active_lock = threading.Lock()
+        # Планировщик создается при запуске: настройки окон появления
+        # билетов могут оказаться неверными.
+        self.__scan_scheduler: Optional[ScanScheduler] = None
         self.__informer = informer
 
     def set_params(self, url: str,
-                   observer_date: dt.date,
-                   observer_time: dt.time,
-                   count_tickets: int = 1,
-                   max_tickets: bool = False,
+                   targets: List[ObservedTarget],
                    auto_captcha: bool = False,
-                   informer: Optional[Informer] = None) -> None:
+                   informer: Optional[Informer] = None,
+                   probe_mode: bool = False,
+                   headless: Optional[bool] = None) -> None:
         """
         Установка параметров для наблюдателя.
 
         :param url: URL-адрес наблюдаемой страницы.
-        :param observer_date: Наблюдаемая дата.
-        :param observer_time: Наблюдаемое время.
-        :param count_tickets:
-            Количество билетов, которые необходимо добавить в корзину.
-        :param max_tickets: Брать ли все доступные билеты, которые есть.
+        :param targets:
+            Наблюдаемые слоты с количеством билетов и приоритетом каждого.
         :param auto_captcha: Автообход капчи.
         :param informer: Объект информера для отслеживания состояния бота.
+        :param probe_mode:
+            Проверять билеты легковесными HTTP-запросами и открывать
+            браузер только при обнаружении билетов.
+        :param headless:
+            Запускать браузеры без окна. None - сканирующие браузеры
+            по профилю сканирования, браузеры для сбора билетов по
+            настройке HEADLESS.
         """
 
         self.__url = url
-        self.__observed_date = observer_date
-        self.__observed_time = observer_time
-        self.__count_tickets = count_tickets
-        self.__max_tickets = max_tickets
+        self.__targets = list(targets or [])
         self.__auto_captcha = auto_captcha
         self.__informer = informer
+        self.__probe_mode = probe_mode
+        self.__headless = headless
 
     @property
     def worked(self) -> bool:
@@ -94,81 +222,457 @@ class Observer:
 
         return self.__worked
 
+    @property
+    def targets(self) -> List[ObservedTarget]:
+        """Слоты, билеты на которые еще не собраны"""
+
+        with self.__targets_lock:
+            return list(self.__targets)
+
+    def add_targets(self, targets: Iterable[ObservedTarget]) -> None:
+        """
+        Добавление слотов в работающий наблюдатель.
+
+        Новые слоты проверяются со следующего сканирования теми же
+        браузерами и планировщиком. Если все прежние слоты уже собраны,
+        сканирование возобновляется.
+
+        :param targets: Новые слоты.
+        """
+
+        with self.__targets_lock:
+            for target in targets:
+                if target not in self.__targets:
+                    self.__targets.append(target)
+            restart = self.__worked and self.__idle and bool(self.__targets)
+            if restart:
+                self.__idle = False
+
+        if restart:
+            self._add_check_task()
+
     def start(self) -> None:
         """
         Запуск наблюдения за датой и временем.
 
-        Инициализирует веб-драйвер, добавляет в планировщик задачу на
-        мониторинг доступных билетов, запускает планировщик.
+        Запускает пул прогретых веб-драйверов, добавляет в планировщик
+        задачу на мониторинг доступных билетов, запускает планировщик.
         """
 
         # Запускаем наблюдатель только в том случае, если все параметры
         # заданы верно и наблюдатель уже не запущен.
-        if not self.__worked and self._check_params():
+        if not self.__running and self._check_params():
             self.__informer.push_message(
                 'Запуск бота...',
                 Informer.MessageLevel.INFO,
             )
 
+            started = time.perf_counter()
+
+            # Все настройки читаются и проверяются до запуска браузеров,
+            # чтобы ошибка в них не оставила запущенные браузеры.
+            try:
+                # Путь к chromedriver берется из настроек или кэша, чтобы не
+                # обращаться к сети при каждом запуске.
+                resolver = DriverResolver(
+                    pinned_path=config('CHROMEDRIVER_PATH', default=None),
+                    offline=config('DRIVER_OFFLINE', default=False,
+                                   cast=bool),
+                    informer=self.__informer,
+                )
+                max_uses = config('DRIVER_MAX_USES', default=50, cast=int)
+                max_memory_mb = config('DRIVER_MAX_MEMORY_MB', default=512,
+                                       cast=int)
+                page_load_timeout = config('PAGE_LOAD_TIMEOUT', default=60.0,
+                                           cast=float)
+                start_attempts = config('DRIVER_START_ATTEMPTS', default=3,
+                                        cast=int)
+                pool_size = config('DRIVER_POOL_SIZE', default=1, cast=int)
+                checkout_pool_size = config('CHECKOUT_POOL_SIZE', default=1,
+                                            cast=int)
+                session_file = config('SESSION_FILE',
+                                      default='session_state.json')
+                session_max_age = config('SESSION_MAX_AGE', default=12.0,
+                                         cast=float) * 3600
+                availability_diff = config('AVAILABILITY_DIFF', default=True,
+                                           cast=bool)
+                pages_per_run = config('SCAN_PAGES_PER_RUN', default=0,
+                                       cast=int)
+                page_workers = config('SCAN_PAGE_WORKERS', default=pool_size,
+                                      cast=int)
+                if self.__probe_mode:
+                    calendar_url = config('PROBE_CALENDAR_URL')
+                    performances_url = config('PROBE_PERFORMANCES_URL')
+                if self.__auto_captcha:
+                    api_key = config('API_KEY')
+                    captcha_service_url = config(
+                        'CAPTCHA_SERVICE_URL', default='http://2captcha.com',
+                    )
+                    captcha_deadline = config('CAPTCHA_DEADLINE',
+                                              default=180.0, cast=float)
+                    captcha_pool_size = config('CAPTCHA_POOL_SIZE', default=0,
+                                               cast=int)
+                    captcha_presolve = config('CAPTCHA_PRESOLVE',
+                                              default=True, cast=bool)
+                    site_key = config('DATA_SITE_KEY')
+                metrics_port = config('METRICS_PORT', default=0, cast=int)
+                trace_file = config('TRACE_FILE', default=None)
+                checkout_sessions = config('CHECKOUT_SESSIONS', default=1,
+                                           cast=int)
+                cart_limit = config('CART_LIMIT', default=0, cast=int)
+                history_db = config('HISTORY_DB', default='history.sqlite3')
+                scan_deadline = config('SCAN_DEADLINE', default=300.0,
+                                       cast=float)
+                scan_retries = config('SCAN_RETRIES', default=2, cast=int)
+                retry_backoff = config('SCAN_RETRY_BACKOFF', default=5.0,
+                                       cast=float)
+                retry_backoff_max = config('SCAN_RETRY_BACKOFF_MAX',
+                                           default=60.0, cast=float)
+
+                driver_path = resolver.resolve()
+                scan_profile, checkout_profile = self._create_profiles()
+                self.__scan_scheduler = self._create_scan_scheduler()
+                # Селекторы сайта можно поправить в файле, не меняя код.
+                site_profile = config('SITE_PROFILE', default=None)
+                if site_profile:
+                    site.load(site_profile)
+            except (DriverResolveError, UndefinedValueError, ValueError,
+                    OSError) as e:
+                self.__informer.push_message(
+                    f'Ошибка запуска бота: {e}',
+                    Informer.MessageLevel.ERROR,
+                )
+                return
+
             self.__worked = True
+            self.__running = True
+
+            # Браузеры запускаются заранее, чтобы между обнаружением
+            # билетов и открытием модального окна не было холодного старта.
+            # Сканируют облегченные браузеры, а билеты собираются в
+            # браузере с полным профилем.
+            # Куки и localStorage сайта сохраняются после первого прогрева,
+            # и следующие браузеры и HTTP-сессии запускаются уже с ними.
+            self.__session_store = SessionStore(
+                session_file or None,
+                max_age=session_max_age,
+                informer=self.__informer,
+            )
+            self.__driver_pool = DriverPool(
+                url=self.__url,
+                driver_path=driver_path,
+                size=pool_size,
+                max_uses=max_uses,
+                max_memory_mb=max_memory_mb,
+                page_load_timeout=page_load_timeout,
+                profile=scan_profile,
+                session_store=self.__session_store,
+                start_attempts=start_attempts,
+                informer=self.__informer,
+            )
+            # Если браузеры не запускаются, бот не запускается, а не ждет
+            # их бесконечно.
+            try:
+                self.__driver_pool.start()
+            except DriverStartError as e:
+                self._abort_start(e)
+                return
+            self.__checkout_profile = checkout_profile
+
+            # Состояние доступности хранится между сканированиями:
+            # неизменившиеся фрагменты страницы не разбираются заново, а об
+            # изменениях доступности сообщается в лог. Страницы списка
+            # сеансов запоминаются, чтобы при следующем сканировании сразу
+            # открывать страницу с нужным временем. Состояние у каждой
+            # страницы продукта свое.
+            self.__availability_diff = availability_diff
+            self.__pages = {}
+            main_page = self._page_state(self.__url)
+
+            # Страницы продуктов сканируются параллельно браузерами общего
+            # пула. Если страниц много, за одно сканирование проверяются
+            # те, что дольше всех ждали очереди.
+            self.__page_rotation = PageRotation(limit=pages_per_run)
+            self.__page_workers = max(1, page_workers)
+            self.__idle = False
+
+            # Режим окна задается при запуске браузера. Если браузер для
+            # сбора билетов должен быть с окном, а сканирующий - без, для
+            # сбора держатся отдельные прогретые браузеры. Иначе профиль
+            # сканирующего браузера переключается перед сбором.
+            if checkout_profile.headless != scan_profile.headless:
+                self.__checkout_pool = DriverPool(
+                    url=self.__url,
+                    driver_path=driver_path,
+                    size=checkout_pool_size,
+                    max_uses=max_uses,
+                    max_memory_mb=max_memory_mb,
+                    page_load_timeout=page_load_timeout,
+                    profile=checkout_profile,
+                    start_attempts=start_attempts,
+                    informer=self.__informer,
+                )
+                try:
+                    self.__checkout_pool.start()
+                except DriverStartError as e:
+                    self._abort_start(e)
+                    return
 
-            # Устанавливаем окно барузера на весь экран.
-            chrome_options = webdriver.ChromeOptions()
-            chrome_options.add_argument("--start-maximized")
-            self.__driver = webdriver.Chrome(
-                ChromeDriverManager().install(),
-                options=chrome_options,
+            # В режиме HTTP-проверки календарь и список сеансов запрашиваются
+            # напрямую, а браузер используется только для сбора билетов.
+            if self.__probe_mode:
+                self.__probe = HttpProbe(
+                    calendar_url=calendar_url,
+                    performances_url=performances_url,
+                    snapshot=main_page.snapshot,
+                )
+                self.__session_store.apply(self.__probe.session)
+
+            # Капча решается в фоне, поэтому сервис запускается заранее.
+            if self.__auto_captcha:
+                self.__captcha_service = CaptchaService(
+                    TwoCaptchaSolver(
+                        api_key=api_key,
+                        base_url=captcha_service_url,
+                    ),
+                    deadline=captcha_deadline,
+                    informer=self.__informer,
+                )
+
+                self.__site_key = site_key
+                self.__captcha_presolve = captcha_presolve
+                self.__captcha_pool_size = captcha_pool_size
+                # Пулы держат наготове решенные капчи, чтобы при сборе
+                # билетов не ждать решения. Пулы страниц, добавленных
+                # позже, создаются при первом сборе на них.
+                for target in self.targets:
+                    self._captcha_pool(target.page or self.__url)
+
+            # Метрики этапов доступны по HTTP, если задан порт, а трассы
+            # прогонов пишутся в файл, если он задан.
+            if metrics_port > 0:
+                self.__metrics_server = MetricsServer(port=metrics_port)
+                try:
+                    self.__metrics_server.start()
+                except OSError as e:
+                    self.__informer.push_message(
+                        f'Ошибка запуска сервера метрик: {e}',
+                        Informer.MessageLevel.ERROR,
+                    )
+                    self.__metrics_server = None
+            if trace_file:
+                self.__trace_exporter = TraceExporter(trace_file)
+
+            # Сбор билетов на найденный слот идет сразу в нескольких
+            # браузерах. Дополнительные браузеры берутся из пула сбора,
+            # а если его нет - из пула сканирования.
+            self.__checkout = CheckoutCoordinator(
+                pool=self.__checkout_pool or self.__driver_pool,
+                url=self.__url,
+                sessions=checkout_sessions,
+                cart_limit=cart_limit,
+                profile=checkout_profile,
+                auto_captcha=self.__auto_captcha,
+                captcha_service=self.__captcha_service,
+                captcha_token=self._captcha_token,
+                time_index=main_page.time_index,
+                session_store=self.__session_store,
+                informer=self.__informer,
             )
 
+            # Наблюдения пишутся в историю, а по истории определяется,
+            # когда обычно появляются билеты.
+            if history_db:
+                try:
+                    self.__history = AvailabilityHistory(history_db)
+                except sqlite3.Error as e:
+                    self.__informer.push_message(
+                        f'Ошибка открытия истории наблюдений: {e}',
+                        Informer.MessageLevel.ERROR,
+                    )
+
+            # Каждое сканирование идет со сроком, сбои повторяются, а
+            # сторож перезапускает цепочку сканирований, если она прервалась.
+            self.__supervisor = ScanSupervisor(
+                deadline=scan_deadline,
+                retries=scan_retries,
+                backoff=retry_backoff,
+                max_backoff=retry_backoff_max,
+                on_hung=self._discard_active_drivers,
+                informer=self.__informer,
+            )
+            self.__watchdog = Watchdog(on_stall=self._restart_scan,
+                                       informer=self.__informer)
+
+            self._prune_history()
+            self._learn_release_windows()
             self.__scheduler = BackgroundScheduler()
             self._add_check_task()
             self.__scheduler.start()
+            self.__watchdog.start()
 
+            elapsed_ms = (time.perf_counter() - started) * 1000
             self.__informer.push_message(
-                'Бот запущен',
+                f'Бот запущен за {elapsed_ms:.0f} мс',
                 Informer.MessageLevel.INFO,
             )
-        else:
-            print('Ошибка. Необходимо настроить все параметры: URL-адрес '
-                  'страницы, наблюдаемые дату и время.')
+        elif not self.__running:
+            self.__informer.push_message(
+                'Ошибка. Необходимо настроить все параметры: URL-адрес '
+                'страницы, наблюдаемые дату и время.',
+                Informer.MessageLevel.ERROR,
+            )
 
     def stop(self) -> None:
         """
         Остановка наблюдателя.
 
-        Закрывает веб-драйвер, выключает планировщик задач.
+        Прерывает текущее сканирование, выключает планировщик задач и
+        закрывает все браузеры пулов, в том числе занятые сканированием.
+        Вызывать можно повторно и из нескольких потоков: повторный вызов
+        дожидается завершения первого и ничего не делает.
         """
 
-        self.__informer.push_message(
-            'Остановка бота...',
-            Informer.MessageLevel.INFO,
-        )
+        with self.__stop_lock:
+            if not self.__running:
+                return
+
+            self.__informer.push_message(
+                'Остановка бота...',
+                Informer.MessageLevel.INFO,
+            )
 
-        if self.__worked:
             self.__worked = False
-            self.__scheduler.shutdown()
+            # Повторы сканирования прекращаются, чтобы планировщик не ждал
+            # их при выключении.
+            if self.__watchdog is not None:
+                self.__watchdog.stop()
+            if self.__supervisor is not None:
+                self.__supervisor.stop()
+            if self.__scheduler is not None:
+                self.__scheduler.shutdown()
             self.__scheduler = None
+            self.__watchdog = None
+            self.__supervisor = None
 
-            # Пользователь может сначала закрыть окно браузера, а затем
-            # нажать на кнопку "Стоп", что вызовет ошибку.
-            # Исключим такое поведение.
-            try:
-                self.__driver.close()
-            except WebDriverException as e:
-                print(e)
+            latency = self.__scan_scheduler.detection_latency
+            if latency['count']:
+                self.__informer.push_message(
+                    f'Задержка обнаружения билетов: в среднем '
+                    f'{latency["avg"]:.0f} с, максимум {latency["max"]:.0f} с',
+                    Informer.MessageLevel.INFO,
+                )
+
+            snapshots = [page.snapshot for page in self.__pages.values()
+                         if page.snapshot is not None]
+            if snapshots:
+                hits = sum(snapshot.stats['hits'] for snapshot in snapshots)
+                misses = sum(snapshot.stats['misses']
+                             for snapshot in snapshots)
+                self.__informer.push_message(
+                    f'Фрагменты страницы без изменений: {hits} из '
+                    f'{hits + misses}',
+                    Informer.MessageLevel.INFO,
+                )
+            self.__pages = {}
+            self.__page_rotation = None
+            self.__session_store = None
+
+            if self.__history is not None:
+                self.__history.close()
+                self.__history = None
+            self.__learned_at = None
+            self.__pruned_at = None
+
+            self.__checkout = None
+            self.__driver_pool.close()
+            self.__driver_pool = None
+
+            if self.__checkout_pool is not None:
+                self.__checkout_pool.close()
+                self.__checkout_pool = None
 
-            self.__driver = None
+            if self.__probe is not None:
+                self.__probe.close()
+                self.__probe = None
+
+            with self.__captcha_pools_lock:
+                captcha_pools = self.__captcha_pools
+                self.__captcha_pools = {}
+            for page_url, captcha_pool in captcha_pools.items():
+                captcha_pool.stop()
+                self.__informer.push_message(
+                    f'Пул капч {page_url}: {captcha_pool.metrics}',
+                    Informer.MessageLevel.INFO,
+                )
+
+            if self.__captcha_service is not None:
+                self.__captcha_service.shutdown()
+                self.__captcha_service = None
+
+            if self.__metrics_server is not None:
+                self.__metrics_server.stop()
+                self.__metrics_server = None
+            self.__trace_exporter = None
+            self.__running = False
+
+            self.__informer.push_message(
+                'Бот остановлен',
+                Informer.MessageLevel.INFO,
+            )
+
+    def _abort_start(self, error: Exception) -> None:
+        """
+        Отмена запуска, если браузеры не запустились.
+
+        :param error: Ошибка запуска.
+        """
 
         self.__informer.push_message(
-            'Бот остановлен',
-            Informer.MessageLevel.INFO,
+            f'Ошибка запуска бота: {error}',
+            Informer.MessageLevel.ERROR,
         )
+        for pool in (self.__driver_pool, self.__checkout_pool):
+            if pool is not None:
+                pool.close()
+        self.__driver_pool = None
+        self.__checkout_pool = None
+        self.__session_store = None
+        self.__pages = {}
+        self.__page_rotation = None
+        self.__worked = False
+        self.__running = False
+
+    def _create_profiles(self) -> Tuple[BrowserProfile, BrowserProfile]:
+        """
+        Создание профилей браузеров для сканирования и сбора билетов.
+
+        :return: Профиль сканирования и профиль сбора билетов.
+        :raises ValueError: Если в настройках указан неизвестный профиль.
+        """
+
+        extra_blocked_urls = tuple(
+            pattern.strip()
+            for pattern in config('SCAN_BLOCKED_URLS', default='').split(',')
+            if pattern.strip()
+        )
+        scan_profile = get_profile(
+            config('SCAN_PROFILE', default='scan'),
+            headless=self.__headless,
+            extra_blocked_urls=extra_blocked_urls,
+        )
+        checkout_profile = get_profile(
+            config('CHECKOUT_PROFILE', default='full'),
+            headless=self.__headless if self.__headless is not None
+            else config('HEADLESS', default=False, cast=bool),
+        )
+
+        return scan_profile, checkout_profile
 
     def _check_params(self) -> bool:
         """Проверка параметров наблюдателя"""
 
-        return self.__url is not None and self.__observed_date is not None \
-               and self.__observed_time is not None
+        return self.__url is not None and len(self.__targets) > 0
 
     def _check_allowed_tickets(self) -> None:
         """Проверка доступных билетов на странице"""
@@ -176,81 +680,649 @@ class Observer:
         # Если наблюдатель в активном режиме, парсим доступные билеты.
         # Если нет, работающая задача выполнится, и больше задач на парсинг
         # поступать не будет.
-        if self.__worked:
-            # Открытие указанной страницы.
-            self.__driver.get(self.__url)
+        # Наблюдатель могут остановить из другого потока в любой момент,
+        # поэтому объекты берутся один раз и проверяются.
+        supervisor = self.__supervisor
+        watchdog = self.__watchdog
+        page_rotation = self.__page_rotation
+        if self.__worked and supervisor is not None \
+                and watchdog is not None and page_rotation is not None:
+            self._prune_history()
+            self._learn_release_windows()
 
-            # Плашка с куки мешается при взаимодействии с элементами страницы.
-            # Попытаемся закрыть ее, если она есть.
-            try:
-                self._close_cookie_card()
-            except Exception:
-                pass
-
-            # Создаем чекер даты и времени.
-            datetime_checker = DateTimeChecker(
-                driver=self.__driver,
-                observed_date=self.__observed_date,
-                observed_time=self.__observed_time,
-                informer=self.__informer,
+            started = dt.datetime.now()
+            # Бюджет сканирований расходуется только на слоты страниц,
+            # до которых дошла очередь.
+            targets = self.targets
+            pages = page_rotation.select(
+                group_by_page(targets, self.__url), started,
             )
+            due = self.__scan_scheduler.due_targets(
+                [target for target in targets
+                 if (target.page or self.__url) in pages],
+                started,
+            )
+            try:
+                # При повторе не проверяем слоты, билеты на которые уже
+                # собраны в прошлой попытке.
+                outcome = supervisor.run(lambda: self._scan(
+                    [target for target in due if target in self.targets]
+                ))
+            except ScanCancelled:
+                # Бот остановлен во время сканирования. Браузеры
+                # сканирования закроются вместе с пулом.
+                return
+            except Exception as e:
+                outcome = ScanOutcome.ERROR
+                if classify(e) == FailureKind.FATAL:
+                    self.__informer.push_message(
+                        f'Неустранимая ошибка сканирования: {describe(e)}. '
+                        f'Бот останавливается',
+                        Informer.MessageLevel.ERROR,
+                        phase='scan',
+                    )
+                    # Планировщик нельзя выключить из его же задачи, поэтому
+                    # бот только перестает работать, а ресурсы освобождает
+                    # вызвавший start(): он видит, что worked сброшен, и
+                    # сам вызывает stop().
+                    self.__worked = False
+                    return
 
-            # Проверяем, доступны ли дата и время для покупки билетов.
-            # Если дата и время доступны, до возвращается веб-элементы
-            # карточки со временем и кнопкой открытия модального окна для
-            # выбора билетов.
-            # Это необходимо для следующего этапа - добавления билетов в
-            # корзину и обхода капчи.
-            allowed_time_element = datetime_checker.start_check()
-
-            # Если элемент с нужным временем есть, начинаем процесс сбора
-            # билетов в корзину.
-            if allowed_time_element is not None:
-                # Запускаем сборщик билетов в корзину.
-                ticket_collector = TicketCollector(
-                    driver=self.__driver,
-                    time_info=allowed_time_element,
-                    count_tickets=self.__count_tickets,
-                    max_tickets=self.__max_tickets,
-                    auto_captcha=self.__auto_captcha,
-                    informer=self.__informer,
+                self.__informer.push_message(
+                    f'Ошибка сканирования: {describe(e)}',
+                    Informer.MessageLevel.ERROR,
+                    phase='scan',
                 )
-                ticket_collector.start_collect()
+
+            duration = (dt.datetime.now() - started).total_seconds()
+            self.__scan_scheduler.record(ScanReport(
+                started=started,
+                duration=duration,
+                outcome=outcome,
+            ))
+            metrics.observe('scan_seconds', duration,
+                            outcome=outcome.name.lower())
+            metrics.inc('scans', outcome=outcome.name.lower())
+
+            # Если слоты добавят позже, сканирование возобновится.
+            with self.__targets_lock:
+                idle = self.__idle = not self.__targets
+            if idle:
                 self.__informer.push_message(
-                    'Билеты собраны. Чтобы запустить новое сканирование, остановите бота, '
-                    'укажите новые дату и время и нажмите на кнопку "Начать мониторинг"',
+                    'Билеты собраны. Чтобы продолжить сканирование, укажите '
+                    'новые дату и время и нажмите на кнопку "Начать мониторинг"',
                     Informer.MessageLevel.INFO,
                 )
+                watchdog.expect(None)
                 return
-            else:
+
+            # После сканирования, в том числе неудачного, добавляем в
+            # планировщик новую задачу на мониторинг. Цикл повторяется до
+            # тех пор, пока флаг self__worked установлен в True.
+            if self.__worked:
+                self._add_check_task()
+
+    def _scan(self, targets: List[ObservedTarget]) -> ScanOutcome:
+        """
+        Одно сканирование слотов.
+
+        :param targets: Слоты, которые нужно проверить.
+        :return: Итог сканирования.
+        """
+
+        if not targets:
+            return ScanOutcome.NOT_FOUND
+
+        # Сначала проверяем билеты без браузера, если включена
+        # HTTP-проверка. Браузер открывает страницу только при успехе
+        # и проверяет только найденные слоты. Адреса HTTP-проверки заданы
+        # для основной страницы, поэтому слоты других страниц продуктов
+        # сразу проверяются в браузере.
+        candidates = targets
+        if self.__probe is not None:
+            probed = [target for target in targets
+                      if (target.page or self.__url) == self.__url]
+            candidates = self._probe_tickets(probed) if probed else []
+            self._report_not_found(
+                [target for target in probed if target not in candidates]
+            )
+            candidates = candidates + [target for target in targets
+                                       if target not in probed]
+            if not candidates:
+                return ScanOutcome.NOT_FOUND
+
+        # Страницы продуктов проверяются параллельно, каждая в своем
+        # браузере общего пула. Ошибка одной страницы не прерывает
+        # проверку остальных и передается надзору после их завершения.
+        groups = group_by_page(candidates, self.__url)
+        with ThreadPoolExecutor(
+                max_workers=min(self.__page_workers, len(groups)),
+                thread_name_prefix='scan') as executor:
+            futures = [executor.submit(self._scan_page, url, page_targets)
+                       for url, page_targets in groups.items()]
+        found = [future.result() for future in futures]
+
+        return ScanOutcome.FOUND if any(found) else ScanOutcome.NOT_FOUND
+
+    def _scan_page(self, url: str, targets: List[ObservedTarget]) -> bool:
+        """
+        Сканирование слотов одной страницы продукта в браузере.
+
+        :param url: URL-адрес страницы продукта.
+        :param targets: Слоты страницы.
+        :return: True, если хотя бы один слот оказался доступен.
+        """
+
+        # Берем из пула прогретый браузер. Если свободного браузера нет
+        # слишком долго, сканирование повторяется надзором. Ошибки
+        # сканирования разбирает надзор, а неисправный браузер сразу
+        # закрывается, и пул заменяет его новым.
+        with self.__driver_pool.lease(timeout=60) as driver:
+            with self.__active_lock:
+                self.__active_drivers.append(driver)
+            try:
+                return self._check_in_browser(driver, url, targets)
+            except Exception as e:
+                if classify(e) == FailureKind.DRIVER:
+                    self.__driver_pool.discard(driver)
+                raise
+            finally:
+                with self.__active_lock:
+                    if driver in self.__active_drivers:
+                        self.__active_drivers.remove(driver)
+
+    def _check_in_browser(self, driver: webdriver.Chrome,
+                          url: str,
+                          candidates: List[ObservedTarget]) -> bool:
+        """
+        Проверка слотов в браузере и сбор билетов на доступные слоты.
+
+        :param driver: Веб-драйвер, выданный пулом.
+        :param url: URL-адрес страницы продукта.
+        :param candidates: Слоты для проверки.
+        :return: True, если хотя бы один слот оказался доступен.
+        """
+
+        # Замер времени этапов текущего прогона.
+        timer = PhaseTimer()
+        reuse_page = open_page(driver, url, timer)
+        page = self._page_state(url)
+
+        # Создаем чекер даты и времени.
+        datetime_checker = DateTimeChecker(
+            driver=driver,
+            targets=candidates,
+            informer=self.__informer,
+            timer=timer,
+            snapshot=page.snapshot,
+            time_index=page.time_index,
+        )
+
+        # Проверяем, какие слоты доступны для покупки билетов.
+        # Слоты возвращаются в порядке приоритета.
+        # Если сканирование прервалось, состояние календаря неизвестно, и
+        # в следующий раз страница загружается заново.
+        try:
+            allowed_targets = datetime_checker.start_check(reuse_page=reuse_page)
+        except Exception:
+            CalendarNavigator.forget(driver)
+            raise
+        self._record_history(datetime_checker.counts)
+        self._report_not_found(
+            [target for target in candidates
+             if target not in allowed_targets]
+        )
+
+        # Сканирующий браузер с окном сам участвует в сборе билетов: слот
+        # в нем уже найден. Перед сбором снимаем блокировку запросов, чтобы
+        # страница оплаты загрузилась целиком. Браузеры без окна только
+        # сканируют, а билеты собираются в браузерах пула сбора.
+        if allowed_targets:
+            self._begin_checkout(driver)
+        primary: Optional[CheckoutSession] = None
+        if allowed_targets and self.__checkout_pool is None:
+            if self.__checkout_profile != self.__driver_pool.profile:
+                self.__driver_pool.switch_profile(driver,
+                                                  self.__checkout_profile)
+            primary = CheckoutSession(
+                driver=driver,
+                pool=self.__driver_pool,
+                checker=datetime_checker,
+            )
+
+        # Собираем билеты только на доступные слоты. Если сбор не удался,
+        # слот проверяется снова при следующем сканировании.
+        for target in allowed_targets:
+            report = self.__checkout.checkout(target, primary=primary,
+                                              timer=timer,
+                                              time_index=page.time_index)
+            if report.success:
+                with self.__targets_lock:
+                    if target in self.__targets:
+                        self.__targets.remove(target)
+                self.__scan_scheduler.forget(target)
                 self.__informer.push_message(
-                    f'Билеты на {self.__observed_date} {self.__observed_time} '
-                    f'не обнаружены',
+                    f'Билеты на {target} собраны',
                     Informer.MessageLevel.INFO,
+                    phase='collect',
+                    target=target,
                 )
 
-            # После успешного парсинга добавляем в планировщик новую задачу,
-            # на мониторинг. Цикл повторяется до тех пор, пока флаг
-            # self__worked установлен в True.
-            self._add_check_task()
+            # Следующий слот собирается в том же браузере, если он цел.
+            if primary is not None:
+                result = report.session(0)
+                if result is None or not result.reusable:
+                    primary = None
 
-    def _close_cookie_card(self) -> None:
-        """Метод закрытия плашки с куки"""
+        self.__informer.push_message(
+            f'Время этапов: {timer.report()}',
+            Informer.MessageLevel.INFO,
+            phase='scan',
+            duration=timer.total,
+        )
+        if self.__trace_exporter is not None:
+            self.__trace_exporter.export(timer.trace(
+                targets=[str(target) for target in candidates],
+                found=[str(target) for target in allowed_targets],
+            ))
+
+        return len(allowed_targets) > 0
+
+    def _captcha_token(self, page_url: str) -> Optional['Future[str]']:
+        """
+        Запуск решения капчи для одной корзины.
+
+        Капча берется из пула готовых решений страницы, либо начинает
+        решаться сразу, чтобы ее решение шло параллельно с открытием окна
+        и выбором билетов.
+
+        :param page_url: URL-адрес страницы, на которой собираются билеты.
+        :return: Будущее решение капчи, либо None, если решать заранее не нужно.
+        """
+
+        captcha_pool = self._captcha_pool(page_url)
+        if captcha_pool is not None:
+            return captcha_pool.take_future()
+        if self.__captcha_service is not None and self.__captcha_presolve:
+            return self.__captcha_service.solve_async(self.__site_key,
+                                                      page_url)
+
+        return None
+
+    def _captcha_pool(self, page_url: str) -> Optional[CaptchaTokenPool]:
+        """
+        Пул готовых решений капчи для страницы.
+
+        :param page_url: URL-адрес страницы.
+        :return: Запущенный пул, либо None, если пул выключен.
+        """
+
+        captcha_service = self.__captcha_service
+        if captcha_service is None or self.__captcha_pool_size <= 0:
+            return None
+
+        with self.__captcha_pools_lock:
+            # Остановленный бот новых пулов не создает.
+            if not self.__worked:
+                return None
+            captcha_pool = self.__captcha_pools.get(page_url)
+            if captcha_pool is None:
+                captcha_pool = CaptchaTokenPool(
+                    captcha_service,
+                    site_key=self.__site_key,
+                    page_url=page_url,
+                    size=self.__captcha_pool_size,
+                    informer=self.__informer,
+                )
+                captcha_pool.start()
+                self.__captcha_pools[page_url] = captcha_pool
+
+        return captcha_pool
+
+    def _record_history(self, counts: Dict[ObservedTarget, int]) -> None:
+        """
+        Запись наблюдений сканирования в историю.
+
+        :param counts: Количество доступных билетов на проверенные слоты.
+        """
+
+        if self.__history is None or not counts:
+            return
+
+        now = dt.datetime.now()
+        try:
+            self.__history.record(
+                Observation(
+                    observed_at=now,
+                    date=target.observed_date,
+                    time=target.observed_time,
+                    count=count,
+                    page=target.page or self.__url,
+                )
+                for target, count in counts.items()
+            )
+        except sqlite3.Error as e:
+            self.__informer.push_message(
+                f'Ошибка записи истории наблюдений: {e}',
+                Informer.MessageLevel.ERROR,
+            )
+
+    def _prune_history(self) -> None:
+        """
+        Удаление наблюдений старше срока хранения.
+
+        Выполняется не чаще раза в сутки, чтобы база не росла без предела.
+        """
+
+        retention = config('HISTORY_RETENTION_DAYS', default=90, cast=int)
+        if self.__history is None or retention <= 0:
+            return
+
+        now = dt.datetime.now()
+        if self.__pruned_at is not None \
+                and now - self.__pruned_at < dt.timedelta(days=1):
+            return
+        self.__pruned_at = now
+
+        try:
+            removed = self.__history.prune(now - dt.timedelta(days=retention))
+        except sqlite3.Error as e:
+            self.__informer.push_message(
+                f'Ошибка очистки истории наблюдений: {e}',
+                Informer.MessageLevel.ERROR,
+            )
+            return
+
+        if removed:
+            self.__informer.push_message(
+                f'Из истории удалено старых наблюдений: {removed}',
+                Informer.MessageLevel.INFO,
+            )
+
+    def _learn_release_windows(self) -> None:
+        """
+        Обновление окон появления билетов по истории наблюдений.
+
+        Окна пересчитываются не чаще раза в час и добавляются к окнам из
+        настроек.
+        """
+
+        if self.__history is None \
+                or not config('HISTORY_LEARN', default=True, cast=bool):
+            return
+
+        now = dt.datetime.now()
+        if self.__learned_at is not None \
+                and now - self.__learned_at < dt.timedelta(hours=1):
+            return
+        self.__learned_at = now
+
+        # Учитываются только наблюдаемые страницы: в той же базе может
+        # быть история других продуктов.
+        pages = set(group_by_page(self.targets, self.__url))
+        pages.add(self.__url)
+        try:
+            patterns = self.__history.patterns(
+                days=config('HISTORY_DAYS', default=30, cast=int),
+                pages=pages,
+            )
+        except sqlite3.Error as e:
+            self.__informer.push_message(
+                f'Ошибка чтения истории наблюдений: {e}',
+                Informer.MessageLevel.ERROR,
+            )
+            return
+
+        learned = patterns.windows(
+            min_share=config('HISTORY_MIN_SHARE', default=0.1, cast=float),
+        )
+        if not learned:
+            return
+
+        self.__release_policy.set_windows(self.__release_windows + learned)
+        self.__informer.push_message(
+            f'Окна появления билетов по истории: '
+            f'{", ".join(f"{w.start:%H:%M}-{w.end:%H:%M}" for w in learned)}'
+            f' (появлений: {patterns.total})',
+            Informer.MessageLevel.INFO,
+        )
+
+    def _page_state(self, url: str) -> '_PageState':
+        """
+        Состояние страницы продукта между сканированиями.
+
+        :param url: URL-адрес страницы продукта.
+        :return: Состояние страницы. Создается при первом обращении.
+        """
+
+        with self.__pages_lock:
+            page = self.__pages.get(url)
+            if page is None:
+                snapshot = None
+                if self.__availability_diff:
+                    snapshot = AvailabilitySnapshot(
+                        listener=lambda change: self._report_change(change,
+                                                                    url),
+                    )
+                page = _PageState(snapshot=snapshot,
+                                  time_index=TimePageIndex())
+                self.__pages[url] = page
+
+        return page
+
+    def _report_change(self, change: AvailabilityChange,
+                       url: Optional[str] = None) -> None:
+        """
+        Сообщение об изменении доступности между сканированиями.
 
-        self.__driver.find_element(By.CLASS_NAME, 'gdpr_denyClose').click()
+        :param change: Изменение доступности даты или времени.
+        :param url: URL-адрес страницы продукта.
+        """
+
+        place = f' на {url}' if url and url != self.__url else ''
+        self.__informer.push_message(
+            f'Изменение доступности{place}: {change}',
+            Informer.MessageLevel.INFO,
+            phase='diff',
+        )
+
+    def _report_not_found(self, targets: List[ObservedTarget]) -> None:
+        """
+        Сообщение о необнаруженных билетах.
+
+        :param targets: Слоты, на которые билеты не обнаружены.
+        """
+
+        if targets:
+            self.__informer.push_message(
+                f'Билеты на {", ".join(map(str, targets))} не обнаружены',
+                Informer.MessageLevel.INFO,
+            )
+
+    def _probe_tickets(
+            self, targets: List[ObservedTarget]
+    ) -> List[ObservedTarget]:
+        """
+        Проверка доступных билетов HTTP-запросами.
+
+        :param targets: Слоты, которые нужно проверить.
+        :return:
+            Слоты, на которые обнаружены билеты. Если проверку выполнить не
+            удалось, возвращаются все слоты, чтобы проверить их в браузере.
+        """
+
+        try:
+            results = self.__probe.check_many(targets)
+        except (requests.RequestException, ValueError) as e:
+            self.__informer.push_message(
+                f'Ошибка HTTP-проверки, проверка в браузере: {e}',
+                Informer.MessageLevel.ERROR,
+            )
+            return list(targets)
+
+        self._record_history({
+            target: result.count_tickets if result.time_available else 0
+            for target, result in results.items()
+        })
+
+        candidates: List[ObservedTarget] = []
+        for target, result in results.items():
+            if result.hit:
+                self.__informer.push_message(
+                    f'HTTP-проверка: на {target} доступно билетов - '
+                    f'{result.count_tickets}',
+                    Informer.MessageLevel.INFO,
+                )
+                candidates.append(target)
+
+        return candidates
 
     def _add_check_task(self) -> None:
         """Добавление задачи проверки доступных билетов"""
 
-        # Настраиваем одноразовое событие на выполнение через delay минут.
-        delay = random.randint(1, 3)
+        scheduler = self.__scheduler
+        supervisor = self.__supervisor
+        watchdog = self.__watchdog
+        if scheduler is None or supervisor is None or watchdog is None:
+            return
+
+        # Настраиваем одноразовое событие на выполнение через delay секунд.
+        # Задержку выбирает планировщик сканирований по текущей политике.
+        delay = self.__scan_scheduler.next_delay()
         self.__informer.push_message(
-            f'Следующее сканирование начнется через {delay} минут',
+            f'Следующее сканирование начнется через {delay:.0f} с',
             Informer.MessageLevel.INFO,
         )
-        run_date = dt.datetime.now() + dt.timedelta(minutes=delay)
-        self.__current_job = self.__scheduler.add_job(
+        run_date = dt.datetime.now() + dt.timedelta(seconds=delay)
+        # Опоздавшая задача (например, после сна компьютера) все равно
+        # выполняется, а не пропускается.
+        self.__current_job = scheduler.add_job(
             func=self._check_allowed_tickets,
             trigger='date',
             run_date=run_date,
+            misfire_grace_time=None,
         )
+        # Если к этому сроку сканирование не запланирует следующее, сторож
+        # перезапустит цепочку.
+        watchdog.expect(run_date + dt.timedelta(
+            seconds=supervisor.max_duration + 60,
+        ))
+
+    def _begin_checkout(self, driver: webdriver.Chrome) -> None:
+        """
+        Подготовка надзора к сбору билетов.
+
+        Браузер сканирования может сам собирать билеты, а корзина в нем
+        остается после сбора, поэтому он исключается из закрываемых при
+        зависании. Срок сканирования и ожидание сторожа снимаются: сбор
+        ограничен своими таймаутами, а следующее сканирование заново
+        назначит срок сторожу.
+
+        :param driver: Веб-драйвер сканирования.
+        """
+
+        with self.__active_lock:
+            if driver in self.__active_drivers:
+                self.__active_drivers.remove(driver)
+
+        supervisor = self.__supervisor
+        watchdog = self.__watchdog
+        if supervisor is not None:
+            supervisor.suspend_deadline()
+        if watchdog is not None:
+            watchdog.expect(None)
+
+    def _discard_active_drivers(self) -> None:
+        """
+        Закрытие браузеров зависшего сканирования.
+
+        Закрытие браузера прерывает ожидание ответа от него, сканирование
+        завершается ошибкой, а пул заменяет браузеры новыми. Браузеры,
+        в которых идет или закончен сбор билетов, не закрываются.
+        """
+
+        pool = self.__driver_pool
+        with self.__active_lock:
+            drivers = list(self.__active_drivers)
+        for driver in drivers:
+            if pool is not None:
+                pool.discard(driver)
+
+    def _restart_scan(self) -> None:
+        """Перезапуск прервавшейся цепочки сканирований"""
+
+        if not self.__worked:
+            return
+
+        self.__informer.push_message(
+            'Сканирование зависло или не запустилось вовремя, перезапуск',
+            Informer.MessageLevel.ERROR,
+            phase='scan',
+        )
+        self._discard_active_drivers()
+        self._add_check_task()
+
+    @property
+    def detection_latency(self) -> Dict[str, float]:
+        """
+        Фактическая задержка обнаружения билетов в секундах.
+
+        Подробнее - ScanScheduler.detection_latency.
+        """
+
+        if self.__scan_scheduler is None:
+            return {'count': 0, 'avg': 0.0, 'max': 0.0}
+
+        return self.__scan_scheduler.detection_latency
+
+    def _create_scan_scheduler(self) -> ScanScheduler:
+        """
+        Создание планировщика сканирований по настройкам.
+
+        :return: Планировщик сканирований.
+        :raises ValueError: Если окна появления билетов заданы неверно.
+        """
+
+        jitter = config('SCAN_JITTER', default=60.0, cast=float)
+        policy = FixedRatePolicy(
+            interval=config('SCAN_INTERVAL', default=120.0, cast=float),
+            jitter=jitter,
+        )
+        # Вне окон появления билетов можно сканировать реже.
+        quiet_interval = config('QUIET_SCAN_INTERVAL', default=0.0,
+                                cast=float)
+        # Окна появления билетов задаются в настройках и дополняются
+        # окнами, найденными по истории наблюдений.
+        self.__release_windows = parse_release_windows(
+            config('RELEASE_WINDOWS', default='')
+        )
+        self.__release_policy = ReleaseWindowPolicy(
+            base=policy,
+            windows=self.__release_windows,
+            interval=config('RELEASE_SCAN_INTERVAL', default=15.0,
+                            cast=float),
+            jitter=config('RELEASE_SCAN_JITTER', default=5.0, cast=float),
+            quiet=FixedRatePolicy(quiet_interval, jitter)
+            if quiet_interval > 0 else None,
+        )
+        policy = BackoffPolicy(
+            base=self.__release_policy,
+            max_delay=config('SCAN_BACKOFF_MAX', default=900.0, cast=float),
+            slow_scan=config('SLOW_SCAN', default=60.0, cast=float),
+        )
+
+        target_budget = config('SCAN_TARGET_BUDGET', default=0, cast=int)
+        return ScanScheduler(
+            policy=policy,
+            target_budget=target_budget or None,
+        )
+
+
+@dataclass
+class _PageState:
+    """Состояние одной страницы продукта между сканированиями"""
+
+    # Состояние доступности. None - сравнение сканирований выключено.
+    snapshot: Optional[AvailabilitySnapshot]
+    # Индекс страниц списка сеансов.
+    time_index: TimePageIndex
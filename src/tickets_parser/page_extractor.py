@@ -0,0 +1,228 @@
+import datetime as dt
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from selenium import webdriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from .site_profile import (
+    SELECTOR_FUNCTIONS,
+    normalize_color,
+    parse_count,
+    parse_date,
+    parse_time,
+    site,
+)
+
+
+# Отпечаток фрагмента страницы: 32-битный хеш FNV-1a от текста с
+# извлеченными данными.
+_FINGERPRINT_FUNCTION = '''
+function fingerprint(text) {
+    var hash = 0x811c9dc5;
+    for (var i = 0; i < text.length; i++) {
+        hash ^= text.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193) >>> 0;
+    }
+    return ('0000000' + hash.toString(16)).slice(-8);
+}
+'''
+
+# Скрипт извлечения всех ячеек календаря за один вызов: дата, цвет фона
+# родительской ячейки и сам элемент для щелчка. Если отпечаток совпадает с
+# переданным в arguments[0], ячейки не возвращаются. Селекторы сайта
+# передаются в arguments[1].
+_CALENDAR_SCRIPT = _FINGERPRINT_FUNCTION + SELECTOR_FUNCTIONS + '''
+var selectors = arguments[1];
+var cells = pickAll(document, selectors.calendar_day);
+var result = [];
+var text = '';
+for (var i = 0; i < cells.length; i++) {
+    var cell = cells[i];
+    var item = {
+        date: cell.getAttribute('data-date'),
+        color: window.getComputedStyle(cell.parentElement).backgroundColor,
+        element: cell,
+    };
+    text += item.date + '=' + item.color + ';';
+    result.push(item);
+}
+var print = fingerprint(text);
+if (print === arguments[0]) {
+    return {fingerprint: print, cells: null};
+}
+return {fingerprint: print, cells: result};
+'''
+
+# Скрипт извлечения всех строк списка сеансов и навигации по страницам за
+# один вызов: количество страниц, кнопка следующей страницы и ссылки с
+# номерами страниц. Если отпечаток совпадает с переданным в arguments[0],
+# строки не возвращаются. Селекторы сайта передаются в arguments[1]. Если
+# ячейка времени не найдена, время разбирается из текста всей строки.
+_TIME_ROWS_SCRIPT = _FINGERPRINT_FUNCTION + SELECTOR_FUNCTIONS + '''
+var selectors = arguments[1];
+var rows = pickAll(document, selectors.time_row);
+var result = {rows: [], pages: 1, next: null, links: [], current: null};
+var text = '';
+for (var i = 0; i < rows.length; i++) {
+    var row = rows[i];
+    var timeElement = pick(row, selectors.row_time) || row;
+    var countElement = pick(row, selectors.row_count);
+    var item = {
+        time: timeElement.textContent.trim(),
+        count: countElement ? countElement.textContent.trim() : '',
+        element: row,
+    };
+    text += item.time + '=' + item.count + ';';
+    result.rows.push(item);
+}
+var navigation = pick(document, selectors.pagination);
+if (navigation && navigation.textContent.trim() !== '') {
+    var items = navigation.querySelectorAll('ul > li');
+    if (items.length >= 2) {
+        var lastPage = items[items.length - 2].querySelector('a');
+        result.pages = lastPage ? parseInt(lastPage.textContent.trim(), 10) || 1 : 1;
+        result.next = items[items.length - 1];
+    }
+    var links = navigation.querySelectorAll('ul > li > a');
+    for (var j = 0; j < links.length; j++) {
+        var number = parseInt(links[j].textContent.trim(), 10);
+        if (isNaN(number)) {
+            continue;
+        }
+        result.links.push({page: number, element: links[j]});
+        if (links[j].parentElement.classList.contains('active')) {
+            result.current = number;
+        }
+    }
+}
+text += '/' + result.pages;
+result.fingerprint = fingerprint(text);
+if (result.fingerprint === arguments[0]) {
+    return {fingerprint: result.fingerprint, rows: null};
+}
+return result;
+'''
+
+
+@dataclass
+class DayCell:
+    """Ячейка календаря"""
+
+    date: dt.date
+    # Цвет фона ячейки в виде rgba(r, g, b, a).
+    color: str
+    # Элемент для щелчка. None у ячеек, сохраненных между сканированиями.
+    element: Optional[WebElement]
+
+
+@dataclass
+class TimeRow:
+    """Строка списка сеансов"""
+
+    time: dt.time
+    # Количество доступных билетов, если оно указано в строке.
+    count: Optional[int]
+    # None у строк, сохраненных между сканированиями.
+    element: Optional[WebElement]
+
+
+@dataclass
+class TimePage:
+    """Текущая страница списка сеансов"""
+
+    rows: List[TimeRow]
+    # Общее количество страниц списка.
+    pages: int
+    # Кнопка переключения на следующую страницу, если она есть.
+    next_page_btn: Optional[WebElement]
+    # Ссылки на страницы по номеру страницы, начиная с 0. Сайт может
+    # показывать ссылки не на все страницы.
+    page_links: Dict[int, WebElement] = field(default_factory=dict)
+    # Номер текущей страницы, начиная с 0, если сайт его отмечает.
+    current: Optional[int] = None
+
+
+def extract_calendar(
+        driver: webdriver.Chrome,
+        known_fingerprint: Optional[str] = None,
+) -> Tuple[str, Optional[List[DayCell]]]:
+    """
+    Извлечение всех ячеек текущего месяца календаря одним запросом.
+
+    :param driver: Веб-драйвер для управления браузером.
+    :param known_fingerprint: Отпечаток календаря с прошлого извлечения.
+    :return:
+        Отпечаток календаря и ячейки календаря. Если отпечаток совпал с
+        известным, ячейки не извлекаются и вместо них возвращается None.
+    """
+
+    data = driver.execute_script(_CALENDAR_SCRIPT, known_fingerprint,
+                                 site.variants) or {}
+    if data.get('cells') is None:
+        return data.get('fingerprint', ''), None
+
+    cells: List[DayCell] = []
+    for item in data['cells']:
+        date = parse_date(item.get('date') or '')
+        if date is None:
+            continue
+        cells.append(DayCell(
+            date=date,
+            color=normalize_color(item.get('color') or ''),
+            element=item['element'],
+        ))
+
+    return data['fingerprint'], cells
+
+
+def extract_time_page(
+        driver: webdriver.Chrome,
+        known_fingerprint: Optional[str] = None,
+) -> Tuple[str, Optional[TimePage]]:
+    """
+    Извлечение текущей страницы списка сеансов одним запросом.
+
+    :param driver: Веб-драйвер для управления браузером.
+    :param known_fingerprint: Отпечаток страницы с прошлого извлечения.
+    :return:
+        Отпечаток страницы, строки списка и навигация по страницам. Если
+        отпечаток совпал с известным, страница не извлекается и вместо нее
+        возвращается None.
+    """
+
+    data = driver.execute_script(_TIME_ROWS_SCRIPT, known_fingerprint,
+                                 site.variants) or {}
+    if data.get('rows') is None:
+        return data.get('fingerprint', ''), None
+
+    rows: List[TimeRow] = []
+    for item in data.get('rows', []):
+        time = parse_time(item.get('time') or '')
+        if time is None:
+            continue
+        rows.append(TimeRow(
+            time=time,
+            count=parse_count(item.get('count') or ''),
+            element=item['element'],
+        ))
+
+    current = data.get('current')
+    return data['fingerprint'], TimePage(
+        rows=rows,
+        pages=int(data.get('pages') or 1),
+        next_page_btn=data.get('next'),
+        page_links={
+            int(link['page']) - 1: link['element']
+            for link in data.get('links') or []
+        },
+        current=int(current) - 1 if current else None,
+    )
+
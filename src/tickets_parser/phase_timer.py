@@ -0,0 +1,104 @@
+import time
+import datetime as dt
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Tuple,
+)
+
+from .metrics import metrics
+
+
+class PhaseTimer:
+    """
+    Класс замера времени этапов сканирования и сбора билетов.
+
+    Запоминает длительность каждого этапа одного прогона, чтобы по отчету
+    было видно, на что уходит время от загрузки страницы до корзины.
+    Длительности этапов также учитываются в гистограмме phase_seconds
+    общих метрик бота.
+    """
+
+    def __init__(self) -> None:
+        """Инициализатор класса"""
+
+        self.__started_at = dt.datetime.now()
+        self.__started = time.perf_counter()
+        # Этапы: название, начало от создания замера и длительность.
+        self.__phases: List[Tuple[str, float, float]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Замер длительности этапа.
+
+        :param name: Название этапа.
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.__phases.append((name, started - self.__started, seconds))
+            metrics.observe('phase_seconds', seconds, phase=name)
+
+    @property
+    def phases(self) -> Dict[str, float]:
+        """
+        Длительности этапов в секундах.
+
+        Если этап повторялся, длительности суммируются.
+        """
+
+        result: Dict[str, float] = {}
+        for name, _, seconds in self.__phases:
+            result[name] = result.get(name, 0.0) + seconds
+
+        return result
+
+    @property
+    def total(self) -> float:
+        """Время с создания замера в секундах"""
+
+        return time.perf_counter() - self.__started
+
+    def report(self) -> str:
+        """
+        Текстовый отчет по этапам.
+
+        :return: Строка вида "этап: N мс, ..., всего: N мс".
+        """
+
+        parts = [f'{name}: {seconds * 1000:.0f} мс'
+                 for name, seconds in self.phases.items()]
+        parts.append(f'всего: {self.total * 1000:.0f} мс')
+
+        return ', '.join(parts)
+
+    def trace(self, **attributes: Any) -> Dict[str, Any]:
+        """
+        Трасса прогона для экспорта.
+
+        :param attributes: Дополнительные сведения о прогоне.
+        :return:
+            Словарь со временем начала, общей длительностью и этапами в
+            порядке выполнения. Время в миллисекундах.
+        """
+
+        return {
+            'started': self.__started_at.isoformat(),
+            'total_ms': round(self.total * 1000, 1),
+            'spans': [
+                {
+                    'name': name,
+                    'start_ms': round(offset * 1000, 1),
+                    'duration_ms': round(seconds * 1000, 1),
+                }
+                for name, offset, seconds in self.__phases
+            ],
+            **attributes,
+        }
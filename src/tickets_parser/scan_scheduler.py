@@ -0,0 +1,539 @@
+import math
+import random
+import threading
+import datetime as dt
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from collections import deque
+from dataclasses import dataclass
+from enum import (
+    Enum,
+    auto,
+)
+from typing import (
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+)
+
+
+class ScanOutcome(Enum):
+    """Итог сканирования"""
+
+    FOUND = auto()
+    NOT_FOUND = auto()
+    ERROR = auto()
+
+
+@dataclass(frozen=True)
+class ScanReport:
+    """Сведения о завершенном сканировании"""
+
+    # Время начала сканирования.
+    started: dt.datetime
+    # Длительность сканирования в секундах.
+    duration: float
+    outcome: ScanOutcome
+
+
+class SchedulePolicy(ABC):
+    """Политика выбора задержки до следующего сканирования"""
+
+    @abstractmethod
+    def next_delay(self, now: dt.datetime,
+                   last: Optional[ScanReport]) -> float:
+        """
+        Вычисление задержки до следующего сканирования.
+
+        :param now: Текущее время.
+        :param last: Сведения о последнем сканировании, если оно было.
+        :return: Задержка в секундах.
+        """
+
+    def record(self, report: ScanReport) -> None:
+        """
+        Учет завершенного сканирования.
+
+        Вызывается один раз на каждое сканирование, в отличие от
+        next_delay, который не меняет состояние политики.
+
+        :param report: Сведения о сканировании.
+        """
+
+
+class FixedRatePolicy(SchedulePolicy):
+    """
+    Сканирование с постоянной частотой и случайным разбросом.
+
+    Интервал отсчитывается от начала прошлого сканирования, поэтому долгое
+    сканирование не сдвигает расписание.
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.0) -> None:
+        """
+        Инициализатор класса.
+
+        :param interval: Интервал между началами сканирований в секундах.
+        :param jitter: Максимальный случайный разброс в секундах.
+        """
+
+        self.__interval = interval
+        self.__jitter = jitter
+
+    def next_delay(self, now: dt.datetime,
+                   last: Optional[ScanReport]) -> float:
+        delay = self.__interval
+        if last is not None:
+            delay -= (now - last.started).total_seconds()
+        delay += random.uniform(-self.__jitter, self.__jitter)
+
+        return max(delay, 0.0)
+
+
+@dataclass(frozen=True)
+class ReleaseWindow:
+    """
+    Окно времени, в которое обычно появляются билеты.
+
+    Если конец окна меньше начала, окно переходит через полночь.
+    """
+
+    start: dt.time
+    end: dt.time
+    # Дни недели окна (0 - понедельник). Пустой кортеж - каждый день.
+    weekdays: tuple = ()
+
+    def contains(self, moment: dt.datetime) -> bool:
+        """Попадает ли момент в окно"""
+
+        if self.weekdays and moment.weekday() not in self.weekdays:
+            return False
+
+        current = moment.time()
+        if self.start <= self.end:
+            return self.start <= current < self.end
+        return current >= self.start or current < self.end
+
+    def seconds_until_start(self, moment: dt.datetime) -> float:
+        """Сколько секунд осталось до ближайшего начала окна"""
+
+        for days in range(8):
+            day = moment.date() + dt.timedelta(days=days)
+            if self.weekdays and day.weekday() not in self.weekdays:
+                continue
+            start = dt.datetime.combine(day, self.start)
+            if start >= moment:
+                return (start - moment).total_seconds()
+
+        return float('inf')
+
+
+class ReleaseWindowPolicy(SchedulePolicy):
+    """
+    Учащенное сканирование в окна появления билетов.
+
+    Внутри окна сканирует с коротким интервалом. Вне окна использует
+    базовую политику, но не пропускает начало ближайшего окна.
+    """
+
+    def __init__(self, base: SchedulePolicy,
+                 windows: Sequence[ReleaseWindow],
+                 interval: float,
+                 jitter: float = 0.0,
+                 quiet: Optional[SchedulePolicy] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param base: Политика, пока окна не заданы.
+        :param windows: Окна появления билетов.
+        :param interval: Интервал сканирования внутри окна в секундах.
+        :param jitter: Максимальный случайный разброс в секундах.
+        :param quiet:
+            Политика вне окон, если окна заданы. None - базовая политика.
+        """
+
+        self.__base = base
+        self.__quiet = quiet or base
+        self.__windows = list(windows)
+        self.__inside = FixedRatePolicy(interval, jitter)
+
+    def set_windows(self, windows: Sequence[ReleaseWindow]) -> None:
+        """Замена окон появления билетов"""
+
+        self.__windows = list(windows)
+
+    @property
+    def windows(self) -> List[ReleaseWindow]:
+        """Текущие окна появления билетов"""
+
+        return list(self.__windows)
+
+    def record(self, report: ScanReport) -> None:
+        self.__base.record(report)
+        if self.__quiet is not self.__base:
+            self.__quiet.record(report)
+
+    def next_delay(self, now: dt.datetime,
+                   last: Optional[ScanReport]) -> float:
+        if not self.__windows:
+            return self.__base.next_delay(now, last)
+        if any(window.contains(now) for window in self.__windows):
+            return self.__inside.next_delay(now, last)
+
+        delay = self.__quiet.next_delay(now, last)
+        for window in self.__windows:
+            delay = min(delay, window.seconds_until_start(now))
+
+        return delay
+
+
+class BackoffPolicy(SchedulePolicy):
+    """
+    Замедление сканирования при ошибках и медленных ответах сайта.
+
+    Каждая ошибка или медленное сканирование подряд увеличивает задержку
+    базовой политики в заданное число раз. Первое нормальное сканирование
+    сбрасывает замедление.
+    """
+
+    def __init__(self, base: SchedulePolicy, *,
+                 factor: float = 2.0,
+                 max_delay: float = 900.0,
+                 slow_scan: float = 60.0) -> None:
+        """
+        Инициализатор класса.
+
+        :param base: Замедляемая политика.
+        :param factor: Во сколько раз увеличивается задержка.
+        :param max_delay: Максимальная задержка в секундах.
+        :param slow_scan:
+            Длительность сканирования в секундах, после которой сайт
+            считается перегруженным.
+        """
+
+        self.__base = base
+        self.__factor = factor
+        self.__max_delay = max_delay
+        self.__slow_scan = slow_scan
+        self.__failures = 0
+        # Задержка не меньше секунды, поэтому после этого числа ошибок
+        # она уже упирается в максимум. Больший показатель степени только
+        # переполнил бы float при долгой серии ошибок.
+        self.__max_exponent: Optional[int] = None
+        if factor > 1.0:
+            self.__max_exponent = max(math.ceil(
+                math.log(max(max_delay, 1.0)) / math.log(factor)
+            ), 1)
+
+    @property
+    def failures(self) -> int:
+        """Количество ошибок и медленных сканирований подряд"""
+
+        return self.__failures
+
+    def record_failure(self) -> None:
+        """Учет ошибки или медленного сканирования"""
+
+        self.__failures += 1
+
+    def reset(self) -> None:
+        """Сброс замедления после нормального сканирования"""
+
+        self.__failures = 0
+
+    def record(self, report: ScanReport) -> None:
+        if report.outcome == ScanOutcome.ERROR \
+                or report.duration >= self.__slow_scan:
+            self.record_failure()
+        else:
+            self.reset()
+        self.__base.record(report)
+
+    def next_delay(self, now: dt.datetime,
+                   last: Optional[ScanReport]) -> float:
+        delay = self.__base.next_delay(now, last)
+        if self.__failures:
+            exponent = self.__failures
+            if self.__max_exponent is not None:
+                exponent = min(exponent, self.__max_exponent)
+            delay = max(delay, 1.0) * self.__factor ** exponent
+
+        return min(delay, self.__max_delay)
+
+
+class RateBudget:
+    """
+    Ограничение количества сканирований слота за период.
+
+    Скользящее окно: за любые period секунд слот сканируется не более
+    limit раз.
+    """
+
+    def __init__(self, limit: int, period: float = 3600.0) -> None:
+        """
+        Инициализатор класса.
+
+        :param limit: Сколько сканирований разрешено за период.
+        :param period: Период в секундах.
+        """
+
+        self.__limit = limit
+        self.__period = period
+        self.__scans: Deque[dt.datetime] = deque()
+
+    def allow(self, now: dt.datetime) -> bool:
+        """Можно ли сканировать слот сейчас"""
+
+        self._evict(now)
+        return len(self.__scans) < self.__limit
+
+    def consume(self, now: dt.datetime) -> None:
+        """Учет сканирования слота"""
+
+        self.__scans.append(now)
+
+    def seconds_until_allowed(self, now: dt.datetime) -> float:
+        """Сколько секунд ждать, пока слот снова можно будет сканировать"""
+
+        self._evict(now)
+        if len(self.__scans) < self.__limit:
+            return 0.0
+        oldest = self.__scans[0]
+        return (oldest + dt.timedelta(seconds=self.__period)
+                - now).total_seconds()
+
+    def _evict(self, now: dt.datetime) -> None:
+        """Удаление сканирований за пределами периода"""
+
+        border = now - dt.timedelta(seconds=self.__period)
+        while self.__scans and self.__scans[0] <= border:
+            self.__scans.popleft()
+
+
+class ScanScheduler:
+    """
+    Класс планирования сканирований.
+
+    Выбирает задержку до следующего сканирования по политике, следит за
+    бюджетом сканирований каждого слота и измеряет фактическую задержку
+    обнаружения - максимальное время, в течение которого появившиеся
+    билеты могли оставаться незамеченными.
+    """
+
+    def __init__(self, policy: SchedulePolicy,
+                 target_budget: Optional[int] = None,
+                 budget_period: float = 3600.0) -> None:
+        """
+        Инициализатор класса.
+
+        :param policy: Политика выбора задержки.
+        :param target_budget:
+            Сколько раз за период можно сканировать один слот.
+            None - без ограничения.
+        :param budget_period: Период бюджета в секундах.
+        """
+
+        self.__policy = policy
+        self.__target_budget = target_budget
+        self.__budget_period = budget_period
+        self.__budgets: Dict[Hashable, RateBudget] = {}
+        self.__lock = threading.Lock()
+
+        self.__last: Optional[ScanReport] = None
+        # Задержки обнаружения: время от конца прошлого сканирования до
+        # конца текущего, в секундах.
+        self.__latencies: Deque[float] = deque(maxlen=1000)
+
+    @property
+    def policy(self) -> SchedulePolicy:
+        """Политика выбора задержки"""
+
+        return self.__policy
+
+    def due_targets(self, targets: Iterable[Hashable],
+                    now: Optional[dt.datetime] = None) -> List[Hashable]:
+        """
+        Отбор слотов, бюджет которых позволяет сканирование, и учет
+        сканирования в их бюджете.
+
+        :param targets: Наблюдаемые слоты.
+        :param now: Текущее время.
+        :return: Слоты, которые нужно просканировать сейчас.
+        """
+
+        targets = list(targets)
+        if self.__target_budget is None:
+            return targets
+
+        now = now or dt.datetime.now()
+        due = []
+        with self.__lock:
+            for target in targets:
+                budget = self.__budgets.setdefault(
+                    target,
+                    RateBudget(self.__target_budget, self.__budget_period),
+                )
+                if budget.allow(now):
+                    budget.consume(now)
+                    due.append(target)
+
+        return due
+
+    def record(self, report: ScanReport) -> None:
+        """
+        Учет завершенного сканирования.
+
+        :param report: Сведения о сканировании.
+        """
+
+        with self.__lock:
+            if self.__last is not None:
+                previous_end = self.__last.started \
+                    + dt.timedelta(seconds=self.__last.duration)
+                current_end = report.started \
+                    + dt.timedelta(seconds=report.duration)
+                self.__latencies.append(
+                    (current_end - previous_end).total_seconds()
+                )
+            self.__last = report
+            self.__policy.record(report)
+
+    def forget(self, target: Hashable) -> None:
+        """
+        Удаление бюджета слота, который больше не наблюдается.
+
+        Иначе исчерпанный бюджет собранного слота продолжал бы
+        откладывать сканирование остальных.
+
+        :param target: Слот.
+        """
+
+        with self.__lock:
+            self.__budgets.pop(target, None)
+
+    def next_delay(self, now: Optional[dt.datetime] = None) -> float:
+        """
+        Задержка до следующего сканирования.
+
+        :param now: Текущее время.
+        :return: Задержка в секундах.
+        """
+
+        now = now or dt.datetime.now()
+        with self.__lock:
+            delay = self.__policy.next_delay(now, self.__last)
+
+            # Если бюджет всех слотов исчерпан, ждем, пока освободится
+            # хотя бы один.
+            if self.__budgets and self.__target_budget is not None:
+                wait = min(budget.seconds_until_allowed(now)
+                           for budget in self.__budgets.values())
+                delay = max(delay, wait)
+
+        return delay
+
+    @property
+    def detection_latency(self) -> Dict[str, float]:
+        """
+        Фактическая задержка обнаружения в секундах.
+
+        Билеты, появившиеся сразу после сканирования, обнаруживаются к концу
+        следующего сканирования. avg и max - среднее и худшее время между
+        концами соседних сканирований.
+        """
+
+        with self.__lock:
+            latencies = list(self.__latencies)
+
+        if not latencies:
+            return {'count': 0, 'avg': 0.0, 'max': 0.0}
+
+        return {
+            'count': len(latencies),
+            'avg': sum(latencies) / len(latencies),
+            'max': max(latencies),
+        }
+
+
+class PageRotation:
+    """
+    Класс очередности сканирования страниц продуктов.
+
+    Если за одно сканирование проверяются не все страницы, первыми
+    выбираются страницы, которые дольше всех не сканировались. Так каждая
+    страница получает свою долю сканирований независимо от того, сколько
+    на ней слотов.
+    """
+
+    def __init__(self, limit: int = 0) -> None:
+        """
+        Инициализатор класса.
+
+        :param limit:
+            Сколько страниц проверять за одно сканирование. 0 - все.
+        """
+
+        self.__limit = limit
+        self.__scanned: Dict[Hashable, dt.datetime] = {}
+        self.__lock = threading.Lock()
+
+    def select(self, pages: Iterable[Hashable],
+               now: Optional[dt.datetime] = None) -> List[Hashable]:
+        """
+        Выбор страниц для сканирования и учет их сканирования.
+
+        :param pages: Страницы, на которых есть несобранные слоты.
+        :param now: Текущее время.
+        :return: Страницы, которые нужно просканировать сейчас.
+        """
+
+        now = now or dt.datetime.now()
+        with self.__lock:
+            # Новые страницы идут первыми, остальные - по давности
+            # сканирования. Сортировка устойчива, поэтому при равенстве
+            # сохраняется исходный порядок страниц.
+            selected = sorted(
+                pages,
+                key=lambda page: self.__scanned.get(page, dt.datetime.min),
+            )
+            if self.__limit > 0:
+                selected = selected[:self.__limit]
+            for page in selected:
+                self.__scanned[page] = now
+
+        return selected
+
+
+def parse_release_windows(value: str) -> List[ReleaseWindow]:
+    """
+    Разбор окон появления билетов из строки настроек.
+
+    :param value: Строка вида "09:00-10:00,18:00-18:30".
+    :return: Окна появления билетов.
+    :raises ValueError: Если окно задано неверно.
+    """
+
+    windows = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            start, end = part.split('-')
+            windows.append(ReleaseWindow(
+                start=dt.datetime.strptime(start.strip(), '%H:%M').time(),
+                end=dt.datetime.strptime(end.strip(), '%H:%M').time(),
+            ))
+        except ValueError as e:
+            raise ValueError(
+                f'неверное окно появления билетов "{part}", '
+                f'ожидается вид 09:00-10:00'
+            ) from e
+
+    return windows
@@ -0,0 +1,379 @@
+import os
+import json
+import time
+import threading
+from dataclasses import (
+    asdict,
+    dataclass,
+    field,
+)
+from enum import Enum
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+import requests
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from .informer import Informer
+from .site_profile import site
+
+
+# Сбор localStorage и адреса страницы, с которой он снят.
+_CAPTURE_SCRIPT = '''
+var items = {};
+try {
+    for (var i = 0; i < window.localStorage.length; i++) {
+        var key = window.localStorage.key(i);
+        items[key] = window.localStorage.getItem(key);
+    }
+} catch (e) {}
+return {origin: window.location.origin, items: items};
+'''
+
+# Восстановление localStorage до выполнения скриптов страницы. Значения,
+# которые сайт уже записал сам, не перезаписываются.
+_RESTORE_SCRIPT = '''
+(function (origin, items) {
+    if (window.location.origin !== origin) { return; }
+    try {
+        for (var key in items) {
+            if (window.localStorage.getItem(key) === null) {
+                window.localStorage.setItem(key, items[key]);
+            }
+        }
+    } catch (e) {}
+})(%s, %s);
+'''
+
+
+class SessionKind(Enum):
+    """Вид сохраненной сессии сайта"""
+
+    # Состояние после прогрева: куки согласия и localStorage. Куки сессии
+    # сайта сюда не попадают, чтобы у каждого браузера была своя корзина.
+    BASE = 'base'
+    # Полная сессия браузера, в котором собрана корзина. Восстанавливается
+    # только в браузере пользователя, но не в браузерах пула.
+    CART = 'cart'
+
+
+@dataclass(frozen=True)
+class SessionState:
+    """Куки и localStorage сайта, снятые с браузера"""
+
+    # Адрес сайта вида "https://example.com".
+    origin: str
+    # Куки в формате get_cookies Selenium.
+    cookies: List[Dict[str, Any]] = field(default_factory=list)
+    local_storage: Dict[str, str] = field(default_factory=dict)
+    # Время снятия состояния, секунды с начала эпохи.
+    captured_at: float = 0.0
+
+    @property
+    def age(self) -> float:
+        """Возраст состояния в секундах"""
+
+        return time.time() - self.captured_at
+
+    def live_cookies(self) -> List[Dict[str, Any]]:
+        """
+        Куки, срок действия которых еще не истек.
+
+        :return: Куки в формате get_cookies Selenium.
+        """
+
+        now = time.time()
+
+        return [cookie for cookie in self.cookies
+                if not cookie.get('expiry') or cookie['expiry'] > now]
+
+
+def consent_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Отбор кук согласия, которые можно переносить между браузерами.
+
+    Список имен задается в профиле сайта. Остальные куки, в том числе
+    идентификатор сессии сайта, к которому привязана корзина, не
+    переносятся.
+
+    :param cookies: Куки в формате get_cookies Selenium.
+    :return: Куки согласия.
+    """
+
+    allowed = site.consent_cookies
+
+    return [cookie for cookie in cookies if cookie.get('name') in allowed]
+
+
+class SessionStore:
+    """
+    Класс хранилища сессий сайта.
+
+    После первого прогрева браузера снимает куки согласия и localStorage
+    сайта и восстанавливает их в новых браузерах до первой загрузки
+    страницы, а также в HTTP-сессиях. Так плашка с куки не показывается
+    заново. Куки сессии сайта не сохраняются и не восстанавливаются: у
+    каждого браузера пула своя сессия и своя корзина. Полная сессия
+    браузера с собранной корзиной сохраняется отдельно, чтобы корзину
+    можно было открыть в браузере пользователя. Состояние хранится в
+    JSON-файле, доступном только владельцу, и переживает перезапуск
+    бота.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 max_age: float = 12 * 3600,
+                 informer: Optional[Informer] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param path:
+            Путь к файлу состояния. None - состояние хранится только в
+            памяти.
+        :param max_age:
+            Через сколько секунд сохраненное состояние считается
+            устаревшим и снимается заново.
+        :param informer:
+            Объект информера для отслеживания состояния бота. Если не
+            задан, ошибка записи файла состояния пробрасывается.
+        """
+
+        self.__path = path
+        self.__max_age = max_age
+        self.__informer = informer
+        self.__states: Dict[SessionKind, SessionState] = {}
+        self.__lock = threading.Lock()
+
+        self._load()
+
+    def get(self, kind: SessionKind = SessionKind.BASE
+            ) -> Optional[SessionState]:
+        """
+        Сохраненное состояние.
+
+        :param kind: Вид сессии.
+        :return: Состояние, либо None, если его нет или оно устарело.
+        """
+
+        with self.__lock:
+            state = self.__states.get(kind)
+
+        if state is None or state.age > self.__max_age:
+            return None
+
+        return state
+
+    def capture(self, driver: webdriver.Chrome,
+                kind: SessionKind = SessionKind.BASE) -> SessionState:
+        """
+        Снятие состояния с браузера с открытой страницей сайта.
+
+        :param driver: Веб-драйвер с открытой страницей.
+        :param kind: Вид сессии.
+        :return: Снятое состояние.
+        :raises WebDriverException: Если браузер не отвечает.
+        :raises OSError: Если файл состояния не записан, а информер не задан.
+        """
+
+        storage = driver.execute_script(_CAPTURE_SCRIPT) or {}
+        cookies = driver.get_cookies()
+        if kind == SessionKind.BASE:
+            cookies = consent_cookies(cookies)
+        state = SessionState(
+            origin=storage.get('origin') or '',
+            cookies=cookies,
+            local_storage=storage.get('items') or {},
+            captured_at=time.time(),
+        )
+
+        with self.__lock:
+            self.__states[kind] = state
+            self._save()
+
+        return state
+
+    def restore(self, driver: webdriver.Chrome,
+                kind: SessionKind = SessionKind.BASE) -> Optional[str]:
+        """
+        Восстановление состояния в браузере.
+
+        Вызывается до первой загрузки страницы: куки задаются через
+        протокол DevTools для любого домена, а localStorage заполняется
+        скриптом, который выполняется раньше скриптов страницы. Сессию
+        корзины можно восстанавливать только в браузере пользователя:
+        браузер с ней работает с той же корзиной.
+
+        :param driver: Веб-драйвер.
+        :param kind: Вид сессии.
+        :return:
+            Идентификатор скрипта восстановления localStorage, если он
+            добавлен. Скрипт нужно снять методом stop_restoring после
+            загрузки страницы.
+        :raises WebDriverException: Если браузер не отвечает.
+        """
+
+        state = self.get(kind)
+        if state is None:
+            return None
+
+        cookies = [self._to_cdp(cookie)
+                   for cookie in self._cookies(state, kind)]
+        if cookies:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+
+        if not state.local_storage or not state.origin:
+            return None
+
+        result = driver.execute_cdp_cmd(
+            'Page.addScriptToEvaluateOnNewDocument',
+            {'source': _RESTORE_SCRIPT % (json.dumps(state.origin),
+                                          json.dumps(state.local_storage))},
+        )
+
+        return result.get('identifier')
+
+    @staticmethod
+    def stop_restoring(driver: webdriver.Chrome, identifier: str) -> None:
+        """
+        Снятие скрипта восстановления localStorage.
+
+        После первой загрузки страницы localStorage уже заполнен, и
+        дальше сайт управляет им сам.
+
+        :param driver: Веб-драйвер.
+        :param identifier: Идентификатор скрипта из restore.
+        """
+
+        try:
+            driver.execute_cdp_cmd(
+                'Page.removeScriptToEvaluateOnNewDocument',
+                {'identifier': identifier},
+            )
+        except WebDriverException:
+            pass
+
+    def apply(self, session: requests.Session,
+              kind: SessionKind = SessionKind.BASE) -> bool:
+        """
+        Восстановление кук в HTTP-сессии.
+
+        :param session: HTTP-сессия.
+        :param kind: Вид сессии.
+        :return: True, если куки восстановлены.
+        """
+
+        state = self.get(kind)
+        if state is None:
+            return False
+
+        cookies = self._cookies(state, kind)
+        for cookie in cookies:
+            session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                expires=cookie.get('expiry'),
+            )
+
+        return bool(cookies)
+
+    def clear(self, kind: Optional[SessionKind] = None) -> None:
+        """
+        Удаление сохраненного состояния.
+
+        :param kind: Вид сессии. None - все сессии.
+        :raises OSError: Если файл состояния не записан, а информер не задан.
+        """
+
+        with self.__lock:
+            if kind is None:
+                self.__states.clear()
+            else:
+                self.__states.pop(kind, None)
+            self._save()
+
+    @property
+    def path(self) -> Optional[str]:
+        """Путь к файлу состояния"""
+
+        return self.__path
+
+    @staticmethod
+    def _cookies(state: SessionState,
+                 kind: SessionKind) -> List[Dict[str, Any]]:
+        """Действующие куки состояния, которые можно восстановить"""
+
+        cookies = state.live_cookies()
+        # Файл мог быть сохранен с другим списком кук согласия.
+        if kind == SessionKind.BASE:
+            cookies = consent_cookies(cookies)
+
+        return cookies
+
+    @staticmethod
+    def _to_cdp(cookie: Dict[str, Any]) -> Dict[str, Any]:
+        """Перевод куки Selenium в формат Network.setCookies"""
+
+        param = {
+            'name': cookie['name'],
+            'value': cookie['value'],
+            'domain': cookie.get('domain', ''),
+            'path': cookie.get('path', '/'),
+            'secure': cookie.get('secure', False),
+            'httpOnly': cookie.get('httpOnly', False),
+        }
+        if cookie.get('sameSite'):
+            param['sameSite'] = cookie['sameSite']
+        if cookie.get('expiry'):
+            param['expires'] = cookie['expiry']
+
+        return param
+
+    def _load(self) -> None:
+        """Загрузка состояния из файла"""
+
+        if not self.__path:
+            return
+
+        try:
+            with open(self.__path, encoding='utf-8') as state_file:
+                data = json.load(state_file)
+            self.__states = {
+                SessionKind(kind): SessionState(**state)
+                for kind, state in data.items()
+            }
+        except (OSError, ValueError, TypeError):
+            self.__states = {}
+
+    def _save(self) -> None:
+        """Сохранение состояния в файл"""
+
+        if not self.__path:
+            return
+
+        data = {kind.value: asdict(state)
+                for kind, state in self.__states.items()}
+        # Файл записывается целиком во временный и подменяется, чтобы
+        # прерванная запись не испортила сохраненную сессию. В файле куки
+        # корзины, поэтому он доступен только владельцу.
+        temp_path = f'{self.__path}.tmp'
+        try:
+            descriptor = os.open(temp_path,
+                                 os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                                 0o600)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as state_file:
+                json.dump(data, state_file, ensure_ascii=False, indent=2)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.__path)
+        except OSError as e:
+            if self.__informer is None:
+                raise
+            self.__informer.push_message(
+                f'Ошибка сохранения сессии сайта: {e}',
+                Informer.MessageLevel.ERROR,
+            )
@@ -0,0 +1,438 @@
+import re
+import json
+import threading
+import datetime as dt
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+
+
+# Время сеанса вида 9:30, 09:30 или 09.30.
+TIME_PATTERN = re.compile(r'(?<!\d)([01]?\d|2[0-3])[:.]([0-5]\d)(?!\d)')
+# Дата ячейки календаря вида дд/мм/гггг.
+DATE_PATTERN = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+# Количество билетов: первое число в тексте, например "(12)" или
+# "Купить (12)".
+COUNT_PATTERN = re.compile(r'\d+')
+COLOR_PATTERN = re.compile(r'rgba?\(([^)]*)\)')
+
+# Функции выбора элемента по вариантам селектора для скриптов страницы.
+# Варианты проверяются по порядку: запасной вариант используется, только
+# если основной ничего не нашел.
+SELECTOR_FUNCTIONS = '''
+function pick(root, variants) {
+    for (var i = 0; i < variants.length; i++) {
+        var element = root.querySelector(variants[i]);
+        if (element) {
+            return element;
+        }
+    }
+    return null;
+}
+function pickAll(root, variants) {
+    for (var i = 0; i < variants.length; i++) {
+        var elements = root.querySelectorAll(variants[i]);
+        if (elements.length) {
+            return elements;
+        }
+    }
+    return [];
+}
+'''
+
+# Скрипт проверки всех селекторов за один вызов. Для каждого селектора
+# возвращает номер первого сработавшего варианта, либо null.
+_EVALUATE_SCRIPT = '''
+var selectors = arguments[0];
+var result = {};
+for (var name in selectors) {
+    result[name] = null;
+    for (var i = 0; i < selectors[name].length; i++) {
+        if (document.querySelector(selectors[name][i])) {
+            result[name] = i;
+            break;
+        }
+    }
+}
+return result;
+'''
+
+
+def parse_time(text: str) -> Optional[dt.time]:
+    """
+    Разбор времени сеанса из текста.
+
+    :param text: Текст ячейки или всей строки списка сеансов.
+    :return: Первое время в тексте, либо None, если времени нет.
+    """
+
+    match = TIME_PATTERN.search(text or '')
+    if match is None:
+        return None
+
+    return dt.time(int(match.group(1)), int(match.group(2)))
+
+
+def parse_date(text: str) -> Optional[dt.date]:
+    """
+    Разбор даты ячейки календаря.
+
+    :param text: Дата в виде дд/мм/гггг.
+    :return: Дата, либо None, если дата не разобрана.
+    """
+
+    match = DATE_PATTERN.search(text or '')
+    if match is None:
+        return None
+
+    day, month, year = (int(group) for group in match.groups())
+    try:
+        return dt.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_count(text: str) -> Optional[int]:
+    """
+    Разбор количества билетов.
+
+    :param text: Текст с количеством, например "(12)".
+    :return: Количество, либо None, если числа в тексте нет.
+    """
+
+    match = COUNT_PATTERN.search(text or '')
+    return int(match.group()) if match is not None else None
+
+
+def normalize_color(color: str) -> str:
+    """
+    Приведение цвета CSS к виду rgba(r, g, b, a), как его возвращает
+    value_of_css_property.
+
+    :param color: Цвет в виде rgb(...) или rgba(...).
+    :return: Цвет в виде rgba(r, g, b, a).
+    """
+
+    match = COLOR_PATTERN.search(color)
+    if match is None:
+        return color
+
+    parts = [part.strip() for part in match.group(1).split(',')]
+    if len(parts) == 3:
+        parts.append('1')
+
+    return f'rgba({", ".join(parts)})'
+
+
+@dataclass(frozen=True)
+class Selector:
+    """
+    Именованный CSS-селектор элемента сайта.
+
+    Первый вариант - основной, остальные - запасные на случай, если сайт
+    изменит разметку.
+    """
+
+    name: str
+    variants: Tuple[str, ...]
+
+    @property
+    def css(self) -> str:
+        """
+        Селектор, подходящий под любой вариант.
+
+        Используется для ожидания элемента: ожидание заканчивается, как
+        только появляется элемент любого варианта.
+        """
+
+        return ', '.join(self.variants)
+
+    def find(self, base: Union[WebElement, webdriver.Chrome]) -> WebElement:
+        """
+        Поиск элемента по вариантам селектора.
+
+        :param base: Базовый элемент, откуда искать, либо драйвер.
+        :return: Элемент первого сработавшего варианта.
+        :raises NoSuchElementException: Если не сработал ни один вариант.
+        """
+
+        for variant in self.variants:
+            elements = base.find_elements(By.CSS_SELECTOR, variant)
+            if elements:
+                return elements[0]
+
+        raise NoSuchElementException(
+            f'Элемент {self.name} не найден по селекторам: {self.css}'
+        )
+
+    def find_all(self,
+                 base: Union[WebElement, webdriver.Chrome]) -> List[WebElement]:
+        """
+        Поиск всех элементов первого сработавшего варианта.
+
+        :param base: Базовый элемент, откуда искать, либо драйвер.
+        :return: Найденные элементы, либо пустой список.
+        """
+
+        for variant in self.variants:
+            elements = base.find_elements(By.CSS_SELECTOR, variant)
+            if elements:
+                return elements
+
+        return []
+
+
+# Селекторы элементов сайта. Селекторы строк списка сеансов (row_*)
+# ищутся внутри строки.
+DEFAULT_SELECTORS: Dict[str, Tuple[str, ...]] = {
+    'calendar_day': ('.calendar-day > .day-number',
+                     '.day-number[data-date]'),
+    'next_month': ('.next.changemonth.glyphicon.glyphicon-chevron-right',
+                   '.next.changemonth'),
+    'time_row': ('.perf_row.row-height2.text-center', '.perf_row'),
+    'row_time': (':scope > div > div', ':scope div div'),
+    'row_count': ('.showPerformance span', '.showPerformance'),
+    'buy_button': ('.btn-modalproduct.btn.btn-success.btn-block'
+                   '.showPerformance',
+                   '.showPerformance', '.btn-modalproduct'),
+    'pagination': ('#prfrmncPages',),
+    'modal': ('#myModal',),
+    'modal_product': ('.productrow',),
+    'quantity_input': ('#qB6B0B700-CEEA-3087-359F-016CB3FAF5CB',
+                       '.productrow input[type="number"]',
+                       '.productrow input[type="text"]'),
+    'add_to_cart': ('.btn.btn-primary.addtocart', '.addtocart'),
+    'captcha_response': ('#g-recaptcha-response',),
+    'cookie_close': ('.gdpr_denyClose',),
+}
+
+# Цвета фона доступной и выбранной даты в календаре.
+DEFAULT_ALLOWED_DAY_COLORS = (
+    'rgba(206, 234, 208, 1)',
+    'rgba(56, 58, 62, 1)',
+    '#ceead0',
+    '#383a3e',
+)
+# Куки согласия с куки, которые можно переносить между браузерами. Куки
+# сессии сайта и корзины в список не входят: у каждого браузера своя
+# сессия и своя корзина.
+DEFAULT_CONSENT_COOKIES = (
+    'gdpr',
+    'gdpr_consent',
+    'cookie_consent',
+    'cookieconsent_status',
+    'CookieConsent',
+)
+
+
+class SiteProfile:
+    """
+    Класс профиля разметки сайта.
+
+    Собирает в одном месте все знания о разметке сайта: именованные
+    селекторы с запасными вариантами, цвета доступных дат. Селекторы
+    можно переопределить из JSON-файла, не меняя код, если сайт изменил
+    разметку. Все селекторы проверяются на странице одним запросом, чтобы
+    быстро понять, какие элементы пропали.
+    """
+
+    def __init__(
+            self,
+            selectors: Mapping[str, Sequence[str]] = DEFAULT_SELECTORS,
+            allowed_day_colors: Sequence[str] = DEFAULT_ALLOWED_DAY_COLORS,
+            allowed_day_classes: Sequence[str] = (),
+            consent_cookies: Sequence[str] = DEFAULT_CONSENT_COOKIES,
+    ) -> None:
+        """
+        Инициализатор класса.
+
+        :param selectors: Словарь "имя селектора - варианты селектора".
+        :param allowed_day_colors: Цвета фона доступной даты.
+        :param allowed_day_classes:
+            Классы ячейки доступной даты. По умолчанию не заданы: сайт
+            отмечает доступные даты только цветом фона.
+        :param consent_cookies:
+            Имена кук согласия, которые сохраняются между браузерами.
+        """
+
+        self.__lock = threading.Lock()
+        self.__selectors: Dict[str, Selector] = {}
+        # Варианты селекторов в виде для передачи в скрипты страницы.
+        self.__variants: Dict[str, List[str]] = {}
+        self.__allowed_day_colors: frozenset = frozenset()
+        # Те же цвета без пробелов в виде rgba(...) и rgb(...) для поиска в
+        # атрибуте style.
+        self.__style_colors: Tuple[str, ...] = ()
+        self.__allowed_day_classes: frozenset = frozenset()
+        self.__consent_cookies: frozenset = frozenset()
+        self.update(selectors, allowed_day_colors, allowed_day_classes,
+                    consent_cookies)
+
+    def __getitem__(self, name: str) -> Selector:
+        """
+        Получение селектора по имени.
+
+        :raises KeyError: Если селектора с таким именем нет.
+        """
+
+        return self.__selectors[name]
+
+    @property
+    def variants(self) -> Dict[str, List[str]]:
+        """Варианты всех селекторов для передачи в скрипты страницы"""
+
+        return self.__variants
+
+    @property
+    def consent_cookies(self) -> frozenset:
+        """Имена кук согласия, которые сохраняются между браузерами"""
+
+        return self.__consent_cookies
+
+    def update(self,
+               selectors: Optional[Mapping[str, Sequence[str]]] = None,
+               allowed_day_colors: Optional[Sequence[str]] = None,
+               allowed_day_classes: Optional[Sequence[str]] = None,
+               consent_cookies: Optional[Sequence[str]] = None) -> None:
+        """
+        Замена селекторов, признаков доступной даты и кук согласия.
+
+        :param selectors:
+            Словарь "имя селектора - варианты селектора". Селекторы, которых
+            нет в словаре, не меняются.
+        :param allowed_day_colors: Цвета фона доступной даты.
+        :param allowed_day_classes: Классы ячейки доступной даты.
+        :param consent_cookies:
+            Имена кук согласия, которые сохраняются между браузерами.
+        :raises ValueError: Если у селектора нет ни одного варианта.
+        """
+
+        with self.__lock:
+            selectors_copy = dict(self.__selectors)
+            for name, variants in (selectors or {}).items():
+                if isinstance(variants, str):
+                    variants = (variants,)
+                variants = tuple(variant for variant in variants if variant)
+                if not variants:
+                    raise ValueError(f'У селектора {name} нет вариантов')
+                selectors_copy[name] = Selector(name, variants)
+            self.__selectors = selectors_copy
+            self.__variants = {name: list(selector.variants)
+                               for name, selector in selectors_copy.items()}
+
+            if allowed_day_colors is not None:
+                self.__allowed_day_colors = frozenset(
+                    self._normalize(color) for color in allowed_day_colors
+                )
+                style_colors = set()
+                for color in self.__allowed_day_colors:
+                    color = color.replace(' ', '')
+                    style_colors.add(color)
+                    if color.startswith('rgba(') and color.endswith(',1)'):
+                        style_colors.add(f'rgb({color[5:-3]})')
+                self.__style_colors = tuple(style_colors)
+            if allowed_day_classes is not None:
+                self.__allowed_day_classes = frozenset(allowed_day_classes)
+            if consent_cookies is not None:
+                self.__consent_cookies = frozenset(consent_cookies)
+
+    def load(self, path: str) -> None:
+        """
+        Переопределение профиля из JSON-файла.
+
+        Файл вида {"selectors": {"buy_button": [".buy", ".btn-buy"]},
+        "allowed_day_colors": ["rgba(206, 234, 208, 1)"],
+        "consent_cookies": ["gdpr"]}.
+
+        :param path: Путь к файлу.
+        :raises OSError: Если файл не прочитан.
+        :raises ValueError: Если файл не разобран.
+        """
+
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        if not isinstance(data, dict):
+            raise ValueError(f'Ожидался JSON-объект в файле {path}')
+
+        self.update(
+            selectors=data.get('selectors'),
+            allowed_day_colors=data.get('allowed_day_colors'),
+            allowed_day_classes=data.get('allowed_day_classes'),
+            consent_cookies=data.get('consent_cookies'),
+        )
+
+    def allowed_day(self, color: str = '',
+                    classes: Iterable[str] = ()) -> bool:
+        """
+        Проверка доступности даты по ячейке календаря.
+
+        :param color: Цвет фона или значение атрибута style ячейки.
+        :param classes: Классы ячейки.
+        :return: True, если дата доступна, иначе False.
+        """
+
+        if self._normalize(color) in self.__allowed_day_colors:
+            return True
+
+        # В атрибуте style цвет записан вместе с другими свойствами.
+        style = (color or '').replace(' ', '').lower()
+        if any(allowed in style for allowed in self.__style_colors):
+            return True
+
+        return any(name in self.__allowed_day_classes for name in classes)
+
+    def evaluate(
+            self, driver: webdriver.Chrome,
+            names: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Optional[int]]:
+        """
+        Проверка селекторов на открытой странице одним запросом.
+
+        :param driver: Веб-драйвер для управления браузером.
+        :param names: Имена проверяемых селекторов. None - все селекторы.
+        :return:
+            Словарь "имя селектора - номер сработавшего варианта", None -
+            не сработал ни один вариант.
+        """
+
+        variants = self.variants
+        if names is not None:
+            variants = {name: variants[name] for name in names}
+
+        return driver.execute_script(_EVALUATE_SCRIPT, variants) or {}
+
+    def missing(self, driver: webdriver.Chrome,
+                names: Iterable[str]) -> List[str]:
+        """
+        Имена селекторов, не найденных на открытой странице.
+
+        :param driver: Веб-драйвер для управления браузером.
+        :param names: Имена проверяемых селекторов.
+        :return: Имена селекторов, не сработавших ни одним вариантом.
+        """
+
+        return [name for name, variant in self.evaluate(driver, names).items()
+                if variant is None]
+
+    @staticmethod
+    def _normalize(color: str) -> str:
+        """Приведение цвета к виду для сравнения"""
+
+        color = (color or '').strip().lower()
+        return normalize_color(color) if color.startswith('rgb') else color
+
+
+# Профиль разметки сайта, общий для всех модулей бота.
+site = SiteProfile()
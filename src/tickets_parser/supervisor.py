@@ -0,0 +1,353 @@
+import time
+import queue
+import threading
+import datetime as dt
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    TypeVar,
+)
+import requests
+from urllib3.exceptions import HTTPError as TransportError
+from selenium.common.exceptions import (
+    InvalidSessionIdException,
+    NoSuchWindowException,
+    SessionNotCreatedException,
+    WebDriverException,
+)
+
+from .captcha import CaptchaError
+from .driver_resolver import DriverResolveError
+from .informer import Informer
+from .metrics import metrics
+
+
+T = TypeVar('T')
+
+# Фрагменты сообщений Selenium, по которым видно, что браузер или
+# chromedriver больше не отвечает.
+_DEAD_DRIVER_MESSAGES = (
+    'chrome not reachable',
+    'disconnected',
+    'invalid session id',
+    'no such session',
+    'session deleted',
+    'tab crashed',
+    'target window already closed',
+    'unable to receive message from renderer',
+)
+
+
+class FailureKind(Enum):
+    """Вид сбоя сканирования"""
+
+    # Временный сбой страницы или сети: повтор скорее всего поможет.
+    TRANSIENT = 'transient'
+    # Браузер не отвечает: нужен новый браузер.
+    DRIVER = 'driver'
+    # Повтор не поможет, мониторинг нужно остановить.
+    FATAL = 'fatal'
+
+
+class ScanDeadlineExceeded(Exception):
+    """Сканирование не уложилось в отведенное время"""
+
+
+class ScanCancelled(Exception):
+    """Ожидание сканирования прервано остановкой надзора"""
+
+
+def classify(error: BaseException) -> FailureKind:
+    """
+    Определение вида сбоя по исключению.
+
+    :param error: Исключение, прервавшее сканирование.
+    :return: Вид сбоя.
+    """
+
+    # Chrome и chromedriver несовместимы, либо chromedriver не найден:
+    # новый браузер запустить не получится.
+    if isinstance(error, (SessionNotCreatedException, DriverResolveError,
+                          MemoryError)):
+        return FailureKind.FATAL
+
+    if isinstance(error, (ScanDeadlineExceeded, InvalidSessionIdException,
+                          NoSuchWindowException)):
+        return FailureKind.DRIVER
+    if isinstance(error, WebDriverException):
+        message = (error.msg or '').lower()
+        if any(marker in message for marker in _DEAD_DRIVER_MESSAGES):
+            return FailureKind.DRIVER
+        return FailureKind.TRANSIENT
+
+    # Ошибки HTTP-проверки относятся к сайту, а ошибки соединения с
+    # chromedriver - к браузеру.
+    if isinstance(error, requests.RequestException):
+        return FailureKind.TRANSIENT
+    if isinstance(error, (ConnectionError, TransportError)):
+        return FailureKind.DRIVER
+
+    # Остальные ошибки (устаревшая разметка, неожиданный текст на
+    # странице, капча) считаются временными: многодневный мониторинг не
+    # должен останавливаться из-за одной неудачной страницы.
+    return FailureKind.TRANSIENT
+
+
+def describe(error: BaseException) -> str:
+    """
+    Краткое описание сбоя для лога.
+
+    :param error: Исключение, прервавшее сканирование.
+    :return: Описание сбоя.
+    """
+
+    if isinstance(error, queue.Empty):
+        return 'нет свободного браузера'
+    if isinstance(error, (ScanDeadlineExceeded, ScanCancelled)):
+        return str(error)
+    if isinstance(error, WebDriverException):
+        return f'{type(error).__name__}: {(error.msg or "").strip()}'
+    if isinstance(error, CaptchaError):
+        return f'ошибка решения капчи: {error}'
+
+    return f'{type(error).__name__}: {error}'
+
+
+class ScanSupervisor:
+    """
+    Класс надзора за сканированиями.
+
+    Запускает сканирование в отдельном потоке со сроком выполнения.
+    Временные сбои и сбои браузера повторяются с нарастающей паузой,
+    неисправный браузер заменяет сам сканер. Если сканирование зависло,
+    вызывается обработчик зависания, который должен освободить сканер,
+    например, закрыть его браузер. Когда начинается сбор билетов, срок
+    снимается: сбор ограничен своими таймаутами, и прерывать его нельзя.
+    """
+
+    def __init__(self, *,
+                 deadline: float = 300.0,
+                 retries: int = 2,
+                 backoff: float = 5.0,
+                 max_backoff: float = 60.0,
+                 on_hung: Optional[Callable[[], None]] = None,
+                 informer: Informer) -> None:
+        """
+        Инициализатор класса.
+
+        :param deadline: Срок одного сканирования в секундах.
+        :param retries: Сколько раз повторять сканирование после сбоя.
+        :param backoff: Пауза перед первым повтором в секундах.
+        :param max_backoff: Максимальная пауза перед повтором в секундах.
+        :param on_hung: Обработчик зависшего сканирования.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__deadline = deadline
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__on_hung = on_hung
+        self.__informer = informer
+        self.__stopped = threading.Event()
+        # Снятие срока текущей попытки.
+        self.__suspended = threading.Event()
+
+    @property
+    def max_duration(self) -> float:
+        """Наибольшее время всех попыток одного сканирования в секундах"""
+
+        pauses = sum(self._pause(attempt) for attempt in range(self.__retries))
+        return self.__deadline * (self.__retries + 1) + pauses
+
+    def run(self, scan: Callable[[], T]) -> T:
+        """
+        Выполнение сканирования под надзором.
+
+        :param scan: Функция сканирования.
+        :return: Результат сканирования.
+        :raises Exception:
+            Ошибка последней попытки, если повторы исчерпаны, сбой
+            неустраним или надзор остановлен.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return self._run_with_deadline(scan)
+            except ScanCancelled:
+                raise
+            except Exception as e:
+                kind = classify(e)
+                metrics.inc('scan_failures', kind=kind.value)
+                if kind == FailureKind.FATAL or attempt >= self.__retries \
+                        or self.__stopped.is_set():
+                    raise
+
+                pause = self._pause(attempt)
+                self.__informer.push_message(
+                    f'Сбой сканирования ({kind.value}): {describe(e)}. '
+                    f'Повтор через {pause:.0f} с',
+                    Informer.MessageLevel.ERROR,
+                    phase='scan',
+                )
+                attempt += 1
+                if self.__stopped.wait(pause):
+                    raise
+
+    def stop(self) -> None:
+        """
+        Прекращение повторов, например, при остановке бота.
+
+        Ожидание текущей попытки тоже прерывается: сама попытка
+        завершится, когда ее браузер закроют.
+        """
+
+        self.__stopped.set()
+
+    def suspend_deadline(self) -> None:
+        """
+        Снятие срока с текущей попытки.
+
+        Вызывается из сканирования перед сбором билетов: сбор нельзя
+        прерывать закрытием браузера или повтором сканирования. Остановка
+        бота по-прежнему прерывает ожидание попытки.
+        """
+
+        self.__suspended.set()
+
+    def _run_with_deadline(self, scan: Callable[[], T]) -> T:
+        """
+        Выполнение одной попытки сканирования со сроком.
+
+        Python не умеет прерывать поток, поэтому зависшая попытка
+        освобождается обработчиком зависания и завершается сама.
+
+        :raises ScanCancelled: Если надзор остановлен во время попытки.
+        """
+
+        result: Dict[str, Any] = {}
+        finished = threading.Event()
+
+        def _target() -> None:
+            try:
+                result['value'] = scan()
+            except BaseException as e:
+                result['error'] = e
+            finally:
+                finished.set()
+
+        self.__suspended.clear()
+        thread = threading.Thread(target=_target, name='scan', daemon=True)
+        thread.start()
+
+        # Попытку ждем небольшими шагами, чтобы остановка бота не ждала
+        # конца сканирования.
+        deadline = time.monotonic() + self.__deadline
+        while not finished.is_set():
+            if self.__stopped.is_set():
+                raise ScanCancelled('сканирование прервано остановкой бота')
+            if self.__suspended.is_set():
+                finished.wait(0.5)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            finished.wait(min(remaining, 0.5))
+
+        if not finished.is_set():
+            metrics.inc('scan_hung')
+            if self.__on_hung is not None:
+                self.__on_hung()
+            raise ScanDeadlineExceeded(
+                f'сканирование не завершилось за {self.__deadline:.0f} с'
+            )
+        if 'error' in result:
+            raise result['error']
+
+        return result['value']
+
+    def _pause(self, attempt: int) -> float:
+        """Пауза перед повтором с номером attempt, начиная с 0"""
+
+        return min(self.__backoff * 2 ** attempt, self.__max_backoff)
+
+
+class Watchdog:
+    """
+    Класс сторожевого таймера цепочки сканирований.
+
+    Каждое сканирование планирует следующее. Если цепочка прервалась
+    (задача не выполнилась или сканирование зависло намертво), к
+    ожидаемому сроку отметки не будет, и сторож вызовет обработчик, чтобы
+    перезапустить сканирование.
+    """
+
+    def __init__(self, on_stall: Callable[[], None], *,
+                 check_interval: float = 10.0,
+                 informer: Informer) -> None:
+        """
+        Инициализатор класса.
+
+        :param on_stall: Обработчик прерванной цепочки.
+        :param check_interval: Как часто проверять срок в секундах.
+        :param informer: Объект информера для отслеживания состояния бота.
+        """
+
+        self.__on_stall = on_stall
+        self.__check_interval = check_interval
+        self.__informer = informer
+        self.__expected: Optional[dt.datetime] = None
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запуск сторожа"""
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self._run, name='watchdog',
+                                         daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Остановка сторожа"""
+
+        self.__stopped.set()
+        self.expect(None)
+
+    def expect(self, deadline: Optional[dt.datetime]) -> None:
+        """
+        Установка срока следующей отметки.
+
+        :param deadline: Момент, к которому сканирование должно начаться
+            или завершиться. None - ожидание снято.
+        """
+
+        with self.__lock:
+            self.__expected = deadline
+
+    def _run(self) -> None:
+        """Проверка срока в фоне"""
+
+        while not self.__stopped.wait(self.__check_interval):
+            with self.__lock:
+                expected = self.__expected
+                stalled = expected is not None \
+                    and dt.datetime.now() > expected
+                if stalled:
+                    self.__expected = None
+
+            if stalled:
+                metrics.inc('scan_stalls')
+                try:
+                    self.__on_stall()
+                except Exception as e:
+                    self.__informer.push_message(
+                        f'Ошибка перезапуска сканирования: {describe(e)}',
+                        Informer.MessageLevel.ERROR,
+                        phase='scan',
+                    )
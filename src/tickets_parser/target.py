@@ -0,0 +1,160 @@
+import datetime as dt
+from collections import OrderedDict
+from dataclasses import (
+    dataclass,
+    replace,
+)
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+)
+
+
+@dataclass(frozen=True)
+class ObservedTarget:
+    """
+    Наблюдаемые дата и время.
+
+    Описывает один слот, за которым следит наблюдатель, и параметры сбора
+    билетов на него. Слоты разных страниц продуктов (видов экскурсий)
+    наблюдаются одним наблюдателем.
+    """
+
+    # Наблюдаемая дата.
+    observed_date: dt.date
+    # Наблюдаемое время.
+    observed_time: dt.time
+    # Количество билетов, которые необходимо добавить в корзину.
+    count_tickets: int = 1
+    # Брать ли все доступные билеты, которые есть.
+    max_tickets: bool = False
+    # Приоритет слота. Слоты с большим приоритетом собираются первыми.
+    priority: int = 0
+    # URL-адрес страницы продукта. None - основная страница наблюдателя.
+    page: Optional[str] = None
+
+    @property
+    def month(self) -> dt.date:
+        """Первый день месяца наблюдаемой даты"""
+
+        return self.observed_date.replace(day=1)
+
+    def __str__(self) -> str:
+        slot = f'{self.observed_date:%d.%m.%Y} {self.observed_time:%H:%M}'
+        return f'{slot} ({self.page})' if self.page else slot
+
+
+def parse_pages(value: str, main: Optional[str] = None) -> List[str]:
+    """
+    Разбор списка дополнительных страниц продуктов из настроек.
+
+    :param value: URL-адреса через запятую.
+    :param main: Основная страница. В список не попадает.
+    :return: URL-адреса без пустых значений и повторов.
+    """
+
+    pages: List[str] = []
+    for page in value.split(','):
+        page = page.strip()
+        if page and page != main and page not in pages:
+            pages.append(page)
+
+    return pages
+
+
+def spread_pages(targets: Iterable[ObservedTarget],
+                 pages: Sequence[str]) -> List[ObservedTarget]:
+    """
+    Наблюдение слотов без страницы и на дополнительных страницах.
+
+    :param targets: Наблюдаемые слоты.
+    :param pages: Дополнительные страницы продуктов.
+    :return:
+        Слоты, в которых каждый слот без страницы повторен для каждой
+        дополнительной страницы.
+    """
+
+    spread: List[ObservedTarget] = []
+    for target in targets:
+        spread.append(target)
+        if target.page is None:
+            spread.extend(replace(target, page=page) for page in pages)
+
+    return spread
+
+
+def group_by_page(
+        targets: Iterable[ObservedTarget],
+        default: str
+) -> Dict[str, List[ObservedTarget]]:
+    """
+    Группировка слотов по страницам продуктов.
+
+    Каждая страница сканируется в своем браузере со своим календарем.
+
+    :param targets: Наблюдаемые слоты.
+    :param default: Страница слотов, для которых страница не задана.
+    :return: Слоты, сгруппированные по URL-адресам страниц.
+    """
+
+    groups: Dict[str, List[ObservedTarget]] = OrderedDict()
+    for target in targets:
+        groups.setdefault(target.page or default, []).append(target)
+
+    return groups
+
+
+def group_by_month(
+        targets: Iterable[ObservedTarget]
+) -> Dict[dt.date, List[ObservedTarget]]:
+    """
+    Группировка слотов по месяцам.
+
+    Одна загрузка месяца в календаре отвечает сразу на все слоты этого
+    месяца.
+
+    :param targets: Наблюдаемые слоты.
+    :return: Слоты, сгруппированные по месяцам в порядке возрастания.
+    """
+
+    groups: Dict[dt.date, List[ObservedTarget]] = OrderedDict()
+    for target in sorted(targets, key=lambda t: (t.observed_date,
+                                                 t.observed_time)):
+        groups.setdefault(target.month, []).append(target)
+
+    return groups
+
+
+def group_by_date(
+        targets: Iterable[ObservedTarget]
+) -> Dict[dt.date, List[ObservedTarget]]:
+    """
+    Группировка слотов по датам.
+
+    Один список сеансов на дату отвечает сразу на все слоты этой даты.
+
+    :param targets: Наблюдаемые слоты.
+    :return: Слоты, сгруппированные по датам в порядке возрастания.
+    """
+
+    groups: Dict[dt.date, List[ObservedTarget]] = OrderedDict()
+    for target in sorted(targets, key=lambda t: (t.observed_date,
+                                                 t.observed_time)):
+        groups.setdefault(target.observed_date, []).append(target)
+
+    return groups
+
+
+def by_priority(targets: Iterable[ObservedTarget]) -> List[ObservedTarget]:
+    """
+    Сортировка слотов по приоритету.
+
+    :param targets: Наблюдаемые слоты.
+    :return: Слоты от самого важного к наименее важному.
+    """
+
+    return sorted(targets, key=lambda t: (-t.priority, t.observed_date,
+                                          t.observed_time))
@@ -1,12 +1,28 @@
-import time
-import requests
+from concurrent.futures import Future
+from typing import (
+    List,
+    Optional,
+)
 from decouple import config
 from selenium import webdriver
+from selenium.common.exceptions import (
+    TimeoutException,
+    WebDriverException,
+)
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
-from .load_waiting import wait_element
+from .load_waiting import (
+    wait_condition,
+    wait_element,
+)
+from .phase_timer import PhaseTimer
+from .captcha import CaptchaService
 from .informer import Informer
+from .site_profile import (
+    parse_count,
+    site,
+)
 
 
 class TicketCollector:
@@ -21,7 +37,11 @@ class TicketCollector:
                  informer: Informer,
                  count_tickets: int = 1,
                  max_tickets: bool = False,
-                 auto_captcha: bool = False) -> None:
+                 auto_captcha: bool = False,
+                 captcha_service: Optional[CaptchaService] = None,
+                 captcha_token: Optional['Future[str]'] = None,
+                 page_url: Optional[str] = None,
+                 timer: Optional[PhaseTimer] = None) -> None:
         """
         Инициализатор класса.
 
@@ -31,14 +51,36 @@ class TicketCollector:
         :param count_tickets: Количество билетов, которое нужно собрать.
         :param max_tickets: Нужно ли собирать максимальное количесвто билетов.
         :param auto_captcha: Автообход капчи.
+        :param captcha_service:
+            Сервис решения капчи. Обязателен при автообходе капчи.
+            Сервисом владеет вызывающий код: он же его и останавливает.
+        :param captcha_token:
+            Заранее запущенное решение капчи. Если не задано, капча
+            отправляется на решение после добавления билетов в корзину.
+        :param page_url:
+            URL-адрес страницы продукта для решения капчи. По умолчанию -
+            настройка PAGE_URL.
+        :param timer: Объект замера времени этапов.
+        :raises ValueError: Если автообход капчи включен без сервиса.
         """
 
+        if auto_captcha and captcha_service is None \
+                and captcha_token is None:
+            raise ValueError('Для автообхода капчи нужен сервис решения капчи')
+
         self.__driver = driver
         self.__time_info = time_info
+        # Кнопка открытия модального окна нужна и для подсчета билетов,
+        # и для сбора, поэтому ищется один раз.
+        self.__modal_btn = site['buy_button'].find(time_info)
         self.__max_tickets = self._parse_max_tickets()
         self.__count_tickets = count_tickets
         self.__auto_captcha = auto_captcha
+        self.__captcha_service = captcha_service
+        self.__captcha_token = captcha_token
+        self.__page_url = page_url
         self.__informer = informer
+        self.__timer = timer or PhaseTimer()
 
         # Настройка количества билетов, которые нужно купить.
         if max_tickets or self.__count_tickets > self.__max_tickets:
@@ -51,66 +93,73 @@ class TicketCollector:
         :return: Максимально количество билетов.
         """
 
-        # Получение кнопки для открытия модального окна.
-        open_modal_btn = self.__time_info.find_element(
-            By.CSS_SELECTOR,
-            '.btn-modalproduct.btn.btn-success.btn-block.showPerformance',
-        )
-        # Получение кол-ва доступных билетов.
-        count_allowed_tickets_str = open_modal_btn.find_element(
-            By.TAG_NAME, 'span'
-        ).text
-
-        # Убираем скобки (первый и последний символы) и конвертируем строку
-        # в число.
-        count_allowed_tickets = int(
-            count_allowed_tickets_str[1:len(count_allowed_tickets_str) - 1]
-        )
+        # Количество доступных билетов указано в кнопке в скобках.
+        count_element = site['row_count'].find_all(self.__time_info)
+        count_text = count_element[0].text if count_element \
+            else self.__modal_btn.text
 
-        return count_allowed_tickets
+        return parse_count(count_text) or 0
+
+    @property
+    def count_tickets(self) -> int:
+        """Количество билетов, которое добавляется в корзину"""
+
+        return self.__count_tickets
 
     def start_collect(self) -> None:
         """Процесс добавления билетов в корзину"""
 
+        self.add_to_cart()
+        self.solve_captcha()
+
+    def add_to_cart(self) -> None:
+        """Открытие модального окна и добавление билетов в корзину"""
+
         self.__informer.push_message(
             'Начало сбора билетов в корзину...',
             Informer.MessageLevel.INFO,
         )
 
         # Открываем модальное окно, щелкая по кнопке.
-        modal_btn = self.__time_info.find_element(
-            By.CSS_SELECTOR,
-            '.btn-modalproduct.btn.btn-success.btn-block.showPerformance'
-        )
-        webdriver.ActionChains(self.__driver).click(modal_btn).perform()
-
-        # Ждем загрузки доступных билетов.
-        wait_element(self.__driver, By.CLASS_NAME, 'productrow')
+        with self.__timer.phase('modal_open'):
+            webdriver.ActionChains(self.__driver) \
+                .click(self.__modal_btn).perform()
+
+            # Ждем загрузки доступных билетов.
+            try:
+                wait_element(self.__driver, By.CSS_SELECTOR,
+                             site['modal_product'].css,
+                             name='modal_products')
+            except TimeoutException:
+                self._report_missing(['modal', 'modal_product'])
+                raise
 
         # Указание количества билетов, которые надо добавить в корзину,
         # в поле ввода.
-        input_count_tickets = self.__driver.find_element(
-            By.ID,
-            'qB6B0B700-CEEA-3087-359F-016CB3FAF5CB',
-        )
-        input_count_tickets.clear()
-        input_count_tickets.send_keys(self.__count_tickets)
+        with self.__timer.phase('quantity'):
+            input_count_tickets = site['quantity_input'].find(self.__driver)
+            input_count_tickets.clear()
+            input_count_tickets.send_keys(self.__count_tickets)
+
+        with self.__timer.phase('add_to_cart'):
+            # Прокручиваем страницу вниз до кнопки добавления в корзину.
+            self.__driver.execute_script(
+                'var modal = document.querySelector(arguments[0]);'
+                'if (modal) { modal.scrollTo(0, document.body.scrollHeight); }',
+                site['modal'].css,
+            )
 
-        # Прокручиваем страницу вниз до кнопки добавления в корзину.
-        self.__driver.execute_script(
-            'document.getElementById("myModal").scrollTo(0, document.body.scrollHeight);'
-        )
+            # Добавим выбранные билеты в корзину, нажав на кнопку добавления.
+            add_to_cart_btn = site['add_to_cart'].find(self.__driver)
+            webdriver.ActionChains(self.__driver).click(add_to_cart_btn).perform()
 
-        # Добавим выбранные билеты в корзину, нажав на кнопку добавления.
-        add_to_cart_btn = self.__driver.find_element(
-            By.CSS_SELECTOR,
-            '.btn.btn-primary.addtocart',
-        )
-        webdriver.ActionChains(self.__driver).click(add_to_cart_btn).perform()
+    def solve_captcha(self) -> None:
+        """Решение капчи после добавления билетов в корзину"""
 
         # Решаем капчу, если задан автообход капчи.
         if self.__auto_captcha:
-            self._start_solve_captcha()
+            with self.__timer.phase('captcha'):
+                self._start_solve_captcha()
 
     def _start_solve_captcha(self) -> None:
         """Метод решения рекапчи"""
@@ -120,53 +169,51 @@ class TicketCollector:
             Informer.MessageLevel.INFO,
         )
 
-        # Собираем нужные параметры из файла с переменными окружения.
-        API_KEY = config('API_KEY')
-        DATA_SITE_KEY = config('DATA_SITE_KEY')
-        PAGE_URL = config('PAGE_URL')
-
-        # Составляем нужный URL-сервиса для запроса на решение капчи.
-        service_url = f'http://2captcha.com/in.php?key={API_KEY}' \
-                      f'&method=userrecaptcha&googlekey={DATA_SITE_KEY}' \
-                      f'&pageurl={PAGE_URL}&json=1'
-        # Посылаем запрос на решение капчи и делаем timeout.
-        response = requests.post(service_url)
-        time.sleep(20)
-        # Если капча успешно принята в обработку, вернет ее id.
-        print(response.json())
-
-        # Составляем URL для получения решения капчи.
-        captcha_id = response.json().get('request')
-        resolve_url = f'http://2captcha.com/res.php?key={API_KEY}' \
-                     f'&action=get&id={int(captcha_id)}&json=1'
-        time.sleep(5)
-
-        # Посылаем запросы до тех пор, пока не получим решение капчи
-        # от сервиса.
-        while True:
-            response = requests.get(resolve_url)
-            self.__informer.push_message(
-                'Капча решается...',
-                Informer.MessageLevel.INFO,
+        # Если решение не запрошено заранее, запрашиваем его сейчас.
+        captcha_token = self.__captcha_token
+        if captcha_token is None:
+            captcha_token = self.__captcha_service.solve_async(
+                config('DATA_SITE_KEY'),
+                self.__page_url or config('PAGE_URL'),
             )
-            if response.json().get('status') == 1:
-                self.__informer.push_message(
-                    'Капча решена!',
-                    Informer.MessageLevel.INFO,
-                )
-                captcha_resolve_token = response.json().get('request')
-                break
-            time.sleep(5)
-
-        # Вставляем в скрытое поле решения капчи наше решение.
+
+        # Дожидаемся решения. Срок решения ограничен самим сервисом капчи.
+        captcha_resolve_token = captcha_token.result()
+
+        # Вставляем в скрытое поле решения капчи наше решение и дожидаемся,
+        # пока оно окажется в поле.
+        captcha_response = site['captcha_response'].css
         self.__driver.execute_script(
-            f'document.getElementById("g-recaptcha-response")'
-            f'.innerHTML="{captcha_resolve_token}";'
+            'document.querySelector(arguments[0]).innerHTML = arguments[1];',
+            captcha_response, captcha_resolve_token,
+        )
+        wait_condition(
+            lambda: self.__driver.execute_script(
+                'return document.querySelector(arguments[0]).value;',
+                captcha_response,
+            ) == captcha_resolve_token,
+            timeout=5,
+            name='captcha_token_set',
         )
-        time.sleep(3)
         # С помощью callback-функции, встроенной на сайт, отправляем решение
         # капчи на сервер.
         self.__driver.execute_script(
             f"___grecaptcha_cfg.clients['0']['L']['L']['callback']"
             f"('{captcha_resolve_token}')"
         )
+
+    def _report_missing(self, names: List[str]) -> None:
+        """Сообщение о пропавших со страницы элементах модального окна"""
+
+        try:
+            missing = site.missing(self.__driver, names)
+        except WebDriverException:
+            return
+
+        if missing:
+            self.__informer.push_message(
+                f'В модальном окне нет элементов: {", ".join(missing)}. '
+                f'Возможно, сайт изменил разметку',
+                Informer.MessageLevel.ERROR,
+                phase='collect',
+            )
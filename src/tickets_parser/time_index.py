@@ -0,0 +1,169 @@
+import bisect
+import threading
+import datetime as dt
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    Optional,
+)
+
+
+@dataclass(frozen=True)
+class PageRange:
+    """Первое и последнее время на странице списка сеансов"""
+
+    first: dt.time
+    last: dt.time
+
+    def __contains__(self, time: dt.time) -> bool:
+        return self.first <= time <= self.last
+
+
+def page_range(times: Iterable[dt.time]) -> Optional[PageRange]:
+    """
+    Диапазон времен страницы.
+
+    :param times: Времена строк страницы.
+    :return: Диапазон времен, либо None, если страница пуста.
+    """
+
+    times = list(times)
+    if not times:
+        return None
+
+    return PageRange(first=min(times), last=max(times))
+
+
+def search_page(time: dt.time, pages: int,
+                known: Dict[int, PageRange],
+                hint: Optional[int] = None) -> Optional[int]:
+    """
+    Выбор страницы для проверки времени двоичным поиском.
+
+    Времена в списке сеансов идут по возрастанию, поэтому каждая
+    просмотренная страница сужает промежуток страниц, на которых может
+    быть время.
+
+    :param time: Искомое время.
+    :param pages: Общее количество страниц.
+    :param known: Диапазоны уже просмотренных страниц, начиная с 0.
+    :param hint:
+        Страница, на которой время было раньше. Если она уже просмотрена,
+        выбирается ближайшая к ней из оставшихся, т.к. времена сдвигаются
+        между страницами ненамного.
+    :return:
+        Номер страницы, на которой время есть или которую нужно
+        просмотреть следующей. None - времени в списке нет.
+    """
+
+    low, high = 0, pages - 1
+    for page, bounds in known.items():
+        if time in bounds:
+            return page
+        if time < bounds.first:
+            high = min(high, page - 1)
+        else:
+            low = max(low, page + 1)
+
+    if low > high:
+        return None
+    if hint is None:
+        return (low + high) // 2
+
+    return min(max(hint, low), high)
+
+
+class TimePageIndex:
+    """
+    Класс индекса страниц списка сеансов.
+
+    Хранит для каждой даты первое и последнее время на каждой странице
+    списка сеансов. При следующем сканировании по индексу сразу
+    выбирается страница, на которой должно быть нужное время, и список
+    переключается прямо на нее, без просмотра предыдущих страниц. Индекс
+    только подсказывает страницу: итог всегда проверяется по свежей
+    странице.
+    """
+
+    def __init__(self) -> None:
+        """Инициализатор класса"""
+
+        # Количество страниц и диапазоны времен страниц по датам.
+        self.__pages: Dict[dt.date, int] = {}
+        self.__ranges: Dict[dt.date, Dict[int, PageRange]] = {}
+        self.__lock = threading.Lock()
+
+    def update(self, day: dt.date, pages: int, page: int,
+               times: Iterable[dt.time]) -> None:
+        """
+        Запись просмотренной страницы.
+
+        :param day: Дата сеансов.
+        :param pages: Общее количество страниц списка.
+        :param page: Номер страницы, начиная с 0.
+        :param times: Времена строк страницы.
+        """
+
+        bounds = page_range(times)
+        with self.__lock:
+            # Если изменилось количество страниц, времена сдвинулись, и
+            # старые диапазоны больше не подходят.
+            if self.__pages.get(day) != pages:
+                self.__pages[day] = pages
+                self.__ranges[day] = {}
+            if bounds is not None:
+                self.__ranges[day][page] = bounds
+            else:
+                self.__ranges[day].pop(page, None)
+
+    def guess(self, day: dt.date, pages: int,
+              time: dt.time) -> Optional[int]:
+        """
+        Подсказка страницы, на которой должно быть время.
+
+        :param day: Дата сеансов.
+        :param pages: Текущее количество страниц списка.
+        :param time: Искомое время.
+        :return:
+            Страница, на которой время было, либо на границе которой оно
+            должно появиться. None - индекс по дате пуст, устарел или
+            страница времени по нему не определяется.
+        """
+
+        with self.__lock:
+            if self.__pages.get(day) != pages or not self.__ranges.get(day):
+                return None
+            ranges = sorted(self.__ranges[day].items())
+
+        firsts = [bounds.first for _, bounds in ranges]
+        position = bisect.bisect_right(firsts, time) - 1
+        if position < 0:
+            # Время раньше всех известных: подходит только первая страница.
+            return 0 if ranges[0][0] == 0 else None
+
+        page, bounds = ranges[position]
+        if time <= bounds.last or page == pages - 1:
+            return page
+        # Время между страницами определяется, только если следующая
+        # страница тоже известна. Иначе оно может быть на любой из
+        # непросмотренных страниц.
+        if position + 1 < len(ranges) and ranges[position + 1][0] == page + 1:
+            return page
+
+        return None
+
+    def forget(self, day: Optional[dt.date] = None) -> None:
+        """
+        Удаление индекса даты.
+
+        :param day: Дата сеансов. None - все даты.
+        """
+
+        with self.__lock:
+            if day is None:
+                self.__pages.clear()
+                self.__ranges.clear()
+            else:
+                self.__pages.pop(day, None)
+                self.__ranges.pop(day, None)
@@ -0,0 +1,240 @@
+import queue
+import multiprocessing as mp
+from typing import (
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from .informer import (
+    Informer,
+    InformerEvent,
+)
+from .log_sinks import Sink
+from .target import ObservedTarget
+
+
+class StatusEvent(NamedTuple):
+    """Сообщение о состоянии бота из рабочего процесса"""
+
+    # Идентификатор рабочего процесса.
+    worker_id: int
+    event: InformerEvent
+
+
+class QueueSink(Sink):
+    """
+    Приемник сообщений рабочего процесса.
+
+    Не пишет сообщения сам, а отправляет их в очередь родительскому
+    процессу, который выводит их пользователю и в лог.
+    """
+
+    def __init__(self, worker_id: int, status_queue: 'mp.Queue') -> None:
+        """
+        Инициализатор класса.
+
+        :param worker_id: Идентификатор рабочего процесса.
+        :param status_queue: Очередь сообщений о состоянии.
+        """
+
+        self.__worker_id = worker_id
+        self.__status_queue = status_queue
+
+    def write(self, events: List[InformerEvent]) -> None:
+        for event in events:
+            self.__status_queue.put(StatusEvent(self.__worker_id, event))
+
+
+def run_observer(worker_id: int,
+                 url: str,
+                 targets: List[ObservedTarget],
+                 auto_captcha: bool,
+                 probe_mode: bool,
+                 status_queue: 'mp.Queue',
+                 targets_queue: 'mp.Queue',
+                 stop_event: 'mp.Event') -> None:
+    """
+    Точка входа рабочего процесса.
+
+    Запускает наблюдатель и работает до сигнала остановки, либо пока
+    наблюдатель не остановится сам. Новые слоты из очереди добавляются в
+    работающий наблюдатель.
+
+    :param worker_id: Идентификатор рабочего процесса.
+    :param url: URL-адрес наблюдаемой страницы.
+    :param targets: Наблюдаемые слоты.
+    :param auto_captcha: Автообход капчи.
+    :param probe_mode: Проверять билеты HTTP-запросами.
+    :param status_queue: Очередь сообщений о состоянии.
+    :param targets_queue: Очередь новых слотов.
+    :param stop_event: Событие остановки.
+    """
+
+    # Наблюдатель импортируется здесь, чтобы родительский процесс не
+    # загружал selenium и остальные зависимости движка.
+    from decouple import config
+    from .observer import Observer
+
+    informer = Informer(
+        [QueueSink(worker_id, status_queue)],
+        repeat_interval=config('LOG_REPEAT_INTERVAL', default=300.0,
+                               cast=float),
+    )
+    observer = Observer(
+        url=url,
+        targets=targets,
+        auto_captcha=auto_captcha,
+        informer=informer,
+        probe_mode=probe_mode,
+    )
+    try:
+        observer.start()
+        while observer.worked and not stop_event.wait(timeout=0.5):
+            try:
+                observer.add_targets(targets_queue.get_nowait())
+            except queue.Empty:
+                pass
+    finally:
+        # Наблюдатель, остановившийся из-за неустранимой ошибки, тоже
+        # держит браузеры, поэтому stop() вызывается всегда.
+        observer.stop()
+        # Процесс завершается без обработчиков atexit, поэтому оставшиеся
+        # сообщения отправляются явно.
+        informer.close()
+
+
+class ObserverWorker:
+    """
+    Класс рабочего процесса наблюдателя.
+
+    Запускает наблюдатель в отдельном процессе, чтобы сканирование и сбор
+    билетов не блокировали интерфейс и могли выполняться параллельно на
+    нескольких ядрах. Сообщения о состоянии приходят через общую очередь.
+    Новые слоты можно добавить в уже запущенный процесс, чтобы они
+    сканировались теми же браузерами.
+    """
+
+    # Сколько секунд ждать штатной остановки процесса.
+    STOP_TIMEOUT = 30.0
+
+    def __init__(self, worker_id: int, status_queue: 'mp.Queue') -> None:
+        """
+        Инициализатор класса.
+
+        :param worker_id: Идентификатор рабочего процесса.
+        :param status_queue: Общая очередь сообщений о состоянии.
+        """
+
+        self.__worker_id = worker_id
+        self.__status_queue = status_queue
+        self.__context = mp.get_context('spawn')
+        self.__stop_event = self.__context.Event()
+        self.__targets_queue = self.__context.Queue()
+        self.__process: Optional[mp.Process] = None
+        self.__auto_captcha = False
+
+    @property
+    def worker_id(self) -> int:
+        """Идентификатор рабочего процесса"""
+
+        return self.__worker_id
+
+    @property
+    def alive(self) -> bool:
+        """Работает ли процесс"""
+
+        return self.__process is not None and self.__process.is_alive()
+
+    @property
+    def auto_captcha(self) -> bool:
+        """Решает ли наблюдатель процесса капчу автоматически"""
+
+        return self.__auto_captcha
+
+    def add_targets(self, targets: List[ObservedTarget]) -> None:
+        """
+        Добавление слотов в запущенный процесс.
+
+        :param targets: Новые слоты.
+        """
+
+        self.__targets_queue.put(list(targets))
+
+    def start(self, url: str,
+              targets: List[ObservedTarget],
+              auto_captcha: bool = False,
+              probe_mode: bool = False) -> None:
+        """
+        Запуск рабочего процесса.
+
+        :param url: URL-адрес наблюдаемой страницы.
+        :param targets: Наблюдаемые слоты.
+        :param auto_captcha: Автообход капчи.
+        :param probe_mode: Проверять билеты HTTP-запросами.
+        """
+
+        if self.alive:
+            return
+
+        self.__stop_event.clear()
+        self.__auto_captcha = auto_captcha
+        self.__process = self.__context.Process(
+            target=run_observer,
+            args=(self.__worker_id, url, targets, auto_captcha, probe_mode,
+                  self.__status_queue, self.__targets_queue,
+                  self.__stop_event),
+            name=f'observer-{self.__worker_id}',
+            daemon=False,
+        )
+        self.__process.start()
+
+    def request_stop(self) -> None:
+        """
+        Сигнал остановки рабочему процессу без ожидания.
+
+        Наблюдатель прерывает сканирование и закрывает браузеры, после
+        чего процесс завершается сам.
+        """
+
+        self.__stop_event.set()
+
+    def stop(self) -> None:
+        """
+        Штатная остановка рабочего процесса.
+
+        Ждет завершения процесса, поэтому из потока интерфейса не
+        вызывается.
+        """
+
+        if self.__process is None:
+            return
+
+        self.__stop_event.set()
+        self.__process.join(timeout=self.STOP_TIMEOUT)
+        if self.__process.is_alive():
+            self.__process.terminate()
+            self.__process.join()
+        self.__process = None
+
+
+def create_status_queue() -> 'mp.Queue':
+    """Создание очереди сообщений, общей для всех рабочих процессов"""
+
+    return mp.get_context('spawn').Queue()
+
+
+def get_status_event(status_queue: 'mp.Queue',
+                     timeout: float = 0.1) -> Optional[StatusEvent]:
+    """
+    Получение одного сообщения из очереди.
+
+    :param status_queue: Очередь сообщений о состоянии.
+    :param timeout: Сколько секунд ждать сообщение.
+    :return: Сообщение, либо None, если сообщений нет.
+    """
+
+    try:
+        return status_queue.get(timeout=timeout)
+    except queue.Empty:
+        return None
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+TESTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(TESTS_DIR.parent / 'src'))
+
+
+@pytest.fixture
+def fixture_text():
+    """Чтение файла из tests/fixtures"""
+
+    def read(name: str) -> str:
+        return (TESTS_DIR / 'fixtures' / name).read_text(encoding='utf-8')
+
+    return read
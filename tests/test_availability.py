@@ -0,0 +1,47 @@
+import datetime as dt
+
+from tickets_parser.availability import (
+    AvailabilitySnapshot,
+    ChangeKind,
+)
+
+
+DAY = dt.date(2026, 12, 1)
+MORNING = dt.time(10, 0)
+NOON = dt.time(12, 0)
+EVENING = dt.time(18, 0)
+
+
+def test_update_times_reports_disappeared_time_as_sold_out():
+    snapshot = AvailabilitySnapshot()
+    snapshot.update_times(DAY, {MORNING: 3, NOON: 2}, section=0)
+
+    changes = snapshot.update_times(DAY, {MORNING: 3}, section=0)
+
+    assert [(change.kind, change.time, change.previous, change.current)
+            for change in changes] == [(ChangeKind.SOLD_OUT, NOON, 2, 0)]
+    assert snapshot.count(DAY, NOON) is None
+
+
+def test_update_times_time_moved_to_other_page_is_not_sold_out():
+    snapshot = AvailabilitySnapshot()
+    snapshot.update_times(DAY, {MORNING: 3, NOON: 2}, section=0)
+    snapshot.update_times(DAY, {EVENING: 1}, section=1)
+
+    # Утренний сеанс прошел, и вечерний сдвинулся на первую страницу.
+    first = snapshot.update_times(DAY, {NOON: 2, EVENING: 1}, section=0)
+    second = snapshot.update_times(DAY, {}, section=1)
+
+    assert [change.time for change in first] == [MORNING]
+    assert second == []
+    assert snapshot.count(DAY, EVENING) == 1
+
+
+def test_update_times_unknown_count_keeps_time():
+    snapshot = AvailabilitySnapshot()
+    snapshot.update_times(DAY, {MORNING: 3})
+
+    changes = snapshot.update_times(DAY, {MORNING: None})
+
+    assert changes == []
+    assert snapshot.count(DAY, MORNING) == 3
@@ -0,0 +1,283 @@
+import time
+from concurrent.futures import Future
+from typing import (
+    List,
+    Optional,
+)
+
+import pytest
+import requests
+
+from tickets_parser import captcha_token_pool
+from tickets_parser.captcha import (
+    CaptchaError,
+    CaptchaService,
+    TwoCaptchaSolver,
+)
+from tickets_parser.captcha_token_pool import CaptchaTokenPool
+
+
+class FakeResponse:
+    """Ответ сервиса капчи"""
+
+    def __init__(self, payload=None, status_code: int = 200) -> None:
+        self.status_code = status_code
+        self.__payload = payload
+
+    def json(self):
+        if self.__payload is None:
+            raise ValueError('not json')
+        return self.__payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+class FakeSession:
+    """HTTP-сессия с заранее заданными ответами или исключениями"""
+
+    def __init__(self, *responses) -> None:
+        self.responses = list(responses)
+        # Запросы в порядке выполнения: метод, адрес и параметры.
+        self.requests: List[tuple] = []
+
+    def request(self, method, url, params=None, timeout=None):
+        self.requests.append((method, url, dict(params or {})))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def mount(self, prefix, adapter) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def make_solver(*responses) -> TwoCaptchaSolver:
+    return TwoCaptchaSolver('key', 'http://captcha/',
+                            session=FakeSession(*responses))
+
+
+def make_service(solver: TwoCaptchaSolver, **kwargs) -> CaptchaService:
+    options = dict(initial_delay=0.0, poll_interval=0.01,
+                   max_poll_interval=0.01, deadline=5.0)
+    options.update(kwargs)
+    return CaptchaService(solver, **options)
+
+
+def test_submit_returns_task_id():
+    session = FakeSession(FakeResponse({'status': 1, 'request': 42}))
+    solver = TwoCaptchaSolver('key', 'http://captcha/', session=session)
+
+    assert solver.submit('site-key', 'http://page') == '42'
+    method, url, params = session.requests[0]
+    assert (method, url) == ('post', 'http://captcha/in.php')
+    assert params['googlekey'] == 'site-key'
+    assert params['pageurl'] == 'http://page'
+
+
+@pytest.mark.parametrize('code, fatal', [
+    ('ERROR_ZERO_BALANCE', True),
+    ('ERROR_WRONG_USER_KEY', True),
+    ('ERROR_NO_SLOT_AVAILABLE', False),
+])
+def test_submit_rejected(code, fatal):
+    solver = make_solver(FakeResponse({'status': 0, 'request': code}))
+
+    with pytest.raises(CaptchaError) as error:
+        solver.submit('site-key', 'http://page')
+
+    assert error.value.code == code
+    assert error.value.fatal is fatal
+
+
+@pytest.mark.parametrize('response', [
+    requests.ConnectionError('refused'),
+    requests.Timeout('timeout'),
+    FakeResponse(status_code=502),
+    FakeResponse(payload=None),
+])
+def test_network_errors_have_no_code(response):
+    solver = make_solver(response)
+
+    with pytest.raises(CaptchaError) as error:
+        solver.submit('site-key', 'http://page')
+
+    assert error.value.code is None
+    assert not error.value.fatal
+
+
+def test_poll_maps_answers():
+    solver = make_solver(
+        FakeResponse({'status': 0, 'request': 'CAPCHA_NOT_READY'}),
+        FakeResponse({'status': 1, 'request': 'token'}),
+        FakeResponse({'status': 0, 'request': 'ERROR_CAPTCHA_UNSOLVABLE'}),
+    )
+
+    assert solver.poll('42') is None
+    assert solver.poll('42') == 'token'
+    with pytest.raises(CaptchaError) as error:
+        solver.poll('42')
+    assert error.value.code == 'ERROR_CAPTCHA_UNSOLVABLE'
+
+
+def test_solve_keeps_polling_after_network_error():
+    solver = make_solver(
+        FakeResponse({'status': 1, 'request': 42}),
+        FakeResponse({'status': 0, 'request': 'CAPCHA_NOT_READY'}),
+        requests.ConnectionError('reset'),
+        FakeResponse(status_code=503),
+        FakeResponse({'status': 1, 'request': 'token'}),
+    )
+
+    assert make_service(solver).solve('site-key', 'http://page') == 'token'
+
+
+def test_solve_stops_on_service_error():
+    solver = make_solver(
+        FakeResponse({'status': 1, 'request': 42}),
+        FakeResponse({'status': 0, 'request': 'ERROR_CAPTCHA_UNSOLVABLE'}),
+    )
+
+    with pytest.raises(CaptchaError) as error:
+        make_service(solver).solve('site-key', 'http://page')
+
+    assert error.value.code == 'ERROR_CAPTCHA_UNSOLVABLE'
+
+
+def test_solve_times_out():
+    not_ready = FakeResponse({'status': 0, 'request': 'CAPCHA_NOT_READY'})
+    solver = make_solver(FakeResponse({'status': 1, 'request': 42}),
+                         *[not_ready] * 1000)
+
+    with pytest.raises(CaptchaError, match='не решена'):
+        make_service(solver, deadline=0.05).solve('site-key', 'http://page')
+
+
+def test_shutdown_cancels_running_solve():
+    not_ready = FakeResponse({'status': 0, 'request': 'CAPCHA_NOT_READY'})
+    solver = make_solver(FakeResponse({'status': 1, 'request': 42}),
+                         *[not_ready] * 10)
+    service = make_service(solver, initial_delay=60.0, deadline=120.0)
+
+    future = service.solve_async('site-key', 'http://page')
+    time.sleep(0.05)
+    started = time.monotonic()
+    service.shutdown()
+
+    with pytest.raises(CaptchaError, match='отменено'):
+        future.result(timeout=5)
+    assert time.monotonic() - started < 5
+
+
+class FakeService:
+    """Сервис капчи, решения которого задает тест"""
+
+    def __init__(self) -> None:
+        self.futures: List['Future[str]'] = []
+
+    def solve_async(self, site_key: str, page_url: str) -> 'Future[str]':
+        future: 'Future[str]' = Future()
+        self.futures.append(future)
+        return future
+
+
+class FakeTime:
+    """Управляемые часы для проверки срока жизни токенов"""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def solved(token: Optional[str] = None,
+           error: Optional[Exception] = None) -> 'Future[str]':
+    future: 'Future[str]' = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(token)
+    return future
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeTime:
+    fake = FakeTime()
+    monkeypatch.setattr(captcha_token_pool, 'time', fake)
+    return fake
+
+
+def make_pool(service: FakeService, **kwargs) -> CaptchaTokenPool:
+    return CaptchaTokenPool(service, 'site-key', 'http://page',
+                            ttl=120.0, safety_margin=20.0, **kwargs)
+
+
+def test_pool_take_returns_oldest_fresh_token(clock):
+    pool = make_pool(FakeService(), size=2)
+    pool._on_solved(solved('first'))
+    clock.now += 10
+    pool._on_solved(solved('second'))
+
+    assert pool.take() == 'first'
+    assert pool.take() == 'second'
+    assert pool.take() is None
+    assert pool.metrics['hits'] == 2
+    assert pool.metrics['misses'] == 1
+
+
+def test_pool_drops_expired_tokens(clock):
+    pool = make_pool(FakeService())
+    pool._on_solved(solved('old'))
+    clock.now += 99
+    pool._on_solved(solved('fresh'))
+
+    # Срок жизни - ttl минус запас, то есть 100 секунд.
+    clock.now += 1
+    assert pool.take() == 'fresh'
+    assert pool.metrics['wasted'] == 1
+
+
+def test_pool_take_future_solves_on_miss(clock):
+    service = FakeService()
+    pool = make_pool(service)
+
+    future = pool.take_future()
+
+    assert service.futures == [future]
+    assert pool.metrics['spent'] == 1
+
+    pool._on_solved(solved('token'))
+    assert pool.take_future().result(timeout=0) == 'token'
+
+
+def test_pool_counts_failures_and_resets_on_success(clock):
+    pool = make_pool(FakeService())
+
+    pool._on_solved(solved(error=CaptchaError('нет слотов')))
+    pool._on_solved(solved(error=CaptchaError('нет слотов')))
+    assert pool.metrics['failures'] == 2
+    assert pool.metrics['ready'] == 0
+
+    pool._on_solved(solved('token'))
+    assert pool.metrics['failures'] == 0
+    assert pool.metrics['ready'] == 1
+
+
+def test_pool_refills_in_background():
+    service = FakeService()
+    pool = make_pool(service, size=1)
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not service.futures and time.monotonic() < deadline:
+            time.sleep(0.01)
+        service.futures[0].set_result('token')
+
+        assert pool.take() == 'token'
+    finally:
+        pool.stop()
@@ -0,0 +1,242 @@
+import datetime as dt
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import pytest
+import requests
+from lxml import html
+
+from tickets_parser.availability import AvailabilitySnapshot
+from tickets_parser.http_probe import (
+    HttpProbe,
+    ProbeResult,
+)
+from tickets_parser.target import ObservedTarget
+
+
+DAY = dt.date(2026, 12, 1)
+CALENDAR_URL = 'http://site/calendar/{month}/{year}'
+PERFORMANCES_URL = 'http://site/performances/{date}/{page}'
+MODIFIED = 'Tue, 01 Dec 2026 10:00:00 GMT'
+
+
+class FakeResponse:
+    """Ответ сервера с заданными статусом, заголовками и телом"""
+
+    def __init__(self, text: str = '', status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None,
+                 payload=None) -> None:
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.__payload = payload
+
+    def json(self):
+        return self.__payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+class FakeSession:
+    """HTTP-сессия, отдающая заранее заданные ответы по адресам"""
+
+    def __init__(self, responses: Dict[str, List[FakeResponse]]) -> None:
+        self.responses = {url: list(items) for url, items in responses.items()}
+        # Запросы в порядке выполнения: адрес и заголовки.
+        self.requests: List[tuple] = []
+
+    def get(self, url, headers=None, timeout=None) -> FakeResponse:
+        self.requests.append((url, dict(headers or {})))
+        return self.responses[url].pop(0)
+
+    def mount(self, prefix, adapter) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def performances_url(page: int) -> str:
+    return PERFORMANCES_URL.format(date=DAY.strftime('%d/%m/%Y'), page=page)
+
+
+def make_probe(responses: Dict[str, List[FakeResponse]],
+               snapshot: Optional[AvailabilitySnapshot] = None
+               ) -> HttpProbe:
+    return HttpProbe(CALENDAR_URL, PERFORMANCES_URL,
+                     session=FakeSession(responses), snapshot=snapshot)
+
+
+def test_parse_calendar(fixture_text):
+    document = html.fromstring(fixture_text('calendar.html'))
+
+    days = make_probe({})._parse_calendar(document)
+
+    assert days == {
+        dt.date(2026, 12, 1): True,
+        dt.date(2026, 12, 2): False,
+        dt.date(2026, 12, 3): True,
+    }
+
+
+def test_parse_performances(fixture_text):
+    document = html.fromstring(fixture_text('performances_page1.html'))
+
+    performances = HttpProbe._parse_performances(document)
+
+    # Строка без количества на кнопке считается строкой без билетов, а
+    # строка без времени пропускается.
+    assert performances == {dt.time(10, 0): 12, dt.time(10, 30): 0}
+
+
+def test_count_pages(fixture_text):
+    document = html.fromstring(fixture_text('performances_page1.html'))
+
+    assert HttpProbe._count_pages(document) == 2
+    assert HttpProbe._count_pages(html.fromstring('<div></div>')) == 1
+
+
+def test_find_times_stops_on_first_page(fixture_text):
+    probe = make_probe({
+        performances_url(1): [FakeResponse(fixture_text(
+            'performances_page1.html'
+        ))],
+    })
+
+    found = probe.find_times(DAY, {dt.time(10, 0)})
+
+    assert found == {dt.time(10, 0): 12}
+    assert [url for url, _ in probe.session.requests] \
+        == [performances_url(1)]
+
+
+def test_find_times_follows_pagination(fixture_text):
+    probe = make_probe({
+        performances_url(1): [FakeResponse(fixture_text(
+            'performances_page1.html'
+        ))],
+        performances_url(2): [FakeResponse(fixture_text(
+            'performances_page2.html'
+        ))],
+    })
+
+    found = probe.find_times(
+        DAY, {dt.time(10, 30), dt.time(11, 30), dt.time(12, 0)},
+    )
+
+    assert found == {dt.time(10, 30): 0, dt.time(11, 30): 1}
+    assert [url for url, _ in probe.session.requests] \
+        == [performances_url(1), performances_url(2)]
+
+
+def test_check_many_fetches_calendar_and_date_once(fixture_text):
+    calendar_url = CALENDAR_URL.format(month=12, year=2026)
+    probe = make_probe({
+        calendar_url: [FakeResponse(fixture_text('calendar.html'))],
+        performances_url(1): [FakeResponse(fixture_text(
+            'performances_page1.html'
+        ))],
+    })
+    morning = ObservedTarget(DAY, dt.time(10, 0))
+    sold_out = ObservedTarget(DAY, dt.time(10, 30))
+    closed = ObservedTarget(dt.date(2026, 12, 2), dt.time(10, 0))
+
+    results = probe.check_many([morning, sold_out, closed])
+
+    assert results[morning].hit
+    assert results[morning].count_tickets == 12
+    assert results[sold_out] == ProbeResult(date_available=True,
+                                            time_available=True)
+    assert results[closed] == ProbeResult()
+    assert [url for url, _ in probe.session.requests] \
+        == [calendar_url, performances_url(1)]
+
+
+@pytest.mark.parametrize('payload, expected', [
+    ('<div>1</div>', '<div>1</div>'),
+    ({'html': '<div>1</div>'}, '<div>1</div>'),
+    ({'data': {'content': '<div>2</div>'}}, '<div>2</div>'),
+    ({'result': ['<div>1</div>', {'html': '<div>2</div>'}]},
+     '<div>1</div><div>2</div>'),
+    (None, ''),
+    ({'other': 1}, '{"other": 1}'),
+])
+def test_extract_markup(payload, expected):
+    assert HttpProbe._extract_markup(payload) == expected
+
+
+def test_fetch_json_payload(fixture_text):
+    probe = make_probe({
+        CALENDAR_URL.format(month=12, year=2026): [FakeResponse(
+            headers={'Content-Type': 'application/json; charset=utf-8'},
+            payload={'html': fixture_text('calendar.html')},
+        )],
+    })
+
+    days = probe.fetch_calendar(DAY)
+
+    assert days[dt.date(2026, 12, 1)] is True
+
+
+def test_fetch_not_modified_uses_cached_fragment(fixture_text):
+    url = CALENDAR_URL.format(month=12, year=2026)
+    snapshot = AvailabilitySnapshot()
+    probe = make_probe({url: [
+        FakeResponse(fixture_text('calendar.html'),
+                     headers={'ETag': '"v1"', 'Last-Modified': MODIFIED}),
+        FakeResponse(status_code=304),
+    ]}, snapshot=snapshot)
+
+    first, first_changed = probe._fetch(('calendar',), url,
+                                        probe._parse_calendar)
+    second, second_changed = probe._fetch(('calendar',), url,
+                                          probe._parse_calendar)
+
+    assert first_changed and not second_changed
+    assert second == first
+    # Повторный запрос условный, с заголовками первого ответа.
+    assert probe.session.requests[1][1] == {
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': MODIFIED,
+    }
+    assert snapshot.stats['hits'] == 1
+
+
+def test_fetch_same_fingerprint_is_not_parsed_again(fixture_text):
+    url = CALENDAR_URL.format(month=12, year=2026)
+    markup = fixture_text('calendar.html')
+    probe = make_probe({url: [FakeResponse(markup), FakeResponse(markup)]},
+                       snapshot=AvailabilitySnapshot())
+    parsed: List[str] = []
+
+    def parse(document):
+        parsed.append(document.tag)
+        return probe._parse_calendar(document)
+
+    probe._fetch(('calendar',), url, parse)
+    value, changed = probe._fetch(('calendar',), url, parse)
+
+    assert not changed
+    assert len(parsed) == 1
+    assert value[dt.date(2026, 12, 2)] is False
+
+
+def test_fetch_changed_markup_is_parsed(fixture_text):
+    url = CALENDAR_URL.format(month=12, year=2026)
+    markup = fixture_text('calendar.html')
+    probe = make_probe({url: [
+        FakeResponse(markup),
+        FakeResponse(markup.replace('rgb(238, 238, 238)',
+                                    'rgb(206, 234, 208)')),
+    ]}, snapshot=AvailabilitySnapshot())
+
+    probe._fetch(('calendar',), url, probe._parse_calendar)
+    value, changed = probe._fetch(('calendar',), url, probe._parse_calendar)
+
+    assert changed
+    assert value[dt.date(2026, 12, 2)] is True